@@ -0,0 +1,168 @@
+"""Fixtures for the JellyFish Lighting benchmarks"""
+
+import asyncio
+import json
+import statistics
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+import pytest
+from homeassistant.core import HomeAssistant
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+from custom_components.jellyfish_lighting.const import (
+    DOMAIN,
+    CONF_ADDRESS,
+    CONF_NAME,
+    CONF_HOSTNAME,
+    CONF_VERSION,
+)
+from .simulator import JellyfishControllerSimulator
+
+# Samples (in seconds) collected across the session, keyed by benchmark name
+RESULTS: Dict[str, List[float]] = {}
+# Other measurements (resource usage), keyed by name and unit
+RESOURCES: Dict[str, float] = {}
+
+
+class BenchmarkRecorder:
+    """Collects timing samples for the session summary"""
+
+    def record(self, name: str, seconds: float) -> None:
+        """Records a single sample"""
+        RESULTS.setdefault(name, []).append(seconds)
+
+    def observe(self, name: str, value: float) -> None:
+        """Records a measurement that is not a duration (include the unit in the name)"""
+        RESOURCES[name] = value
+
+    @contextmanager
+    def measure(self, name: str):
+        """Records the time spent in the block"""
+        start = time.perf_counter()
+        yield
+        self.record(name, time.perf_counter() - start)
+
+
+def pytest_addoption(parser):
+    """Register benchmark options"""
+    parser.addoption(
+        "--benchmark-json",
+        action="store",
+        default=None,
+        help="Write benchmark results to a JSON file for comparison between runs",
+    )
+    parser.addoption(
+        "--replay-capture",
+        action="store",
+        default=None,
+        help="Replay a capture file (see the start_capture service) instead of "
+        "traffic recorded from the simulator",
+    )
+
+
+def _summarize(samples: List[float]) -> Dict[str, float]:
+    """Summary statistics in milliseconds"""
+    ordered = sorted(samples)
+    return {
+        "n": len(ordered),
+        "mean": statistics.fmean(ordered) * 1000,
+        "p50": ordered[len(ordered) // 2] * 1000,
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "max": ordered[-1] * 1000,
+    }
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    """Prints a table of all benchmark results"""
+    if RESOURCES:
+        terminalreporter.section("JellyFish Lighting resource usage")
+        width = max(len(name) for name in RESOURCES)
+        for name, value in sorted(RESOURCES.items()):
+            terminalreporter.write_line(f"{name:<{width}} {value:>12.2f}")
+    if not RESULTS:
+        return
+    summaries = {name: _summarize(samples) for name, samples in RESULTS.items()}
+    terminalreporter.section("JellyFish Lighting benchmarks (ms)")
+    width = max(len(name) for name in summaries)
+    terminalreporter.write_line(
+        f"{'benchmark':<{width}} {'n':>5} {'mean':>9} {'p50':>9} {'p95':>9} {'max':>9}"
+    )
+    for name, s in sorted(summaries.items()):
+        terminalreporter.write_line(
+            f"{name:<{width}} {s['n']:>5} {s['mean']:>9.2f} {s['p50']:>9.2f} "
+            f"{s['p95']:>9.2f} {s['max']:>9.2f}"
+        )
+    path = config.getoption("--benchmark-json")
+    if path:
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(
+                {**summaries, "resources": RESOURCES}, file, indent=2, sort_keys=True
+            )
+
+
+@pytest.fixture(autouse=True)
+def auto_enable_custom_integrations(enable_custom_integrations):
+    """Enable the integration under test"""
+    yield
+
+
+@pytest.fixture(autouse=True)
+def enable_event_loop_debug(event_loop: asyncio.AbstractEventLoop) -> None:
+    """Event loop debug mode adds overhead to every callback, so keep it off while timing"""
+    event_loop.set_debug(False)
+
+
+@pytest.fixture
+def benchmark() -> BenchmarkRecorder:
+    """Records timing samples"""
+    return BenchmarkRecorder()
+
+
+@pytest.fixture
+async def simulator(socket_enabled):
+    """Factory that starts controller simulators and stops them after the test.
+    Tests may not open sockets by default; this allows it, while connections remain
+    limited to 127.0.0.1, where simulators listen"""
+    started: List[JellyfishControllerSimulator] = []
+
+    async def _async_start(**kwargs) -> JellyfishControllerSimulator:
+        sim = JellyfishControllerSimulator(**kwargs)
+        await sim.async_start()
+        started.append(sim)
+        return sim
+
+    yield _async_start
+    for sim in started:
+        await sim.async_stop()
+
+
+@pytest.fixture
+async def setup_controller(hass: HomeAssistant, simulator):
+    """Factory that sets up a config entry for a simulated controller, returning the
+    entry and the setup time. Entries are unloaded after the test"""
+    entries: List[MockConfigEntry] = []
+
+    async def _async_setup(sim: JellyfishControllerSimulator, options=None):
+        entry = MockConfigEntry(
+            domain=DOMAIN,
+            title=sim.name,
+            data={
+                CONF_ADDRESS: sim.address,
+                CONF_NAME: sim.name,
+                CONF_HOSTNAME: sim.hostname,
+                CONF_VERSION: "2.4.0",
+            },
+            options=options or {},
+        )
+        entry.add_to_hass(hass)
+        start = time.perf_counter()
+        assert await hass.config_entries.async_setup(entry.entry_id)
+        await hass.async_block_till_done()
+        elapsed = time.perf_counter() - start
+        entries.append(entry)
+        return entry, elapsed
+
+    yield _async_setup
+    for entry in entries:
+        await hass.config_entries.async_unload(entry.entry_id)
+    await hass.async_block_till_done()
@@ -0,0 +1,39 @@
+"""Replays captured controller traffic through an API client"""
+
+import asyncio
+import json
+from typing import List, Optional, Sequence, Tuple
+from custom_components.jellyfish_lighting.api import JellyfishLightingApiClient
+
+
+def capture_zones(messages: Sequence[Tuple[float, str]]) -> List[str]:
+    """The zones that zone state messages in a capture refer to, in order of first
+    appearance, so a simulator with the same zones can be set up for the replay"""
+    zones = {}
+    for _, message in messages:
+        data = json.loads(message)
+        zones.update(dict.fromkeys(data.get("zones") or {}))
+        zones.update(dict.fromkeys((data.get("runPattern") or {}).get("zoneName", [])))
+    return list(zones)
+
+
+async def async_replay(
+    api: JellyfishLightingApiClient,
+    messages: Sequence[Tuple[float, str]],
+    speed: Optional[float] = None,
+) -> float:
+    """Handles captured messages as if the client had just received them from the
+    controller, either as fast as possible or at speed times the captured rate.
+    Messages go through the same decoding, state updates and entity state writes as live
+    traffic. Returns the time the replay took (seconds)"""
+    # pylint: disable=protected-access
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    for at, message in messages:
+        if speed:
+            await asyncio.sleep(max(start + at / speed - loop.time(), 0))
+        api._controller.handle_message(message)
+        if not speed:
+            # Let tasks scheduled by the message run, as they would between messages
+            await asyncio.sleep(0)
+    return loop.time() - start
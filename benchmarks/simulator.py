@@ -0,0 +1,296 @@
+"""A local stand-in for a JellyFish Lighting controller, used by the benchmark suite"""
+
+import asyncio
+import json
+import random
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set
+from aiohttp import WSMsgType, web
+
+PATTERN_FOLDERS = ["Christmas", "Halloween", "Holidays", "Sports", "Colors"]
+
+
+class JellyfishControllerSimulator:
+    """
+    Serves the controller's websocket API on a local port. Zone states are kept in memory,
+    state changes are broadcast to every connected client like the real controller does,
+    and unsolicited zone state pushes can be generated at a fixed rate.
+    """
+
+    def __init__(
+        self,
+        zones: int = 4,
+        patterns: int = 20,
+        latency: float = 0.0,
+        push_rate: float = 0.0,
+        pixels: int = 100,
+        name: str = "Simulator",
+        host: str = "127.0.0.1",
+        port: int = 0,
+        zone_names: Optional[List[str]] = None,
+    ) -> None:
+        self.latency = latency
+        self.push_rate = push_rate
+        self.name = name
+        self.hostname = f"JellyFish-{name.replace(' ', '')}"
+        self.host = host
+        self.port = port
+        zone_names = zone_names or [f"Zone {i + 1}" for i in range(zones)]
+        self.zones: Dict[str, Dict[str, Any]] = {
+            zone: {
+                "numPixels": pixels,
+                "portMap": [
+                    {
+                        "phyPort": i % 8 + 1,
+                        "phyStartIdx": 0,
+                        "phyEndIdx": pixels - 1,
+                        "zoneRGBStartIdx": 0,
+                        "ctlrName": self.hostname,
+                    }
+                ],
+            }
+            for i, zone in enumerate(zone_names)
+        }
+        self.patterns: Dict[str, Dict[str, Any]] = {}
+        for folder in PATTERN_FOLDERS:
+            self.patterns[f"{folder}/"] = {
+                "folders": folder,
+                "name": "",
+                "readOnly": True,
+            }
+        for i in range(patterns):
+            folder = PATTERN_FOLDERS[i % len(PATTERN_FOLDERS)]
+            self.patterns[f"{folder}/Pattern {i + 1}"] = {
+                "folders": folder,
+                "name": f"Pattern {i + 1}",
+                "readOnly": False,
+            }
+        self.states: Dict[str, Dict[str, Any]] = {
+            zone: {"state": 0, "zoneName": [zone], "file": "", "id": "", "data": ""}
+            for zone in self.zones
+        }
+        self.clients: Set[web.WebSocketResponse] = set()
+        self.received: List[Dict[str, Any]] = []
+        # Event loop time at which each set request was applied
+        self.applied: List[float] = []
+        self.pushes = 0
+        self._runner: Optional[web.AppRunner] = None
+        self._pusher: Optional[asyncio.Task] = None
+
+    @property
+    def address(self) -> str:
+        """The address clients should connect to (host:port)"""
+        return f"{self.host}:{self.port}"
+
+    @property
+    def zone_names(self) -> List[str]:
+        """The names of the simulated zones"""
+        return list(self.zones)
+
+    @property
+    def sets(self) -> List[Dict[str, Any]]:
+        """All set requests received so far"""
+        return [msg for msg in self.received if msg.get("cmd") == "toCtlrSet"]
+
+    async def async_start(self) -> None:
+        """Starts serving the websocket API and generating pushes"""
+        app = web.Application()
+        app.router.add_get("/", self._async_handle_client)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        if not self.port:
+            self.port = self._runner.addresses[0][1]
+        if self.push_rate:
+            self._pusher = asyncio.get_running_loop().create_task(
+                self._async_generate_pushes()
+            )
+
+    async def async_stop(self) -> None:
+        """Stops generating pushes, disconnects all clients and stops serving"""
+        if self._pusher:
+            self._pusher.cancel()
+            self._pusher = None
+        for client in list(self.clients):
+            await client.close()
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def reset_counters(self) -> None:
+        """Forgets received requests, applied sets and sent pushes"""
+        self.received.clear()
+        self.applied.clear()
+        self.pushes = 0
+
+    async def async_wait_for_sets(self, count: int, timeout: float = 5) -> None:
+        """Waits until at least count set requests were received (commands are sent
+        without waiting for the controller's reply), and then for any stragglers"""
+        async with asyncio.timeout(timeout):
+            while len(self.sets) < count:
+                await asyncio.sleep(0.001)
+        await asyncio.sleep(self.latency + 0.01)
+
+    async def async_push_zone_state(
+        self, zone: str, state: Optional[Dict[str, Any]] = None
+    ) -> float:
+        """Changes a zone as if it was controlled from outside Home Assistant (the app, a
+        schedule) and broadcasts it. Returns the time the push was sent"""
+        if state is None:
+            state = self._random_state(zone)
+        self.states[zone] = dict(state, zoneName=[zone])
+        sent = time.perf_counter()
+        await self._async_broadcast(
+            {"cmd": "fromCtlr", "runPattern": self.states[zone]}
+        )
+        self.pushes += 1
+        return sent
+
+    async def async_push_pattern_list(self, added: List[str] = ()) -> float:
+        """Saves new patterns (folder/name) and broadcasts the pattern list, as the
+        controller does when patterns are edited in the app. Returns the time it was sent
+        """
+        for pattern in added:
+            folders, _, name = pattern.rpartition("/")
+            self.patterns[pattern] = {
+                "folders": folders,
+                "name": name,
+                "readOnly": False,
+            }
+        sent = time.perf_counter()
+        await self._async_broadcast(
+            {"cmd": "fromCtlr", "patternFileList": list(self.patterns.values())}
+        )
+        self.pushes += 1
+        return sent
+
+    async def async_add_zone(self, zone: str, state: Dict[str, Any]) -> float:
+        """Adds a zone and broadcasts the zone list together with the new zone's state in
+        a single message. Returns the time it was sent"""
+        self.zones[zone] = dict(next(iter(self.zones.values())))
+        self.states[zone] = dict(state, zoneName=[zone])
+        sent = time.perf_counter()
+        await self._async_broadcast(
+            {"cmd": "fromCtlr", "zones": self.zones, "runPattern": self.states[zone]}
+        )
+        self.pushes += 1
+        return sent
+
+    def color_state(self, zone: str, rgb: List[int], brightness: int = 100) -> Dict:
+        """A zone state displaying a solid color"""
+        config = {
+            "type": "Color",
+            "colors": [*rgb],
+            "runData": {
+                "speed": 0,
+                "brightness": brightness,
+                "effect": "No Effect",
+                "effectValue": 0,
+                "rgbAdj": None,
+            },
+            "direction": "Center",
+            "spaceBetweenPixels": 2,
+            "numOfLeds": 1,
+            "skip": 2,
+            "effectBetweenPixels": "No Color Transform",
+            "colorPos": None,
+        }
+        return {"state": 1, "zoneName": [zone], "file": "", "data": json.dumps(config)}
+
+    def _random_state(self, zone: str) -> Dict[str, Any]:
+        """A random on/off, pattern or color state"""
+        choice = random.random()
+        if choice < 0.2:
+            return {"state": 0, "zoneName": [zone], "file": "", "data": ""}
+        if choice < 0.6:
+            pattern = random.choice(
+                [p for p, v in self.patterns.items() if v["name"]] or [""]
+            )
+            return {"state": 1, "zoneName": [zone], "file": pattern, "data": ""}
+        rgb = [random.randint(0, 255) for _ in range(3)]
+        return self.color_state(zone, rgb, random.randint(1, 100))
+
+    async def _async_generate_pushes(self) -> None:
+        """Pushes random zone state changes at the configured rate"""
+        while True:
+            await asyncio.sleep(1 / self.push_rate)
+            await self.async_push_zone_state(random.choice(self.zone_names))
+
+    async def _async_broadcast(self, message: Dict[str, Any]) -> None:
+        """Sends a message to all connected clients"""
+        payload = json.dumps(message)
+        for client in list(self.clients):
+            if not client.closed:
+                await client.send_str(payload)
+
+    async def _async_handle_client(self, request: web.Request) -> web.WebSocketResponse:
+        """Serves a single websocket client"""
+        client = web.WebSocketResponse()
+        await client.prepare(request)
+        self.clients.add(client)
+        try:
+            async for msg in client:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                message = json.loads(msg.data)
+                self.received.append(message)
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                if message.get("cmd") == "toCtlrGet":
+                    for reply in self._replies(message["get"]):
+                        await client.send_str(json.dumps(reply))
+                elif message.get("cmd") == "toCtlrSet":
+                    await self._async_apply(message)
+        finally:
+            self.clients.discard(client)
+        return client
+
+    def _replies(self, requests: List[List[str]]) -> Iterator[Dict[str, Any]]:
+        """The controller's replies to a get request"""
+        for key, *args in requests:
+            if key == "ctlrName":
+                yield {"cmd": "fromCtlr", "ctlrName": self.name}
+            elif key == "hostName":
+                yield {"cmd": "fromCtlr", "hostName": self.hostname}
+            elif key == "version":
+                yield {
+                    "cmd": "fromCtlr",
+                    "version": {"ver": "2.4.0", "details": "", "isUpdate": False},
+                }
+            elif key == "zones":
+                yield {"cmd": "fromCtlr", "save": True, "zones": self.zones}
+            elif key == "patternFileList":
+                yield {
+                    "cmd": "fromCtlr",
+                    "patternFileList": list(self.patterns.values()),
+                }
+            elif key == "patternFileData":
+                for folders, name in zip(args[::2], args[1::2]):
+                    yield {
+                        "cmd": "fromCtlr",
+                        "patternFileData": {
+                            "folders": folders,
+                            "name": name,
+                            "jsonData": self.color_state("", [255, 0, 0])["data"],
+                        },
+                    }
+            elif key == "runPattern":
+                for zone in args or self.zone_names:
+                    if zone in self.states:
+                        yield {"cmd": "fromCtlr", "runPattern": self.states[zone]}
+
+    async def _async_apply(self, message: Dict[str, Any]) -> None:
+        """Applies a set request and broadcasts the resulting zone state"""
+        state = message.get("runPattern")
+        if not state:
+            return
+        zones = [zone for zone in state.get("zoneName", []) if zone in self.states]
+        if not zones:
+            return
+        for zone in zones:
+            self.states[zone] = dict(state, zoneName=[zone])
+        self.applied.append(asyncio.get_running_loop().time())
+        await self._async_broadcast(
+            {"cmd": "fromCtlr", "runPattern": dict(state, zoneName=zones)}
+        )
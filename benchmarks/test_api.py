@@ -0,0 +1,562 @@
+"""Benchmarks for JellyfishLightingApiClient against a simulated controller"""
+
+import asyncio
+import json
+import time
+import pytest
+from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import HomeAssistantError
+from custom_components.jellyfish_lighting.api import (
+    JellyfishLightingApiClient,
+    JellyFishLightingZoneData,
+)
+from custom_components.jellyfish_lighting.const import (
+    BATCH_WINDOW,
+    PATTERN_CONFIG_CACHE_SIZE,
+)
+from custom_components.jellyfish_lighting.effects import gradient, positions
+from custom_components.jellyfish_lighting.metrics import JellyfishLightingMetrics
+from custom_components.jellyfish_lighting.segments import JellyfishLightingSegment
+
+ITERATIONS = 20
+LATENCY = 0.005
+
+
+@pytest.fixture
+async def client(hass: HomeAssistant):
+    """Factory for API clients that are disconnected after the test"""
+    clients = []
+
+    def _create(sim) -> JellyfishLightingApiClient:
+        api = JellyfishLightingApiClient(sim.address, None, hass)
+        clients.append(api)
+        return api
+
+    yield _create
+    for api in clients:
+        await api.async_disconnect()
+
+
+@pytest.mark.parametrize("zones", [1, 10, 50])
+async def test_initial_fetch(simulator, client, benchmark, zones):
+    """Connecting and fetching all controller data"""
+    sim = await simulator(zones=zones, patterns=200, latency=LATENCY)
+    api = client(sim)
+    with benchmark.measure(f"api: connect + initial fetch ({zones} zones)"):
+        await api.async_get_data()
+    assert len(api.zones) == zones
+    assert len(api.states) == zones
+
+
+async def test_command_latency(simulator, client, benchmark):
+    """Time for a single-zone command to be sent"""
+    sim = await simulator(zones=10, latency=LATENCY)
+    api = client(sim)
+    await api.async_get_data()
+    sim.reset_counters()
+    for i in range(ITERATIONS):
+        with benchmark.measure("api: apply color (1 zone)"):
+            await api.async_apply_color((i, 0, 0), 100, "Zone 1")
+    await sim.async_wait_for_sets(ITERATIONS)
+    assert len(sim.sets) == ITERATIONS
+    assert api.metrics.histograms["apply_color"].count == ITERATIONS
+    assert api.metrics.histograms["command_confirmation"].count >= ITERATIONS - 1
+
+
+@pytest.mark.parametrize("zones", [10, 50])
+async def test_concurrent_commands(simulator, client, benchmark, zones):
+    """Identical commands for many zones issued together, as a group or scene would"""
+    sim = await simulator(zones=zones, latency=LATENCY)
+    api = client(sim)
+    await api.async_get_data()
+    sim.reset_counters()
+    with benchmark.measure(f"api: turn on ({zones} zones concurrently)"):
+        await asyncio.gather(*(api.async_turn_on(zone) for zone in sim.zone_names))
+    # Commands issued together are coalesced into a single controller request
+    await sim.async_wait_for_sets(1)
+    assert len(sim.sets) == 1
+    assert all(api.states[zone].is_on for zone in sim.zone_names)
+
+
+@pytest.mark.parametrize("zones", [10, 50])
+async def test_all_zones_command(simulator, client, benchmark, zones):
+    """Commands for every zone of the controller, as the all zones light sends them"""
+    sim = await simulator(zones=zones, latency=LATENCY)
+    api = client(sim)
+    await api.async_get_data()
+    sim.reset_counters()
+    for i in range(ITERATIONS):
+        with benchmark.measure(f"api: apply color (all {zones} zones)"):
+            await api.async_apply_color((i, 0, 0), 100, None)
+    await sim.async_wait_for_sets(ITERATIONS)
+    assert len(sim.sets) == ITERATIONS
+    assert all(msg["runPattern"]["zoneName"] == sim.zone_names for msg in sim.sets)
+    assert all(
+        api.states[zone].color == (ITERATIONS - 1, 0, 0) for zone in sim.zone_names
+    )
+
+
+async def test_push_to_listener_latency(simulator, client, benchmark):
+    """Time from the controller sending a push to zone listeners being notified"""
+    sim = await simulator(zones=10, latency=LATENCY)
+    api = client(sim)
+    await api.async_get_data()
+    notified = asyncio.Event()
+    api.async_add_zone_listener("Zone 1", notified.set)
+    for i in range(ITERATIONS):
+        notified.clear()
+        sent = await sim.async_push_zone_state(
+            "Zone 1", sim.color_state("Zone 1", [i, i, i])
+        )
+        await asyncio.wait_for(notified.wait(), 1)
+        benchmark.record("api: push -> zone listener", time.perf_counter() - sent)
+
+
+async def test_push_throughput(simulator, client, benchmark):
+    """Sustained push rate with many zones"""
+    sim = await simulator(zones=50, latency=LATENCY)
+    api = client(sim)
+    await api.async_get_data()
+    notifications = 0
+
+    def _count() -> None:
+        nonlocal notifications
+        notifications += 1
+
+    api.async_add_zone_listener(None, _count)
+    start = time.perf_counter()
+    for i in range(ITERATIONS * 10):
+        zone = sim.zone_names[i % len(sim.zone_names)]
+        await sim.async_push_zone_state(zone, sim.color_state(zone, [i % 256, 0, 0]))
+    async with asyncio.timeout(5):
+        while notifications < ITERATIONS * 10:
+            await asyncio.sleep(0.001)
+    benchmark.record(
+        "api: push processing (per push)",
+        (time.perf_counter() - start) / (ITERATIONS * 10),
+    )
+
+
+async def test_reconnect_refresh(simulator, client, benchmark):
+    """Zone changes made while the connection was down show up once it is back"""
+    sim = await simulator(zones=10, latency=LATENCY)
+    api = client(sim)
+    await api.async_get_data()
+    for connection in list(sim.clients):
+        await connection.close()
+    # Not pushed, since nothing is connected (e.g. changed by the app during a drop)
+    await sim.async_push_zone_state("Zone 1", sim.color_state("Zone 1", [1, 2, 3]))
+    start = time.perf_counter()
+    async with asyncio.timeout(5):
+        while api.states["Zone 1"].color != (1, 2, 3):
+            await asyncio.sleep(0.01)
+    benchmark.record("api: reconnect and refresh", time.perf_counter() - start)
+
+
+async def test_fetch_after_offline_start(simulator, client, benchmark):
+    """Data is fetched once a background retry reaches a controller that was offline
+    when the data was first fetched"""
+    sim = await simulator(zones=10, latency=LATENCY)
+    api = client(sim)
+    await sim.async_stop()
+    with pytest.raises(HomeAssistantError):
+        await api.async_get_data()
+    await sim.async_start()
+    start = time.perf_counter()
+    async with asyncio.timeout(5):
+        while len(api.states) < len(sim.zones):
+            await asyncio.sleep(0.01)
+    benchmark.record("api: retry and first fetch", time.perf_counter() - start)
+    assert api.connected
+
+
+@pytest.mark.parametrize("traced", [False, True])
+async def test_trace_overhead(simulator, client, benchmark, traced):
+    """Push processing with the event trace stopped and running"""
+    sim = await simulator(zones=50, latency=LATENCY)
+    api = client(sim)
+    await api.async_get_data()
+    if traced:
+        api.trace.start(100)
+    handled = api.metrics.counters["messages_received"]
+    pushes = ITERATIONS * 10
+    start = time.perf_counter()
+    for i in range(pushes):
+        zone = sim.zone_names[i % len(sim.zone_names)]
+        await sim.async_push_zone_state(zone, sim.color_state(zone, [i % 256, 0, 0]))
+    async with asyncio.timeout(5):
+        while api.metrics.counters["messages_received"] < handled + pushes:
+            await asyncio.sleep(0.001)
+    label = "running" if traced else "stopped"
+    benchmark.record(
+        f"api: push processing, trace {label} (per push)",
+        (time.perf_counter() - start) / pushes,
+    )
+    trace = api.trace.as_dict()
+    if not traced:
+        assert not trace["events"]
+        return
+    # The buffer keeps the latest events, each push being received and decoded
+    assert len(trace["events"]) == 100
+    assert trace["dropped"] == pushes * 2 - 100
+    assert trace["events"][-1]["event"] == "push_decoded"
+    assert trace["events"][-1]["changed"] == [sim.zone_names[(pushes - 1) % 50]]
+
+
+async def test_pattern_list_push(simulator, client, benchmark):
+    """Time to process a pattern list push with a large catalog"""
+    sim = await simulator(zones=10, patterns=1000, latency=LATENCY)
+    api = client(sim)
+    await api.async_get_data()
+    notified = asyncio.Event()
+    api.async_add_zone_listener(None, notified.set)
+    for i in range(ITERATIONS):
+        notified.clear()
+        sent = await sim.async_push_pattern_list([f"New/Nested/Pattern {i}"])
+        await asyncio.wait_for(notified.wait(), 1)
+        benchmark.record(
+            "api: pattern list push (1000 patterns)", time.perf_counter() - sent
+        )
+    assert api.patterns == sorted(p for p, v in sim.patterns.items() if v["name"])
+    assert api.catalog.subfolders("New") == ["New/Nested"]
+
+
+async def test_multi_key_push(simulator, client, benchmark):
+    """A message carrying both the zone list and a zone state is applied in full"""
+    sim = await simulator(zones=10, latency=LATENCY)
+    api = client(sim)
+    await api.async_get_data()
+    updated = asyncio.Event()
+    api.async_add_zone_listener(None, updated.set)
+    sim.reset_counters()
+    for i in range(ITERATIONS):
+        zone = f"New zone {i}"
+        updated.clear()
+        sent = await sim.async_add_zone(zone, sim.color_state(zone, [0, 0, 255]))
+        await updated.wait()
+        benchmark.record("api: zone list + state push", time.perf_counter() - sent)
+        assert api.zones[-1] == zone
+        assert api.states[zone] == JellyFishLightingZoneData(
+            True, None, (0, 0, 255), 100
+        )
+    # Nothing had to be fetched to fill in the gaps
+    assert not sim.received
+
+
+async def test_unknown_pattern_rejected_locally(simulator, client, benchmark):
+    """Unknown patterns are rejected without a controller round trip"""
+    sim = await simulator(zones=10, patterns=1000, latency=LATENCY)
+    api = client(sim)
+    await api.async_get_data()
+    sim.reset_counters()
+    for _ in range(ITERATIONS):
+        with benchmark.measure("api: reject unknown pattern"):
+            with pytest.raises(HomeAssistantError):
+                await api.async_apply_pattern("Christmas/Missing", "Zone 1")
+    assert not sim.received
+
+
+async def test_pattern_lookup(simulator, client, benchmark):
+    """Patterns are found by name without the folder, in any case, or by the start of
+    their name, and ambiguous names are rejected with the patterns they match"""
+    sim = await simulator(zones=1, patterns=1000, latency=LATENCY)
+    api = client(sim)
+    await api.async_get_data()
+    updated = asyncio.Event()
+    api.async_add_zone_listener(None, updated.set)
+    await sim.async_push_pattern_list(["Christmas/Lights", "Halloween/Lights"])
+    await updated.wait()
+    for _ in range(ITERATIONS):
+        with benchmark.measure("api: resolve pattern by prefix (1000 patterns)"):
+            assert api.resolve_pattern("christmas/li") == "Christmas/Lights"
+    assert api.resolve_pattern("PATTERN 1") == "Christmas/Pattern 1"
+    with pytest.raises(HomeAssistantError, match="Christmas/Lights, Halloween/Lights"):
+        api.resolve_pattern("Lights")
+    assert api.catalog.search("christmas/pattern 10") == [
+        "Christmas/Pattern 101",
+        "Christmas/Pattern 106",
+    ]
+
+
+async def test_pattern_config_cache(simulator, client, benchmark):
+    """Pattern configs are fetched once and kept in a bounded cache"""
+    sim = await simulator(zones=1, patterns=100, latency=LATENCY)
+    api = client(sim)
+    await api.async_get_data()
+    sim.reset_counters()
+    with benchmark.measure("api: get pattern config (not cached)"):
+        config = await api.async_get_pattern_config("Christmas/Pattern 1")
+    for _ in range(ITERATIONS):
+        with benchmark.measure("api: get pattern config (cached)"):
+            assert await api.async_get_pattern_config("Christmas/Pattern 1") is config
+    assert config.type == "Color"
+    assert len(sim.received) == 1
+    # Least recently used configs are evicted
+    for pattern in api.patterns[1 : PATTERN_CONFIG_CACHE_SIZE + 1]:
+        await api.async_get_pattern_config(pattern)
+    sim.reset_counters()
+    await api.async_get_pattern_config("Christmas/Pattern 1")
+    assert len(sim.received) == 1
+
+
+@pytest.mark.parametrize("zones", [10, 50])
+async def test_apply_scene(simulator, client, benchmark, zones):
+    """Applying a different setting to groups of zones"""
+    sim = await simulator(zones=zones, latency=LATENCY)
+    api = client(sim)
+    await api.async_get_data()
+    targets = [
+        JellyFishLightingZoneData(False),
+        JellyFishLightingZoneData(True, "Christmas/Pattern 1"),
+        JellyFishLightingZoneData(True, None, (255, 0, 0), 50),
+        JellyFishLightingZoneData(True, None, (0, 255, 0), 100),
+        JellyFishLightingZoneData(True, "Holidays/Pattern 3"),
+    ]
+    scene = {zone: targets[i % len(targets)] for i, zone in enumerate(sim.zone_names)}
+    sim.reset_counters()
+    with benchmark.measure(f"api: apply scene ({zones} zones, 5 groups)"):
+        await api.async_apply_scene(scene)
+    # One command per group and a single confirmation request
+    assert len(sim.sets) == len(targets)
+    assert len(sim.received) == len(targets) + 1
+    assert api.states == scene
+
+
+async def test_scene_supersedes_queued(simulator, client, benchmark):
+    """A scene replaces a state change that is still waiting for the zone's previous
+    command, instead of being overwritten by it"""
+    sim = await simulator(zones=10, latency=0.2)
+    api = client(sim)
+    await api.async_get_data()
+    sim.reset_counters()
+    first = asyncio.create_task(api.async_apply_color((255, 0, 0), 100, "Zone 1"))
+    await asyncio.sleep(0.05)
+    queued = asyncio.create_task(api.async_apply_color((0, 0, 255), 100, "Zone 1"))
+    await asyncio.sleep(0.05)
+    scene = {"Zone 1": JellyFishLightingZoneData(True, None, (0, 255, 0), 100)}
+    with benchmark.measure("api: apply scene over a queued command"):
+        await api.async_apply_scene(scene)
+    await asyncio.gather(first, queued)
+    assert len(sim.sets) == 2
+    assert api.states["Zone 1"] == scene["Zone 1"]
+    assert json.loads(sim.states["Zone 1"]["data"])["colors"] == [0, 255, 0]
+
+
+@pytest.mark.parametrize("fps", [20, 60])
+async def test_stream_frame_rate(simulator, client, benchmark, fps):
+    """Streaming a per-pixel effect to several 300-light zones for one second"""
+    sim = await simulator(zones=10, latency=LATENCY, pixels=300)
+    api = client(sim)
+    await api.async_get_data()
+    render = gradient([(255, 0, 0), (0, 255, 0), (0, 0, 255)], speed=0.5)
+
+    def effect(t, pos):
+        start = time.perf_counter()
+        frame = render(t, pos)
+        benchmark.record(
+            "stream: render frame (300 lights)", time.perf_counter() - start
+        )
+        return frame
+
+    sim.reset_counters()
+    for zone in sim.zone_names:
+        await api.async_stream_effect(effect, zone, fps=fps)
+    await asyncio.sleep(1)
+    for zone in sim.zone_names:
+        api.async_stop_stream(zone)
+    assert not api.streamer.zones
+    # Zones showing the same frame share a single request
+    await sim.async_wait_for_sets(api.streamer.frames_sent)
+    assert len(sim.sets) == api.streamer.frames_sent
+    assert fps * 0.8 <= api.streamer.frames_sent <= fps + 1
+
+
+def test_gradient_negative_speed():
+    """Gradients scrolling backwards render every frame, including those where a light's
+    position wraps around to exactly the end of the zone"""
+    render = gradient([(255, 0, 0), (0, 0, 255)], speed=-5)
+    pos = positions(100)
+    for t in (0.0, 2e-18, 0.05, 0.1, 1.0):
+        frame = render(t, pos)
+        assert frame.shape == (100, 3)
+    # Wrapped around to the first color
+    assert render(2e-18, pos)[0].tolist() == [255, 0, 0]
+
+
+async def test_stream_effect_error(simulator, client):
+    """An effect that fails stops streaming to its zone only"""
+    sim = await simulator(zones=2, latency=LATENCY, pixels=100)
+    api = client(sim)
+    await api.async_get_data()
+    render = gradient([(255, 0, 0), (0, 0, 255)], speed=0.5)
+
+    def failing(t, pos):
+        if t > 0.1:
+            raise ValueError("Effect failed")
+        return render(t, pos)
+
+    await api.async_stream_effect(failing, "Zone 1")
+    await api.async_stream_effect(render, "Zone 2")
+    await asyncio.sleep(0.3)
+    assert api.streamer.zones == ["Zone 2"]
+    api.async_stop_stream("Zone 2")
+    assert not api.streamer.zones
+
+
+async def test_segments_disconnect(simulator, client):
+    """Disconnecting drops segment frames whose write already started"""
+    sim = await simulator(zones=1, latency=LATENCY, pixels=100)
+    api = client(sim)
+    await api.async_get_data()
+    sim.reset_counters()
+    segment = JellyfishLightingSegment("Segment", "Zone 1", 1, 50)
+    task = asyncio.create_task(api.async_apply_segment(segment, (255, 0, 0)))
+    await asyncio.sleep(0)
+    # Block until the batching window closed, then let it start the write, and
+    # disconnect before the write runs
+    time.sleep(BATCH_WINDOW * 2)
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    await api.async_disconnect()
+    with pytest.raises(HomeAssistantError):
+        await task
+    await asyncio.sleep(0.1)
+    assert not sim.sets
+
+
+@pytest.mark.parametrize("segments", [4, 16])
+async def test_segments(simulator, client, benchmark, segments):
+    """Changing many segments of two 200-light zones together"""
+    sim = await simulator(zones=2, latency=LATENCY, pixels=200)
+    api = client(sim)
+    await api.async_get_data()
+    length = 200 // segments
+    parts = [
+        JellyfishLightingSegment(f"{zone} {i}", zone, i * length + 1, (i + 1) * length)
+        for zone in sim.zone_names
+        for i in range(segments)
+    ]
+    sim.reset_counters()
+    for i in range(ITERATIONS):
+        with benchmark.measure(f"api: set {segments} segments of 2 zones"):
+            await asyncio.gather(
+                *(
+                    api.async_apply_segment(part, (i, j % 256, 0), 50)
+                    for j, part in enumerate(parts)
+                )
+            )
+    # One light string per zone and tick, however many segments changed
+    await sim.async_wait_for_sets(ITERATIONS * 2)
+    assert len(sim.sets) == ITERATIONS * 2
+    # Each segment's lights show its color at its brightness
+    last = parts[-1]
+    colors = json.loads(sim.states["Zone 2"]["data"])["colors"][3:]
+    assert colors[(last.first - 1) * 3 : (last.first - 1) * 3 + 3] == [
+        round((ITERATIONS - 1) / 2),
+        round((len(parts) - 1) / 2),
+        0,
+    ]
+    assert api.segments.states[last.name] == ((ITERATIONS - 1, len(parts) - 1, 0), 50)
+    # Turning every segment of a zone off turns the zone off
+    sim.reset_counters()
+    await asyncio.gather(
+        *(
+            api.async_apply_segment(part, None)
+            for part in parts
+            if part.zone == "Zone 1"
+        )
+    )
+    await sim.async_wait_for_sets(1)
+    assert len(sim.sets) == 1 and sim.sets[0]["runPattern"]["state"] == 0
+    # A pattern takes over a zone, and segments changed later no longer show the
+    # segments that were lit before it
+    await api.async_apply_pattern("Christmas/Pattern 1", "Zone 2")
+    assert not any(part.name in api.segments.states for part in parts)
+    sim.reset_counters()
+    await api.async_apply_segment(last, (255, 0, 0), 100)
+    await sim.async_wait_for_sets(1)
+    colors = json.loads(sim.states["Zone 2"]["data"])["colors"][3:]
+    assert sum(colors) == 255 * (last.last - last.first + 1)
+
+
+async def test_transition(simulator, client, benchmark):
+    """A one second color fade on several zones at once"""
+    sim = await simulator(zones=10, latency=LATENCY)
+    api = client(sim)
+    await api.async_get_data()
+    await asyncio.gather(
+        *(api.async_apply_color((255, 0, 0), 100, zone) for zone in sim.zone_names)
+    )
+    sim.reset_counters()
+    with benchmark.measure("api: 1s transition (10 zones)"):
+        await asyncio.gather(
+            *(
+                api.async_apply_color((0, 0, 255), 50, zone, transition=1)
+                for zone in sim.zone_names
+            )
+        )
+    # Zones fading in step share each intermediate command, and the rate is bounded
+    assert len(sim.sets) <= 11
+    assert all(
+        state == JellyFishLightingZoneData(True, None, (0, 0, 255), 50)
+        for state in api.states.values()
+    )
+
+
+async def test_transition_superseded(simulator, client, benchmark):
+    """A newer command takes over a zone that is transitioning"""
+    sim = await simulator(zones=10, latency=LATENCY)
+    api = client(sim)
+    await api.async_get_data()
+    await api.async_apply_color((255, 0, 0), 100, "Zone 1")
+    fade = asyncio.create_task(
+        api.async_apply_color((0, 0, 255), 100, "Zone 1", transition=10)
+    )
+    await asyncio.sleep(0.3)
+    with benchmark.measure("api: command during transition"):
+        await api.async_apply_color((0, 255, 0), 100, "Zone 1")
+        await fade
+    await asyncio.sleep(0.1)
+    sim.reset_counters()
+    # No further steps are sent once the fade is superseded
+    await asyncio.sleep(0.3)
+    assert not sim.sets
+    assert api.states["Zone 1"] == JellyFishLightingZoneData(
+        True, None, (0, 255, 0), 100
+    )
+
+
+async def test_slider_storm(simulator, client, benchmark):
+    """A burst of brightness changes for one zone, as dragging a slider produces, on a
+    controller with high latency"""
+    sim = await simulator(zones=10, latency=0.2)
+    api = client(sim)
+    await api.async_get_data()
+    sim.reset_counters()
+    calls = []
+    for brightness in range(1, 21):
+        calls.append(
+            asyncio.create_task(
+                api.async_apply_color((255, 0, 0), brightness, "Zone 1")
+            )
+        )
+        await asyncio.sleep(0.05)
+    with benchmark.measure("api: settle after slider storm (200ms latency)"):
+        await asyncio.gather(*calls)
+    # Only one command is in flight at a time, and the ones replaced while waiting
+    # for it are never sent
+    assert len(sim.sets) < 10
+    assert api.states["Zone 1"] == JellyFishLightingZoneData(
+        True, None, (255, 0, 0), 20
+    )
+
+
+def test_metrics_overhead(benchmark):
+    """Cost of recording a latency sample and incrementing a counter"""
+    metrics = JellyfishLightingMetrics()
+    for _ in range(ITERATIONS):
+        with benchmark.measure("metrics: 1000 samples + 1000 increments"):
+            for i in range(1000):
+                metrics.record("request", i / 100000)
+                metrics.increment("messages_received")
+    assert metrics.histograms["request"].count == ITERATIONS * 1000
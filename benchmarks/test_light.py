@@ -0,0 +1,391 @@
+"""Benchmarks for JellyfishLightingLight entities against a simulated controller"""
+
+import asyncio
+import time
+import pytest
+from homeassistant.components.light import (
+    ATTR_EFFECT,
+    ATTR_RGB_COLOR,
+    DOMAIN as LIGHT_DOMAIN,
+)
+from homeassistant.const import (
+    ATTR_DEVICE_ID,
+    ATTR_ENTITY_ID,
+    EVENT_STATE_CHANGED,
+    SERVICE_TURN_OFF,
+    SERVICE_TURN_ON,
+)
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import device_registry as dr, entity_registry as er
+from homeassistant.util import dt as dt_util
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+from custom_components.jellyfish_lighting.capture import load_capture
+from custom_components.jellyfish_lighting.const import (
+    DOMAIN,
+    ATTR_ENTITIES,
+    CONF_SEGMENTS,
+    PUSH_STALE_TIMEOUT,
+    SCAN_INTERVAL,
+    SERVICE_APPLY_SCENE,
+    SERVICE_STOP_STREAM,
+    SERVICE_STREAM_EFFECT,
+    WATCHDOG_INTERVAL,
+)
+from .replay import async_replay, capture_zones
+
+ITERATIONS = 20
+LATENCY = 0.005
+
+
+def _entity_id(hass: HomeAssistant, zone: str) -> str:
+    """The entity ID of the light for a zone"""
+    unique_id = zone.lower().replace(" ", "_")
+    return er.async_get(hass).async_get_entity_id(LIGHT_DOMAIN, DOMAIN, unique_id)
+
+
+def _all_zones_entity_id(hass: HomeAssistant, entry) -> str:
+    """The entity ID of the light controlling all zones of a controller"""
+    return er.async_get(hass).async_get_entity_id(
+        LIGHT_DOMAIN, DOMAIN, f"{entry.entry_id}_all_zones"
+    )
+
+
+class StateWriteCounter:
+    """Counts state writes of JellyFish Lighting lights"""
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self.writes = 0
+        self.written = asyncio.Event()
+        self.last_write = 0.0
+        self.remove = hass.bus.async_listen(EVENT_STATE_CHANGED, self._on_state_changed)
+
+    def _on_state_changed(self, event) -> None:
+        if event.data[ATTR_ENTITY_ID].startswith(f"{LIGHT_DOMAIN}."):
+            self.writes += 1
+            self.last_write = time.perf_counter()
+            self.written.set()
+
+
+@pytest.mark.parametrize("zones", [1, 10, 50])
+async def test_setup_time(hass, simulator, setup_controller, benchmark, zones):
+    """Time to set up a config entry and create its lights"""
+    sim = await simulator(zones=zones, patterns=200, latency=LATENCY)
+    _, elapsed = await setup_controller(sim)
+    benchmark.record(f"light: entry setup ({zones} zones)", elapsed)
+    # A light per zone and one for all zones
+    assert len(hass.states.async_entity_ids(LIGHT_DOMAIN)) == zones + 1
+
+
+async def test_service_call_latency(hass, simulator, setup_controller, benchmark):
+    """Time for a light.turn_on service call to complete"""
+    sim = await simulator(zones=10, latency=LATENCY)
+    await setup_controller(sim)
+    entity_id = _entity_id(hass, "Zone 1")
+    sim.reset_counters()
+    for i in range(ITERATIONS):
+        with benchmark.measure("light: turn_on service call (1 zone)"):
+            await hass.services.async_call(
+                LIGHT_DOMAIN,
+                SERVICE_TURN_ON,
+                {ATTR_ENTITY_ID: entity_id, ATTR_RGB_COLOR: (i, 0, 0)},
+                blocking=True,
+            )
+    await sim.async_wait_for_sets(ITERATIONS)
+    assert len(sim.sets) == ITERATIONS
+    assert hass.states.get(entity_id).attributes[ATTR_RGB_COLOR] == (
+        ITERATIONS - 1,
+        0,
+        0,
+    )
+
+
+@pytest.mark.parametrize("zones", [10, 50])
+async def test_multi_zone_service_call(
+    hass, simulator, setup_controller, benchmark, zones
+):
+    """Time for a single service call targeting every light of a controller"""
+    sim = await simulator(zones=zones, latency=LATENCY)
+    await setup_controller(sim)
+    entity_ids = [_entity_id(hass, zone) for zone in sim.zone_names]
+    sim.reset_counters()
+    with benchmark.measure(f"light: turn_on service call ({zones} zones)"):
+        await hass.services.async_call(
+            LIGHT_DOMAIN,
+            SERVICE_TURN_ON,
+            {ATTR_ENTITY_ID: entity_ids, ATTR_RGB_COLOR: (0, 0, 255)},
+            blocking=True,
+        )
+    await sim.async_wait_for_sets(1)
+    assert len(sim.sets) == 1
+
+
+async def test_push_to_state_write_latency(
+    hass, simulator, setup_controller, benchmark
+):
+    """Time from the controller sending a push to the light's state being written"""
+    sim = await simulator(zones=10, latency=LATENCY)
+    await setup_controller(sim)
+    counter = StateWriteCounter(hass)
+    for i in range(ITERATIONS):
+        counter.written.clear()
+        sent = await sim.async_push_zone_state(
+            "Zone 1", sim.color_state("Zone 1", [i, i, i])
+        )
+        await asyncio.wait_for(counter.written.wait(), 1)
+        benchmark.record("light: push -> state write", counter.last_write - sent)
+    counter.remove()
+
+
+@pytest.mark.parametrize("zones", [10, 50])
+async def test_state_writes_per_push(hass, simulator, setup_controller, zones):
+    """Pushes only write the state of the affected light, and only if it changed"""
+    sim = await simulator(zones=zones, latency=LATENCY)
+    await setup_controller(sim)
+    counter = StateWriteCounter(hass)
+    for zone in sim.zone_names:
+        await sim.async_push_zone_state(zone, sim.color_state(zone, [1, 2, 3]))
+    async with asyncio.timeout(5):
+        while counter.writes < zones:
+            await asyncio.sleep(0.001)
+    # Pushes that repeat the current state (e.g. the controller echoing a command
+    # to every connected client) must not cause state writes
+    for zone in sim.zone_names:
+        await sim.async_push_zone_state(zone, sim.states[zone])
+    await asyncio.sleep(0.1)
+    await hass.async_block_till_done()
+    counter.remove()
+    # Plus the all zones light, once when the first zone turned on
+    assert counter.writes == zones + 1
+
+
+async def test_state_writes_per_pattern_push(hass, simulator, setup_controller):
+    """Pattern list pushes only write states when the catalog changed"""
+    sim = await simulator(zones=10, patterns=300, latency=LATENCY)
+    await setup_controller(sim)
+    writes = []
+    remove = hass.bus.async_listen(
+        EVENT_STATE_CHANGED, lambda event: writes.append(event.data[ATTR_ENTITY_ID])
+    )
+    await sim.async_push_pattern_list()
+    await asyncio.sleep(0.1)
+    await hass.async_block_till_done()
+    assert not writes
+    await sim.async_push_pattern_list(["New/Pattern"])
+    await asyncio.sleep(0.1)
+    await hass.async_block_till_done()
+    remove()
+    # Every light's effect list changed (including the all zones light), and the
+    # catalog is published once
+    assert len(writes) == len(sim.zones) + 2
+    sensors = [entity_id for entity_id in writes if entity_id.startswith("sensor.")]
+    assert len(sensors) == 1
+    assert hass.states.get(sensors[0]).state == "301"
+
+
+async def test_push_watchdog(hass, simulator, setup_controller):
+    """The coordinator polls while pushes are stale or the controller is disconnected,
+    and stops polling once pushes are received again"""
+    sim = await simulator(zones=4, latency=LATENCY)
+    entry, _ = await setup_controller(sim)
+    coordinator = hass.data[DOMAIN][entry.entry_id]
+
+    async def _async_check() -> None:
+        async_fire_time_changed(hass, dt_util.utcnow() + WATCHDOG_INTERVAL)
+        await hass.async_block_till_done()
+
+    await _async_check()
+    assert coordinator.update_interval is None
+    sim.reset_counters()
+    coordinator.api.last_push -= PUSH_STALE_TIMEOUT.total_seconds()
+    await _async_check()
+    assert coordinator.update_interval == SCAN_INTERVAL
+    assert [msg for msg in sim.received if msg.get("cmd") == "toCtlrGet"]
+    # The replies to the fetch count as pushes
+    await _async_check()
+    assert coordinator.update_interval is None
+    await sim.async_stop()
+    await asyncio.sleep(0.1)
+    await _async_check()
+    assert coordinator.update_interval is not None
+    # The controller is gone, so the fetch failed
+    assert not coordinator.last_update_success
+
+
+@pytest.mark.parametrize("zones", [10, 50])
+async def test_apply_scene_service(hass, simulator, setup_controller, benchmark, zones):
+    """Time for an apply_scene service call that sets every light"""
+    sim = await simulator(zones=zones, latency=LATENCY)
+    await setup_controller(sim)
+    targets = [
+        {ATTR_EFFECT: "Christmas/Pattern 1"},
+        {ATTR_RGB_COLOR: (255, 0, 0)},
+        False,
+    ]
+    entities = {
+        _entity_id(hass, zone): targets[i % len(targets)]
+        for i, zone in enumerate(sim.zone_names)
+    }
+    sim.reset_counters()
+    with benchmark.measure(f"light: apply_scene service call ({zones} zones)"):
+        await hass.services.async_call(
+            DOMAIN, SERVICE_APPLY_SCENE, {ATTR_ENTITIES: entities}, blocking=True
+        )
+    assert len(sim.sets) == len(targets)
+    assert hass.states.get(_entity_id(hass, "Zone 1")).attributes[ATTR_EFFECT] == (
+        "Christmas/Pattern 1"
+    )
+
+
+async def test_stream_effect_targets(hass, simulator, setup_controller):
+    """The stream services accept targets like entity services"""
+    sim = await simulator(zones=3)
+    entry, _ = await setup_controller(sim)
+    api = hass.data[DOMAIN][entry.entry_id].api
+    await hass.services.async_call(
+        DOMAIN,
+        SERVICE_STREAM_EFFECT,
+        {ATTR_EFFECT: "chase"},
+        target={ATTR_ENTITY_ID: _entity_id(hass, "Zone 1")},
+        blocking=True,
+    )
+    assert api.streamer.zones == ["Zone 1"]
+    # Targeting the device streams to every zone
+    [device] = dr.async_entries_for_config_entry(dr.async_get(hass), entry.entry_id)
+    await hass.services.async_call(
+        DOMAIN,
+        SERVICE_STREAM_EFFECT,
+        {ATTR_EFFECT: "chase"},
+        target={ATTR_DEVICE_ID: device.id},
+        blocking=True,
+    )
+    assert sorted(api.streamer.zones) == sorted(sim.zone_names)
+    await hass.services.async_call(
+        DOMAIN, SERVICE_STOP_STREAM, target={ATTR_DEVICE_ID: device.id}, blocking=True
+    )
+    assert not api.streamer.zones
+
+
+@pytest.mark.parametrize("zones", [10, 50])
+async def test_all_zones_light(hass, simulator, setup_controller, benchmark, zones):
+    """Turning every zone on and off through the all zones light"""
+    sim = await simulator(zones=zones, latency=LATENCY)
+    entry, _ = await setup_controller(sim)
+    entity_id = _all_zones_entity_id(hass, entry)
+    sim.reset_counters()
+    for service in (SERVICE_TURN_ON, SERVICE_TURN_OFF) * (ITERATIONS // 2):
+        with benchmark.measure(f"light: all zones {service} ({zones} zones)"):
+            await hass.services.async_call(
+                LIGHT_DOMAIN, service, {ATTR_ENTITY_ID: entity_id}, blocking=True
+            )
+    # One command per call, for all zones
+    await sim.async_wait_for_sets(ITERATIONS)
+    assert len(sim.sets) == ITERATIONS
+    assert all(msg["runPattern"]["zoneName"] == sim.zone_names for msg in sim.sets)
+    # The combined state comes from the cached zone states without fetching
+    assert not [msg for msg in sim.received if msg.get("cmd") == "toCtlrGet"]
+    assert hass.states.get(entity_id).state == "off"
+    await sim.async_push_zone_state("Zone 1", sim.color_state("Zone 1", [1, 2, 3]))
+    await asyncio.sleep(0.1)
+    await hass.async_block_till_done()
+    state = hass.states.get(entity_id)
+    assert state.state == "on"
+    assert state.attributes[ATTR_RGB_COLOR] == (1, 2, 3)
+
+
+@pytest.mark.parametrize("segments", [8])
+async def test_segment_lights(hass, simulator, setup_controller, benchmark, segments):
+    """Turning on every segment light of a 200-light zone in one service call"""
+    sim = await simulator(zones=2, latency=LATENCY, pixels=200)
+    length = 200 // segments
+    definitions = [
+        f"Roofline {i + 1} = Zone 1: {i * length + 1}-{(i + 1) * length}"
+        for i in range(segments)
+    ]
+    entry, _ = await setup_controller(sim, options={CONF_SEGMENTS: definitions})
+    registry = er.async_get(hass)
+    entity_ids = [
+        registry.async_get_entity_id(
+            LIGHT_DOMAIN, DOMAIN, f"{entry.entry_id}_segment_roofline_{i + 1}"
+        )
+        for i in range(segments)
+    ]
+    sim.reset_counters()
+    for i in range(ITERATIONS):
+        with benchmark.measure(f"light: turn on {segments} segments"):
+            await hass.services.async_call(
+                LIGHT_DOMAIN,
+                SERVICE_TURN_ON,
+                {ATTR_ENTITY_ID: entity_ids, ATTR_RGB_COLOR: (i, 0, 0)},
+                blocking=True,
+            )
+    # A single light string per call, whatever the number of segments
+    await sim.async_wait_for_sets(ITERATIONS)
+    assert len(sim.sets) == ITERATIONS
+    for entity_id in entity_ids:
+        state = hass.states.get(entity_id)
+        assert state.state == "on"
+        assert state.attributes[ATTR_RGB_COLOR] == (ITERATIONS - 1, 0, 0)
+
+
+async def _async_record_capture(hass: HomeAssistant, sim, api, path: str) -> None:
+    """Captures a burst of pushes like a schedule transition: every zone changes color
+    several times, then the pattern list is reloaded"""
+    await api.async_start_capture(path)
+    pushes = ITERATIONS * 5
+    for i in range(pushes):
+        zone = sim.zone_names[i % len(sim.zone_names)]
+        await sim.async_push_zone_state(zone, sim.color_state(zone, [i % 256, 0, 0]))
+    await sim.async_push_pattern_list(["Christmas/Captured"])
+    async with asyncio.timeout(5):
+        while api.capture.messages < pushes + 1:
+            await asyncio.sleep(0.001)
+    await api.async_stop_capture()
+
+
+@pytest.mark.parametrize("speed", [None, 1.0])
+async def test_replay_capture(
+    hass, simulator, setup_controller, benchmark, request, tmp_path, speed
+):
+    """Replaying captured push traffic through the client and the light entities, as
+    fast as possible and at the captured rate. Uses the capture given with
+    --replay-capture, or records one from the simulator"""
+    path = request.config.getoption("--replay-capture")
+    if path:
+        _, messages = await hass.async_add_executor_job(load_capture, path)
+        sim = await simulator(zone_names=capture_zones(messages), latency=LATENCY)
+        entry, _ = await setup_controller(sim)
+        api = hass.data[DOMAIN][entry.entry_id].api
+        expected = None
+    else:
+        sim = await simulator(zones=10, latency=LATENCY)
+        entry, _ = await setup_controller(sim)
+        api = hass.data[DOMAIN][entry.entry_id].api
+        path = str(tmp_path / "capture.jsonl.gz")
+        await _async_record_capture(hass, sim, api, path)
+        _, messages = await hass.async_add_executor_job(load_capture, path)
+        expected = dict(api.states)
+        # Replay from a different state so every captured push changes something
+        for zone in sim.zone_names:
+            await sim.async_push_zone_state(zone, dict(sim.states[zone], state=0))
+        async with asyncio.timeout(5):
+            while any(api.states[zone].is_on for zone in sim.zone_names):
+                await asyncio.sleep(0.001)
+    await hass.async_block_till_done()
+    handled = api.metrics.counters["messages_received"]
+    counter = StateWriteCounter(hass)
+    elapsed = await async_replay(api, messages, speed)
+    await hass.async_block_till_done()
+    counter.remove()
+    label = "as fast as possible" if speed is None else f"at {speed}x"
+    benchmark.record(f"light: replay {label} (per message)", elapsed / len(messages))
+    benchmark.observe(
+        f"light: replay {label} state writes per message",
+        counter.writes / len(messages),
+    )
+    assert api.metrics.counters["messages_received"] == handled + len(messages)
+    if speed:
+        # Messages are handled no earlier than they were captured
+        assert elapsed >= messages[-1][0] / speed
+    if expected is not None:
+        assert api.states == expected
+        assert counter.writes >= len(sim.zone_names)
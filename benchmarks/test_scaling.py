@@ -0,0 +1,167 @@
+"""Benchmarks for running many controllers in one Home Assistant instance"""
+
+import asyncio
+import socket
+import threading
+import time
+import tracemalloc
+import pytest
+from homeassistant.components.light import DOMAIN as LIGHT_DOMAIN
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from custom_components.jellyfish_lighting.api import JellyfishLightingApiClient
+from custom_components.jellyfish_lighting.const import (
+    DOMAIN,
+    ATTR_ENTITIES,
+    ATTR_SYNCHRONIZE,
+    SERVICE_APPLY_SCENE,
+    STARTUP_CONCURRENCY,
+)
+from custom_components.jellyfish_lighting.discovery import async_discover
+
+LATENCY = 0.005
+
+
+@pytest.mark.parametrize("controllers", [25])
+async def test_many_controllers(hass: HomeAssistant, simulator, benchmark, controllers):
+    """Starting many controllers at once, and what each one costs once connected"""
+    sims = [
+        await simulator(zones=10, patterns=200, latency=LATENCY)
+        for _ in range(controllers)
+    ]
+    threads = threading.active_count()
+    tracemalloc.start()
+    try:
+        memory = tracemalloc.get_traced_memory()[0]
+        clients = [JellyfishLightingApiClient(sim.address, None, hass) for sim in sims]
+        with benchmark.measure(f"scale: start {controllers} controllers"):
+            await asyncio.gather(*(api.async_get_data() for api in clients))
+        memory = tracemalloc.get_traced_memory()[0] - memory
+    finally:
+        tracemalloc.stop()
+    try:
+        # Includes the simulator's side of each connection
+        benchmark.observe(
+            "scale: memory per controller (KiB)", memory / controllers / 1024
+        )
+        tasks = [
+            task
+            for task in asyncio.all_tasks()
+            if "JellyfishLighting" in task.get_coro().__qualname__
+        ]
+        benchmark.observe("scale: tasks per controller", len(tasks) / controllers)
+        benchmark.observe(
+            "scale: threads per controller",
+            (threading.active_count() - threads) / controllers,
+        )
+        for api in clients:
+            benchmark.record(
+                "scale: wait for a startup slot",
+                api.metrics.histograms["startup_wait"].total / 1000,
+            )
+        # Controllers share the event loop and HTTP session instead of using threads
+        assert threading.active_count() == threads
+        # A reader and a heartbeat task per connection
+        assert len(tasks) <= 2 * controllers
+        assert all(len(api.zones) == 10 for api in clients)
+        waited = sum(
+            1 for api in clients if api.metrics.histograms["startup_wait"].maximum > 1
+        )
+        assert waited >= controllers - STARTUP_CONCURRENCY
+    finally:
+        for api in clients:
+            await api.async_disconnect()
+
+
+@pytest.mark.parametrize("synchronize", [False, True])
+async def test_synchronized_scene(
+    hass: HomeAssistant, simulator, setup_controller, benchmark, synchronize
+):
+    """A scene spanning controllers that take different times to process requests"""
+    latencies = (0.005, 0.05, 0.15)
+    sims = [
+        await simulator(zones=5, latency=latency, name=f"Controller {i + 1}")
+        for i, latency in enumerate(latencies)
+    ]
+    entity_ids = []
+    for sim in sims:
+        entry, _ = await setup_controller(sim)
+        entity_ids.append(
+            er.async_get(hass).async_get_entity_id(
+                LIGHT_DOMAIN, DOMAIN, f"{entry.entry_id}_all_zones"
+            )
+        )
+        sim.reset_counters()
+    label = "synchronized" if synchronize else "unsynchronized"
+    with benchmark.measure(f"scale: {label} scene ({len(sims)} controllers)"):
+        response = await hass.services.async_call(
+            DOMAIN,
+            SERVICE_APPLY_SCENE,
+            {
+                ATTR_ENTITIES: {entity_id: True for entity_id in entity_ids},
+                ATTR_SYNCHRONIZE: synchronize,
+            },
+            blocking=True,
+            return_response=True,
+        )
+    applied = [sim.applied[0] for sim in sims]
+    spread = max(applied) - min(applied)
+    benchmark.observe(f"scale: {label} scene spread (ms)", spread * 1000)
+    # Every controller reports how long it took, and none failed
+    results = response["controllers"]
+    assert [result["name"] for result in results] == [sim.name for sim in sims]
+    assert not [result for result in results if "error" in result]
+    if synchronize:
+        # Faster controllers were held back so the changes land together
+        assert results[0]["delay_ms"] > results[1]["delay_ms"] > 0
+        assert results[2]["delay_ms"] == 0
+        assert spread < 0.05
+    else:
+        assert spread > 0.1
+
+
+def _closed_port() -> int:
+    """A local port nothing listens on"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.mark.parametrize("controllers", [12])
+async def test_discovery(hass: HomeAssistant, simulator, benchmark, controllers):
+    """Scanning addresses where a few controllers answer, most refuse the connection and
+    some accept it but never answer"""
+    timeout = 0.5
+    sims = [
+        await simulator(zones=1, latency=LATENCY, name=f"Controller {i + 1}")
+        for i in range(controllers)
+    ]
+
+    async def _silent(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        await reader.read()
+        writer.close()
+
+    silent = [await asyncio.start_server(_silent, "127.0.0.1", 0) for _ in range(8)]
+    addresses = [sim.address for sim in sims]
+    addresses += [f"127.0.0.1:{_closed_port()}" for _ in range(200)]
+    addresses += [
+        f"127.0.0.1:{server.sockets[0].getsockname()[1]}" for server in silent
+    ]
+    try:
+        start = time.perf_counter()
+        found = await async_discover(
+            async_get_clientsession(hass), addresses, timeout=timeout
+        )
+        elapsed = time.perf_counter() - start
+    finally:
+        for server in silent:
+            server.close()
+    benchmark.record(
+        f"scale: discover {controllers} among {len(addresses)} hosts", elapsed
+    )
+    assert [info.address for info in found] == [sim.address for sim in sims]
+    assert [info.name for info in found] == [sim.name for sim in sims]
+    assert all(info.version == "2.4.0" for info in found)
+    # Hosts that never answer cost one timeout, in parallel with everything else
+    assert elapsed < timeout * 3
@@ -2,22 +2,32 @@
 Custom integration to integrate JellyFish Lighting with Home Assistant.
 """
 
+from datetime import datetime
+import time
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import Config, HomeAssistant
-from homeassistant.exceptions import ConfigEntryNotReady
+from homeassistant.core import Config, HomeAssistant, callback
+from homeassistant.exceptions import ConfigEntryNotReady, HomeAssistantError
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 from homeassistant.helpers import device_registry
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.storage import Store
 
 from .api import JellyfishLightingApiClient
+from .services import async_setup_services
 
 from .const import (
     LOGGER,
     SCAN_INTERVAL,
+    MAX_SCAN_INTERVAL,
+    PUSH_STALE_TIMEOUT,
+    WATCHDOG_INTERVAL,
+    STORAGE_KEY,
+    STORAGE_VERSION,
     CONF_ADDRESS,
     DOMAIN,
     NAME,
     DEVICE,
-    LIGHT,
+    PLATFORMS,
     STARTUP_MESSAGE,
 )
 
@@ -26,6 +36,7 @@ async def async_setup(
     hass: HomeAssistant, config: Config
 ):  # pylint: disable=unused-argument
     """Setting up this integration using YAML is not supported."""
+    async_setup_services(hass)
     return True
 
 
@@ -49,68 +60,119 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
     address = entry.data.get(CONF_ADDRESS)
     client = JellyfishLightingApiClient(address, entry, hass)
     coordinator = JellyfishLightingDataUpdateCoordinator(hass, client=client)
-    await coordinator.async_refresh()
-    # try:
-    #     await client.async_get_data()
-    # except Exception as e:
-    #     LOGGER.exception("Error fetching %s data", DOMAIN)
-    #     raise ConfigEntryNotReady from e
-    hass.config_entries.async_update_entry(
-        entry, title=f"{client.name} ({client.hostname})"
-    )
-
-    if not coordinator.last_update_success:
-        raise ConfigEntryNotReady
-
-    registry = device_registry.async_get(hass)
-    registry.async_get_or_create(
-        config_entry_id=entry.entry_id,
-        identifiers={(DOMAIN, client.hostname)},
-        name=client.name,
-        manufacturer=NAME,
-        model=DEVICE,
-        sw_version=client.version,
-    )
+    try:
+        if await client.async_load_cache():
+            # Create entities from the cached metadata right away and connect in the
+            # background
+            entry.async_create_background_task(
+                hass, coordinator.async_refresh(), f"{DOMAIN} refresh {address}"
+            )
+        else:
+            await coordinator.async_refresh()
+            if not coordinator.last_update_success:
+                raise ConfigEntryNotReady
+            hass.config_entries.async_update_entry(
+                entry, title=f"{client.name} ({client.hostname})"
+            )
+
+        registry = device_registry.async_get(hass)
+        registry.async_get_or_create(
+            config_entry_id=entry.entry_id,
+            identifiers={(DOMAIN, client.hostname)},
+            name=client.name,
+            manufacturer=NAME,
+            model=DEVICE,
+            sw_version=client.version,
+        )
+
+        hass.data[DOMAIN][entry.entry_id] = coordinator
+        await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    except Exception:
+        # Stop the client's reconnection attempts, or every retry of the setup would
+        # leave another client behind
+        hass.data[DOMAIN].pop(entry.entry_id, None)
+        try:
+            await client.async_disconnect()
+        except HomeAssistantError as ex:
+            LOGGER.debug("Error closing client after failed setup: %s", ex)
+        raise
 
-    hass.data[DOMAIN][entry.entry_id] = coordinator
-    await hass.async_create_task(
-        hass.config_entries.async_forward_entry_setup(entry, LIGHT)
+    entry.async_on_unload(
+        async_track_time_interval(hass, coordinator.async_check_push, WATCHDOG_INTERVAL)
     )
-
     entry.async_on_unload(entry.add_update_listener(async_reload_entry))
     return True
 
 
 class JellyfishLightingDataUpdateCoordinator(DataUpdateCoordinator):
-    """Class to manage fetching data from the API."""
+    """Class to manage fetching data from the API.
+    Relies on push updates while the connection is healthy and falls back to
+    polling (see async_check_push) when pushes go stale or the socket drops"""
 
     def __init__(self, hass: HomeAssistant, client: JellyfishLightingApiClient) -> None:
         """Initialize."""
         self.api = client
-        self.platforms = [LIGHT]
-        super().__init__(hass, LOGGER, name=DOMAIN, update_interval=SCAN_INTERVAL)
+        self.platforms = PLATFORMS
+        super().__init__(hass, LOGGER, name=DOMAIN, update_interval=None)
+
+    @property
+    def push_healthy(self) -> bool:
+        """Indicates whether the controller is connected and has pushed data recently"""
+        return (
+            self.api.connected
+            and time.monotonic() - self.api.last_push
+            < PUSH_STALE_TIMEOUT.total_seconds()
+        )
 
     async def _async_update_data(self):
         """Update data via library."""
         try:
-            return await self.api.async_get_data()
+            data = await self.api.async_get_data()
         except Exception as exception:
             LOGGER.exception("Error fetching %s data", DOMAIN)
+            if self.update_interval is not None:
+                # Back off while the controller is unreachable
+                self.update_interval = min(self.update_interval * 2, MAX_SCAN_INTERVAL)
             raise UpdateFailed() from exception
+        if self.update_interval is not None:
+            self.update_interval = SCAN_INTERVAL
+        return data
+
+    @callback
+    def async_check_push(self, now: datetime = None) -> None:
+        """Watchdog that switches between push and polling modes"""
+        if self.push_healthy:
+            if self.update_interval is not None:
+                LOGGER.info(
+                    "Push updates from %s restored, polling stopped", self.api.address
+                )
+                self.update_interval = None
+        elif self.update_interval is None:
+            LOGGER.info(
+                "Push updates from %s are stale or disconnected, polling every %s",
+                self.api.address,
+                SCAN_INTERVAL,
+            )
+            self.update_interval = SCAN_INTERVAL
+            self.hass.async_create_task(self.async_request_refresh())
 
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Handle removal of an entry."""
     LOGGER.info("Unloading JellyFish Lighting integration")
-    # coordinator = hass.data[DOMAIN][entry.entry_id]
-    unloaded = await hass.config_entries.async_forward_entry_unload(entry, LIGHT)
+    unloaded = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if unloaded:
-        hass.data[DOMAIN].pop(entry.entry_id)
+        coordinator = hass.data[DOMAIN].pop(entry.entry_id)
+        await coordinator.api.async_disconnect()
     return unloaded
 
 
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Remove cached controller data when an entry is deleted."""
+    await Store(hass, STORAGE_VERSION, f"{STORAGE_KEY}.{entry.entry_id}").async_remove()
+
+
 async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
     """Reload config entry."""
     LOGGER.info("Reloading JellyFish Lighting integration")
-    await async_unload_entry(hass, entry)
-    await async_setup_entry(hass, entry)
+    await hass.config_entries.async_reload(entry.entry_id)
@@ -1,17 +1,20 @@
 """Sample API Client."""
 
 import asyncio
-from typing import List, Tuple, Dict
+from dataclasses import dataclass, replace
+from functools import wraps
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple, Dict
 from homeassistant.core import HomeAssistant
 from homeassistant.exceptions import HomeAssistantError
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.helpers.update_coordinator import (
-    CoordinatorEntity,
-    DataUpdateCoordinator,
-)
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.storage import Store
 from jellyfishlightspy import (
-    JellyFishController,
     JellyFishException,
+    Pattern,
+    PatternConfig,
+    RunConfig,
     ZoneState,
     NAME_DATA,
     HOSTNAME_DATA,
@@ -20,8 +23,84 @@ from jellyfishlightspy import (
     PATTERN_LIST_DATA,
     PATTERN_CONFIG_DATA,
     ZONE_STATE_DATA,
+    DELETE_PATTERN_DATA,
+)
+from .const import (
+    LOGGER,
+    DOMAIN_DATA,
+    DEFAULT_BRIGHTNESS,
+    BATCH_WINDOW,
+    COMMAND_TIMEOUT,
+    OPTIMISTIC_TIMEOUT,
+    STORAGE_KEY,
+    STORAGE_VERSION,
+    STORAGE_SAVE_DELAY,
+    STREAM_FPS,
+    STARTUP_CONCURRENCY,
+    TRANSITION_RATE,
+)
+from .capture import JellyfishLightingCapture
+from .catalog import JellyfishLightingPatternCatalog
+from .connection import JellyfishLightingConnection
+from .effects import Effect
+from .metrics import JellyfishLightingMetrics
+from .segments import JellyfishLightingCompositor, JellyfishLightingSegment
+from .stream import JellyfishLightingStreamer
+from .trace import (
+    JellyfishLightingTrace,
+    TRACE_PUSH_DECODED,
+    TRACE_COMMAND_SENT,
+    TRACE_COMMAND_ACKED,
 )
-from .const import LOGGER, DOMAIN
+from .transport import JellyfishLightingTransport
+
+
+class _CommandBatch:
+    """Zones collected within the batching window for a single multi-zone controller call"""
+
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+        self.zones: List[str] = []
+        # Zones whose command was replaced by a newer one before it was sent
+        self.superseded: Dict[str, "_CommandBatch"] = {}
+        self.sending = False
+        self.handle: Optional[asyncio.TimerHandle] = None
+
+
+def _timed(operation: str):
+    """Records the duration of successful calls of a client method in its metrics"""
+
+    def decorator(method):
+        @wraps(method)
+        async def wrapper(self: "JellyfishLightingApiClient", *args, **kwargs):
+            with self.metrics.timer(operation):
+                return await method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _startup_slots(hass: HomeAssistant) -> asyncio.Semaphore:
+    """Bounds how many controllers are connected to and fetched at once, across all
+    config entries"""
+    data = hass.data.setdefault(DOMAIN_DATA, {})
+    if "startup_slots" not in data:
+        data["startup_slots"] = asyncio.Semaphore(STARTUP_CONCURRENCY)
+    return data["startup_slots"]
+
+
+def _interpolate(
+    start: "JellyFishLightingZoneData",
+    end: "JellyFishLightingZoneData",
+    fraction: float,
+) -> Tuple[Tuple[int, int, int], int]:
+    """The color and brightness at a fraction of the way between two color states"""
+    rgb = tuple(round(a + (b - a) * fraction) for a, b in zip(start.color, end.color))
+    brightness = round(
+        start.brightness + (end.brightness - start.brightness) * fraction
+    )
+    return rgb, brightness
 
 
 class JellyfishLightingApiClient:
@@ -34,149 +113,622 @@ class JellyfishLightingApiClient:
         self.address = address
         self._config_entry = config_entry
         self._hass = hass
-        self._controller = JellyFishController(address)
-        self._connecting = asyncio.Lock()
+        self.metrics = JellyfishLightingMetrics()
+        self.trace = JellyfishLightingTrace()
+        self.capture: Optional[JellyfishLightingCapture] = None
+        self._controller = JellyfishLightingTransport(
+            address, async_get_clientsession(hass), self.metrics, self.trace
+        )
+        self._batches: Dict[tuple, _CommandBatch] = {}
+        # The pending command of each zone, and the commands awaiting processing
+        self._queued: Dict[str, _CommandBatch] = {}
+        self._in_flight: Dict[str, Tuple[asyncio.Future, float]] = {}
+        self._unconfirmed: Dict[
+            str, Tuple[Optional[JellyFishLightingZoneData], asyncio.TimerHandle]
+        ] = {}
+        self._fades: Dict[str, object] = {}
         self.zones: List[str] = []
         self.states: Dict[str, JellyFishLightingZoneData] = {}
-        self.patterns: List[str] = []
+        self.catalog = JellyfishLightingPatternCatalog()
         self.name: str = None
         self.hostname: str = None
         self.version: str = None
+        self.last_push: float = 0
+        self._info_current = False
+        self._catalog_current = False
+        # Number of async_get_data calls in progress
+        self._fetching = 0
+        # Set once the client was disconnected, after which it must not reconnect
+        self._closed = False
+        self._store: Store | None = (
+            Store(hass, STORAGE_VERSION, f"{STORAGE_KEY}.{config_entry.entry_id}")
+            if config_entry
+            else None
+        )
+        self._saved: dict | None = None
+        self._zone_listeners: Dict[str, List[Callable[[], None]]] = {}
+        self._listeners: List[Callable[[], None]] = []
         self._controller.add_listener(
-            on_message=self._recieve_push, on_error=self._attempt_reconnect
+            on_open=self._async_connection_opened,
+            on_close=self._async_notify_all,
+            on_message=self._recieve_push,
         )
+        self._connection = JellyfishLightingConnection(self._controller)
+        self.streamer = JellyfishLightingStreamer(self._controller)
+        self.segments = JellyfishLightingCompositor(self._controller, self.zone_pixels)
+
+    async def async_load_cache(self) -> bool:
+        """Loads controller metadata saved during a previous session.
+        Returns True if a zone list was loaded"""
+        if not self._store:
+            return False
+        data = await self._store.async_load()
+        if not data:
+            return False
+        self.name = data.get("name")
+        self.hostname = data.get("hostname")
+        self.version = data.get("version")
+        self.zones = data.get("zones", [])
+        self.catalog.update(data.get("patterns", []))
+        self._saved = data
+        LOGGER.debug("Loaded cached controller data for %s", self.address)
+        return bool(self.zones)
+
+    def _async_save_cache(self) -> None:
+        """Schedules the controller metadata to be saved to disk if it changed"""
+        data = {
+            "name": self.name,
+            "hostname": self.hostname,
+            "version": self.version,
+            "zones": self.zones,
+            "patterns": self.patterns,
+        }
+        if self._store and data != self._saved:
+            self._saved = data
+            self._store.async_delay_save(lambda: data, STORAGE_SAVE_DELAY)
+
+    @property
+    def patterns(self) -> List[str]:
+        """The names of all patterns in sorted order"""
+        return self.catalog.names
+
+    def zone_pixels(self, zone: str) -> Optional[int]:
+        """The number of lights in a zone, or None if the zone is not known (yet)"""
+        config = self._controller.zone_configs.get(zone)
+        return config.numPixels if config else None
 
     @property
-    def _coord(self) -> DataUpdateCoordinator:
-        return self._hass.data[DOMAIN][self._config_entry.entry_id]
+    def round_trip_time(self) -> float:
+        """Shortest time (seconds) the controller took to reply to a request, which
+        excludes time spent queued behind other requests, or 0 if no request was timed
+        """
+        histogram = self.metrics.histograms.get("request")
+        return histogram.minimum / 1000 if histogram else 0.0
 
     @property
     def connecting(self) -> bool:
         """Indicates whether the client is currently attempting to connect to the controller"""
-        return self._connecting.locked()
+        return self._connection.connecting
 
     @property
     def connected(self) -> bool:
         """Indicates whether the client is connected to the controller"""
         return self._controller.connected
 
-    def register_push_listener(self, entity: CoordinatorEntity) -> None:
-        """Adds a listener that is called when push events are received from the controller"""
+    def async_add_zone_listener(
+        self, zone: str | None, update_callback: Callable[[], None]
+    ) -> Callable[[], None]:
+        """Adds a callback that is invoked when a push event affects the zone (or any
+        zone if zone is None), and on connection changes. Returns a function that removes it
+        """
+        listeners = (
+            self._listeners
+            if zone is None
+            else self._zone_listeners.setdefault(zone, [])
+        )
+        listeners.append(update_callback)
+        return lambda: listeners.remove(update_callback)
 
-        def listener(*args):
-            async def update():
-                entity.schedule_update_ha_state(force_refresh=False)
+    def _async_notify_zones(self, zones: List[str]) -> None:
+        """Notifies listeners of the given zones, and listeners of all zones, once each"""
+        for zone in zones:
+            for update_callback in list(self._zone_listeners.get(zone, [])):
+                update_callback()
+        for update_callback in list(self._listeners):
+            update_callback()
 
-            asyncio.run_coroutine_threadsafe(update(), self._hass.loop)
-            # self._hass.async_create_task(update())
-            # self._hass.loop.create_task(entity.async_write_ha_state())
-            # self._hass.async_create_task(entity.async_write_ha_state)
-            # asyncio.run_coroutine_threadsafe(
-            #     entity.async_write_ha_state(), self._hass.loop
-            # )
+    def _async_update_states(
+        self, states: Dict[str, "JellyFishLightingZoneData"]
+    ) -> List[str]:
+        """Stores zone states and returns the zones whose state actually changed"""
+        changed = [
+            zone for zone, state in states.items() if self.states.get(zone) != state
+        ]
+        for zone in changed:
+            self.states[zone] = states[zone]
+        return changed
 
-        self._controller.add_listener(
-            on_open=listener,
-            on_close=listener,
-            on_message=listener,
-            on_error=listener,
+    def _async_set_optimistic(
+        self, zone: str, state: "JellyFishLightingZoneData"
+    ) -> None:
+        """Writes the expected state of a zone once a command has been sent. The state is
+        reconciled by the controller's push, or by a fetch if no push arrives in time"""
+        previous, deadline = self._unconfirmed.pop(zone, (self.states.get(zone), None))
+        if deadline:
+            deadline.cancel()
+        self._unconfirmed[zone] = (
+            previous,
+            self._hass.loop.call_later(
+                OPTIMISTIC_TIMEOUT,
+                lambda: self._hass.async_create_task(self._async_reconcile(zone)),
+            ),
         )
+        if self._async_update_states({zone: state}):
+            self._async_notify_zones([zone])
+
+    def _async_confirm(self, zones: List[str]) -> None:
+        """Marks optimistic zone states as confirmed by the controller"""
+        for zone in zones:
+            _, deadline = self._unconfirmed.pop(zone, (None, None))
+            if deadline:
+                deadline.cancel()
 
-    def _attempt_reconnect(self, *args) -> None:
-        """Attempts to reconnect to the controller"""
-        asyncio.run_coroutine_threadsafe(self.async_connect(), self._hass.loop)
+    def _async_release(self, zones: List[str], confirmed: bool = True) -> None:
+        """Marks the commands sent to zones as processed by the controller, or as no
+        longer awaited if not confirmed"""
+        for zone in zones:
+            in_flight, sent = self._in_flight.pop(zone, (None, 0))
+            if in_flight and not in_flight.done():
+                in_flight.set_result(None)
+                if not confirmed:
+                    continue
+                elapsed = time.perf_counter() - sent
+                self.metrics.record("command_confirmation", elapsed)
+                if self.trace.enabled:
+                    self.trace.record(
+                        TRACE_COMMAND_ACKED, zone=zone, ms=round(elapsed * 1000, 2)
+                    )
+
+    async def _async_reconcile(self, zone: str) -> None:
+        """Fetches the state of a zone that was not confirmed by a push in time, and
+        rolls back to the last confirmed state if it cannot be retrieved"""
+        try:
+            await self.async_get_zone_states(zone)
+            self._async_confirm([zone])
+        except HomeAssistantError as ex:
+            previous, _ = self._unconfirmed.pop(zone, (None, None))
+            LOGGER.warning("Reverting state of zone '%s': %s", zone, ex)
+            if previous and self._async_update_states({zone: previous}):
+                self._async_notify_zones([zone])
+
+    def _async_connection_opened(self) -> None:
+        """Marks cached controller data as stale (pushes may have been missed while
+        disconnected), refetches it unless a fetch is already in progress, and notifies
+        listeners of the availability change"""
+        self._info_current = False
+        self._catalog_current = False
+        if not self._fetching:
+            # Zones may have been changed (e.g. by the app or a schedule) while
+            # disconnected, or never fetched if the controller was offline at startup
+            # and the connection was established by a background retry
+            self._hass.async_create_task(self._async_refetch())
+        self._async_notify_all()
+
+    async def _async_refetch(self) -> None:
+        """Fetches controller data after connecting outside of async_get_data"""
+        try:
+            await self.async_get_data()
+        except HomeAssistantError as ex:
+            LOGGER.warning("Unable to refresh data after connecting: %s", ex)
+
+    def _async_notify_all(self, *args) -> None:
+        """Notifies every listener (e.g. availability changes on connect/disconnect)"""
+        self._async_notify_zones(list(self._zone_listeners))
 
     def _recieve_push(self, data):
-        """Updates state data when a push event is received from the controller"""
-
-        async def update():
-            if NAME_DATA in data:
-                self.name = self._controller.name
-                LOGGER.debug("[PUSH UPDATE] Name: %s", self.name)
-            elif HOSTNAME_DATA in data:
-                self.hostname = self._controller.hostname
-                LOGGER.debug("[PUSH UPDATE] Hostname: %s", self.hostname)
-            elif FIRMWARE_VERSION_DATA in data:
-                self.version = self._controller.firmware_version.ver
-                LOGGER.debug("[PUSH UPDATE] Version: %s", self.version)
-            elif ZONE_CONFIG_DATA in data:
-                self.zones = self._controller.zone_names
-                LOGGER.debug("[PUSH UPDATE] Zones: %s", ", ".join(self.zones))
-            elif PATTERN_LIST_DATA in data or PATTERN_CONFIG_DATA in data:
-                patterns = self._controller.pattern_names
-                patterns.sort()
-                self.patterns = patterns
-                LOGGER.debug("[PUSH UPDATE] Patterns: %s", ", ".join(self.patterns))
-            elif ZONE_STATE_DATA in data:
-                for zone, state in self._controller.zone_states.items():
-                    if not state:
-                        continue
-                    state = JellyFishLightingZoneData.from_zone_state(state)
-                    self.states[zone] = state
-                    LOGGER.debug("[PUSH UPDATE] '%s' State: %s", zone, state)
-            self._coord.async_set_updated_data(data)
-
-        asyncio.run_coroutine_threadsafe(update(), self._hass.loop)
+        """Updates cached data when a message is received from the controller. Every kind
+        of data in the message is applied from its own part of the payload, derived data
+        is only rebuilt when its own data arrives, and listeners are notified once"""
+        self.last_push = time.monotonic()
+        self.metrics.increment("pushes")
+        save = notify_all = False
+        info = {}
+        if NAME_DATA in data:
+            info["name"] = data[NAME_DATA]
+        if HOSTNAME_DATA in data:
+            info["hostname"] = data[HOSTNAME_DATA]
+        if FIRMWARE_VERSION_DATA in data:
+            info["version"] = data[FIRMWARE_VERSION_DATA].ver
+        for attr, value in info.items():
+            LOGGER.debug("[PUSH UPDATE] %s: %s", attr, value)
+            if getattr(self, attr) != value:
+                setattr(self, attr, value)
+                save = True
+        if ZONE_CONFIG_DATA in data:
+            zones = list(data[ZONE_CONFIG_DATA])
+            LOGGER.debug("[PUSH UPDATE] Zones: %s", zones)
+            if zones != self.zones:
+                self.zones = zones
+                save = notify_all = True
+        if self._async_update_catalog(data):
+            save = notify_all = True
+        changed = []
+        if ZONE_STATE_DATA in data:
+            changed = self._async_apply_zone_state(data[ZONE_STATE_DATA])
+        if self.trace.enabled:
+            self.trace.record(
+                TRACE_PUSH_DECODED,
+                data=[key for key in data if key != "cmd"],
+                changed=changed,
+                notify_all=notify_all,
+            )
+        if save:
+            self._async_save_cache()
+        if notify_all:
+            self._async_notify_all()
+        elif changed:
+            self._async_notify_zones(changed)
+
+    def _async_update_catalog(self, data) -> bool:
+        """Applies pattern list, pattern config and pattern deletion data to the catalog.
+        Returns True if the catalog changed"""
+        changed = False
+        if PATTERN_LIST_DATA in data:
+            changed |= self.catalog.update(
+                [str(p) for p in data[PATTERN_LIST_DATA] if not p.is_folder]
+            )
+        if PATTERN_CONFIG_DATA in data:
+            config = data[PATTERN_CONFIG_DATA]
+            pattern = Pattern(config["folders"], config["name"])
+            if not pattern.is_folder:
+                changed |= self.catalog.add(str(pattern))
+                self.catalog.put_config(str(pattern), config["jsonData"])
+        if DELETE_PATTERN_DATA in data:
+            changed |= self.catalog.remove(str(data[DELETE_PATTERN_DATA]))
+        if changed or PATTERN_LIST_DATA in data:
+            LOGGER.debug(
+                "[PUSH UPDATE] Patterns: %s (changed: %s)", len(self.catalog), changed
+            )
+        return changed
+
+    def _async_apply_zone_state(self, zone_state: ZoneState) -> List[str]:
+        """Stores the state pushed for the zones in the payload. Returns the zones whose
+        state changed"""
+        state = JellyFishLightingZoneData.from_zone_state(zone_state)
+        # The controller handles requests in order, so it is done with earlier commands
+        self._async_release(zone_state.zoneName)
+        # Intermediate steps of a transition are not reflected in the zone state
+        zones = [zone for zone in zone_state.zoneName if zone not in self._fades]
+        cleared = []
+        if not state.is_on or state.file or state.color:
+            # The zones show something other than a segment frame (e.g. a pattern run
+            # from the app), so their segments are no longer lit
+            cleared = [zone for zone in zones if self.segments.clear(zone)]
+        self._async_confirm(zones)
+        changed = self._async_update_states({zone: state for zone in zones})
+        LOGGER.debug("[PUSH UPDATE] %s State: %s", changed, state)
+        return changed + [zone for zone in cleared if zone not in changed]
 
     async def async_connect(self):
         """Establish connection to the controller"""
-        if self.connected or self.connecting:
+        if self._closed:
+            raise HomeAssistantError(
+                f"Client for JellyFish Lighting controller at {self.address} is closed"
+            )
+        if self.connected:
             return
         try:
-            async with self._connecting:
-                LOGGER.debug(
-                    "Connecting to the JellyFish Lighting controller at %s",
-                    self.address,
-                )
-                await self._hass.async_add_executor_job(self._controller.connect, 5)
+            LOGGER.debug(
+                "Connecting to the JellyFish Lighting controller at %s", self.address
+            )
+            await self._connection.async_connect()
         except JellyFishException as ex:
             raise HomeAssistantError(
                 f"Failed to connect to JellyFish Lighting controller at {self.address}"
             ) from ex
 
     async def async_disconnect(self):
-        """Disconnects from the controller"""
-        if not self.connected:
-            return
+        """Disconnects from the controller and stops reconnecting. The client cannot be
+        connected again afterwards"""
+        self._closed = True
         try:
-            async with self._connecting:
-                LOGGER.debug(
-                    "Disconnecting from the JellyFish Lighting controller at %s",
-                    self.address,
-                )
-                await self._hass.async_add_executor_job(self._controller.disconnect, 5)
+            await self.async_stop_capture()
+        except HomeAssistantError as ex:
+            LOGGER.warning("Lost captured messages: %s", ex)
+        try:
+            LOGGER.debug(
+                "Disconnecting from the JellyFish Lighting controller at %s",
+                self.address,
+            )
+            self.streamer.stop()
+            self.segments.cancel()
+            self._fades.clear()
+            self._async_cancel_pending()
+            self._async_release(list(self._in_flight))
+            await self._connection.async_disconnect()
         except JellyFishException as ex:
             raise HomeAssistantError(
                 f"Failed to disconnect from JellyFish Lighting controller at {self.address}"
             ) from ex
 
+    def _async_cancel_pending(self) -> None:
+        """Cancels commands waiting for their batching window to close and the
+        reconciliation of unconfirmed zone states"""
+        for _, deadline in self._unconfirmed.values():
+            deadline.cancel()
+        self._unconfirmed.clear()
+        for batch in self._batches.values():
+            batch.handle.cancel()
+            batch.future.set_exception(
+                JellyFishException(f"Client for controller at {self.address} closed")
+            )
+            # Avoid "exception never retrieved" warnings if nobody waits for the batch
+            batch.future.exception()
+        self._batches.clear()
+        self._queued.clear()
+
+    async def async_start_capture(self, path: str) -> None:
+        """Starts writing the raw messages received from the controller to a file,
+        replacing any capture in progress"""
+        await self.async_stop_capture()
+        capture = JellyfishLightingCapture(self._hass, path, self.address)
+        try:
+            await capture.async_start()
+        except OSError as ex:
+            raise HomeAssistantError(f"Unable to create capture file {path}") from ex
+        LOGGER.debug("Capturing messages from %s to %s", self.address, path)
+        self.capture = capture
+        self._controller.capture = capture.record
+
+    async def async_stop_capture(self) -> Optional[JellyfishLightingCapture]:
+        """Stops capturing messages and closes the file. Returns the stopped capture, if
+        any"""
+        capture, self.capture = self.capture, None
+        self._controller.capture = None
+        if capture:
+            try:
+                await capture.async_stop()
+            except OSError as ex:
+                raise HomeAssistantError(
+                    f"Unable to write capture file {capture.path}"
+                ) from ex
+        return capture
+
+    async def _async_batched(
+        self,
+        key: tuple,
+        zone: Optional[str],
+        send: Callable[[Optional[List[str]]], Awaitable[None]],
+        optimistic: Callable[
+            ["JellyFishLightingZoneData"], "JellyFishLightingZoneData"
+        ] = None,
+    ) -> None:
+        """Queues a zone (or all zones if None) for a command that is sent once, for all
+        zones collected under the same key, when the batching window closes. If provided,
+        optimistic maps each zone's current state to its expected state once the command
+        is sent. Such state changes are queued latest-wins: a newer state change replaces
+        a zone's command that has not been sent yet (whose caller then waits for the newer
+        one), and is only sent once the controller processed the zone's previous command
+        """
+        zones = list(self.zones) if zone is None else [zone]
+        batch = self._batches.get(key)
+        if batch is None:
+            batch = self._batches[key] = _CommandBatch(self._hass.loop.create_future())
+            batch.handle = self._hass.loop.call_later(
+                BATCH_WINDOW,
+                self._async_window_closed,
+                key,
+                send,
+                optimistic,
+                self._hass.loop.time() + BATCH_WINDOW,
+            )
+        for zone in zones:
+            self._async_queue(batch, zone, bool(optimistic))
+        await asyncio.gather(*(self._async_wait(batch, zone) for zone in zones))
+
+    def _async_queue(
+        self, batch: _CommandBatch, zone: str, changes_state: bool
+    ) -> None:
+        """Adds a zone to a batch, replacing the zone's unsent state change if this is
+        also a state change"""
+        if changes_state:
+            # Commands take over zones that are streaming an effect, transitioning or
+            # showing segments
+            self.streamer.stop([zone])
+            self._fades.pop(zone, None)
+            self._async_clear_segments(zone)
+        if zone not in batch.zones:
+            batch.zones.append(zone)
+        batch.superseded.pop(zone, None)
+        if changes_state:
+            queued = self._queued.get(zone)
+            if queued is not None and queued is not batch and not queued.sending:
+                queued.zones.remove(zone)
+                queued.superseded[zone] = batch
+                self.metrics.increment("commands_superseded")
+            self._queued[zone] = batch
+
+    def _async_clear_segments(self, zone: str) -> None:
+        """Forgets the segments of a zone that another command takes over"""
+        if self.segments.clear(zone, superseded=True):
+            self._async_notify_zones([zone])
+
+    @staticmethod
+    async def _async_wait(batch: _CommandBatch, zone: str) -> None:
+        """Waits until the command for a zone was sent, following it to the newer
+        command that replaced it if it was superseded"""
+        while True:
+            await asyncio.wait([batch.future])
+            if zone not in batch.superseded:
+                return batch.future.result()
+            batch = batch.superseded[zone]
+
+    def _async_window_closed(
+        self,
+        key: tuple,
+        send: Callable[[List[str]], Awaitable[None]],
+        optimistic: Optional[Callable],
+        due: float,
+    ) -> None:
+        """Flushes a batch once its window closed. How late this runs shows how busy the
+        event loop is"""
+        self.metrics.record("event_loop_lag", self._hass.loop.time() - due)
+        self._hass.async_create_task(self._async_flush(key, send, optimistic))
+
+    async def _async_flush(
+        self,
+        key: tuple,
+        send: Callable[[List[str]], Awaitable[None]],
+        optimistic: Callable[
+            ["JellyFishLightingZoneData"], "JellyFishLightingZoneData"
+        ] = None,
+    ) -> None:
+        """Sends a batched command and resolves every caller waiting on it"""
+        batch = self._batches.pop(key, None)
+        if batch is None:
+            # The client was disconnected before the batch could be sent
+            return
+        if optimistic:
+            in_flight = [
+                self._in_flight[z][0] for z in batch.zones if z in self._in_flight
+            ]
+            if in_flight:
+                await asyncio.wait(in_flight, timeout=COMMAND_TIMEOUT)
+            batch.sending = True
+            for zone in batch.zones:
+                if self._queued.get(zone) is batch:
+                    del self._queued[zone]
+        if not batch.zones:
+            # Every zone was taken over by a newer command
+            batch.future.set_result(None)
+            return
+        try:
+            LOGGER.debug("Sending batched %s to zone(s) %s", key[0], batch.zones)
+            # The controller treats no zone list as all zones
+            all_zones = set(batch.zones) == set(self.zones)
+            await send(None if all_zones else batch.zones)
+        except Exception as ex:  # pylint: disable=broad-except
+            batch.future.set_exception(ex)
+            return
+        if self.trace.enabled:
+            self.trace.record(
+                TRACE_COMMAND_SENT, command=key[0], zones=list(batch.zones)
+            )
+        if optimistic:
+            for zone in batch.zones:
+                self._in_flight[zone] = (
+                    self._hass.loop.create_future(),
+                    time.perf_counter(),
+                )
+                self._async_set_optimistic(zone, optimistic(self._state(zone)))
+        batch.future.set_result(None)
+
+    def _state(self, zone: str) -> "JellyFishLightingZoneData":
+        """The current (possibly optimistic) state of a zone"""
+        return self.states.get(zone) or JellyFishLightingZoneData()
+
+    async def _async_fade(
+        self,
+        zone: str,
+        start: "JellyFishLightingZoneData",
+        end: "JellyFishLightingZoneData",
+        transition: float,
+    ) -> bool:
+        """Sends the intermediate colors of a transition to a zone, at most
+        TRANSITION_RATE steps per second. Steps that fall behind schedule are skipped,
+        and zones fading in step share multi-zone commands. Zone states are not
+        refreshed along the way. Returns False if a newer command took over the zone"""
+        self.streamer.stop([zone])
+        self._async_clear_segments(zone)
+        fade = self._fades[zone] = object()
+        steps = int(transition * TRANSITION_RATE)
+        loop = self._hass.loop
+        started = loop.time()
+        sent = None
+        try:
+            while self._fades.get(zone) is fade:
+                step = int((loop.time() - started) * TRANSITION_RATE) + 1
+                if step >= steps:
+                    # The caller sends the final state once the transition is over
+                    await asyncio.sleep(max(started + transition - loop.time(), 0))
+                    return self._fades.get(zone) is fade
+                rgb, brightness = _interpolate(start, end, step / steps)
+                if (rgb, brightness) != sent:
+                    sent = (rgb, brightness)
+                    await self._async_batched(
+                        ("fade", rgb, brightness),
+                        zone,
+                        lambda zones, rgb=rgb, brightness=brightness: (
+                            self._controller.async_apply_color(
+                                rgb, brightness, zones, sync=False
+                            )
+                        ),
+                    )
+                await asyncio.sleep(
+                    max(started + step / TRANSITION_RATE - loop.time(), 0)
+                )
+            return False
+        finally:
+            if self._fades.get(zone) is fade:
+                del self._fades[zone]
+
+    @_timed("get_data")
     async def async_get_data(self):
-        """Manually fetches data from the controller."""
+        """Manually fetches data from the controller. Controller info is fetched once per
+        connection, and the zone and pattern lists only until push updates keep them current.
+        Independent requests are sent concurrently. Connecting and the full fetch that
+        follows take one of the startup slots shared by all controllers, so many
+        controllers starting (or reconnecting) at once are brought up a few at a time"""
+        self._fetching += 1
+        try:
+            if self.connected and self._info_current and self._catalog_current:
+                await self._async_get_data()
+                return
+            slots = _startup_slots(self._hass)
+            with self.metrics.timer("startup_wait"):
+                await slots.acquire()
+            try:
+                await self._async_get_data()
+            finally:
+                slots.release()
+        finally:
+            self._fetching -= 1
+
+    async def _async_get_data(self):
+        """Connects if needed and fetches whatever is not kept current by pushes"""
         await self.async_connect()
         try:
             LOGGER.debug("Getting refreshed data from JellyFish Lighting controller")
-            await self.async_get_controller_info()
-            await self._hass.async_add_executor_job(self._controller.get_pattern_names)
-            await self._hass.async_add_executor_job(self._controller.get_zone_names)
+            requests = []
+            if not self._info_current:
+                requests.append(self.async_get_controller_info())
+            if not self._catalog_current:
+                requests.append(self._controller.async_get_pattern_names())
+                requests.append(self._controller.async_get_zone_names())
+            await asyncio.gather(*requests)
+            self._catalog_current = True
             await self.async_get_zone_states()
         except JellyFishException as ex:
             raise HomeAssistantError(
                 f"Failed to get data from JellyFish Lighting controller at {self.address}"
             ) from ex
 
+    @_timed("get_controller_info")
     async def async_get_controller_info(self):
         """Retrieves basic information from the controller"""
         try:
-            await self._hass.async_add_executor_job(self._controller.get_name)
-            await self._hass.async_add_executor_job(self._controller.get_hostname)
-            await self._hass.async_add_executor_job(
-                self._controller.get_firmware_version
+            await asyncio.gather(
+                self._controller.async_get_name(),
+                self._controller.async_get_hostname(),
+                self._controller.async_get_firmware_version(),
             )
+            self._info_current = True
         except JellyFishException as ex:
             raise HomeAssistantError(
                 f"Failed to retrieve JellyFish controller information from {self.address}"
             ) from ex
 
+    @_timed("get_zone_states")
     async def async_get_zone_states(self, zone: str = None):
         """Retrieves and stores updated state data for one or more zones.
         Retrieves data for all zones if zone list is None"""
@@ -184,54 +736,162 @@ class JellyfishLightingApiClient:
         try:
             zones = [zone] if zone else self.zones
             LOGGER.debug("Getting data for zone(s) %s", zones or "[all zones]")
-            await self._hass.async_add_executor_job(
-                self._controller.get_zone_states, zones
-            )
+            if zone:
+                await self._async_batched(
+                    ("get_zone_states",),
+                    zone,
+                    self._controller.async_get_zone_states,
+                )
+            else:
+                await self._controller.async_get_zone_states(zones)
         except JellyFishException as ex:
             raise HomeAssistantError(
                 f"Failed to get zone data for [{', '.join(zones)}] from JellyFish Lighting controller at {self.address}"
             ) from ex
 
-    async def async_turn_on(self, zone: str):
+    @_timed("turn_on")
+    async def async_turn_on(self, zone: Optional[str]):
         """Turn one or more zones on. Affects all zones if zone list is None"""
+        self._check_zones(zone)
         await self.async_connect()
         try:
             LOGGER.debug("Turning on zone %s", zone)
-            await self._hass.async_add_executor_job(self._controller.turn_on, [zone])
+            await self._async_batched(
+                ("turn_on",),
+                zone,
+                lambda zones: self._controller.async_turn_on(zones, sync=False),
+                lambda state: replace(state, is_on=True),
+            )
         except JellyFishException as ex:
             raise HomeAssistantError(
                 f"Failed to turn on JellyFish Lighting zone '{zone}'"
             ) from ex
 
-    async def async_turn_off(self, zone: str):
-        """Turn one or more zones off. Affects all zones if zone list is None"""
+    @_timed("turn_off")
+    async def async_turn_off(self, zone: Optional[str], transition: float = 0):
+        """Turn one or more zones off. Affects all zones if zone list is None.
+        Zones showing a color fade out over transition seconds"""
+        self._check_zones(zone)
         await self.async_connect()
         try:
             LOGGER.debug("Turning off zone %s", zone)
-            await self._hass.async_add_executor_job(self._controller.turn_off, [zone])
+            if zone is None and transition:
+                # Zones fade individually, sharing each step's command while in step
+                await asyncio.gather(
+                    *(self.async_turn_off(zone, transition) for zone in self.zones)
+                )
+                return
+            current = self._state(zone)
+            if transition and current.is_on and current.color:
+                start = replace(
+                    current, brightness=current.brightness or DEFAULT_BRIGHTNESS
+                )
+                self._async_set_optimistic(zone, replace(start, is_on=False))
+                if not await self._async_fade(
+                    zone, start, replace(start, brightness=0), transition
+                ):
+                    return
+                # Keep the original brightness for when the zone is turned back on
+                config = PatternConfig(
+                    type="Color",
+                    colors=[*start.color],
+                    runData=RunConfig(brightness=start.brightness),
+                )
+                await self._async_batched(
+                    ("turn_off", start.color, start.brightness),
+                    zone,
+                    lambda zones: self._controller.async_turn_off(
+                        zones, sync=False, data=config
+                    ),
+                    lambda state: replace(state, is_on=False),
+                )
+                return
+            await self._async_batched(
+                ("turn_off",),
+                zone,
+                lambda zones: self._controller.async_turn_off(zones, sync=False),
+                lambda state: replace(state, is_on=False),
+            )
         except JellyFishException as ex:
             raise HomeAssistantError(
                 f"Failed to turn off JellyFish Lighting zone '{zone}'"
             ) from ex
 
-    async def async_apply_pattern(self, pattern: str, zone: str):
+    def _check_zones(self, zone: Optional[str]) -> None:
+        """Rejects commands to all zones (zone None) while no zones are known, which would
+        otherwise change nothing"""
+        if zone is None and not self.zones:
+            raise HomeAssistantError(
+                f"Zones of JellyFish Lighting controller at {self.address} are not known"
+            )
+
+    def resolve_pattern(self, pattern: str) -> str:
+        """The full name of a pattern, which may be given without its folder, in a
+        different case, or by the start of its full name. Raises an error for unknown
+        and ambiguous patterns"""
+        if not self.catalog:
+            # The pattern list is not known yet, let the controller validate it
+            return pattern
+        matches = self.catalog.resolve(pattern)
+        if not matches:
+            raise HomeAssistantError(f"Unknown JellyFish Lighting pattern '{pattern}'")
+        if len(matches) > 1:
+            raise HomeAssistantError(
+                f"JellyFish Lighting pattern '{pattern}' is ambiguous, use one of: "
+                f"{', '.join(matches)}"
+            )
+        return matches[0]
+
+    @_timed("get_pattern_config")
+    async def async_get_pattern_config(self, pattern: str) -> PatternConfig:
+        """Retrieves the configuration of a pattern, from the cache if possible"""
+        pattern = self.resolve_pattern(pattern)
+        config = self.catalog.get_config(pattern)
+        if config is not None:
+            return config
+        await self.async_connect()
+        try:
+            await self._controller.async_get_pattern_configs([pattern])
+        except JellyFishException as ex:
+            raise HomeAssistantError(
+                f"Failed to retrieve JellyFish Lighting pattern '{pattern}'"
+            ) from ex
+        # Cached when the reply was received
+        return self.catalog.get_config(pattern)
+
+    @_timed("apply_pattern")
+    async def async_apply_pattern(self, pattern: str, zone: Optional[str]):
         """Turn one or more zones on and apply a preset pattern. Affects all zones if zone list is None"""
+        pattern = self.resolve_pattern(pattern)
+        self._check_zones(zone)
         await self.async_connect()
         try:
             LOGGER.debug("Applying pattern '%s' to zone %s", pattern, zone)
-            await self._hass.async_add_executor_job(
-                self._controller.apply_pattern, pattern, [zone]
+            await self._async_batched(
+                ("apply_pattern", pattern),
+                zone,
+                lambda zones: self._controller.async_apply_pattern(
+                    pattern, zones, sync=False
+                ),
+                lambda state: JellyFishLightingZoneData(True, pattern),
             )
         except JellyFishException as ex:
             raise HomeAssistantError(
                 f"Failed to apply pattern '{pattern}' on JellyFish Lighting zone '{zone}'"
             ) from ex
 
+    @_timed("apply_color")
     async def async_apply_color(
-        self, rgb: Tuple[int, int, int], brightness: int, zone: str
+        self,
+        rgb: Tuple[int, int, int],
+        brightness: int,
+        zone: Optional[str],
+        transition: float = 0,
     ):
         """Turn one or more zones on and set all lights to a single color at the given brightness.
-        Affects all zones if zone list is None"""
+        Affects all zones if zone list is None. Zones that are off or showing a color
+        fade to the new color over transition seconds"""
+        self._check_zones(zone)
         await self.async_connect()
         try:
             LOGGER.debug(
@@ -240,39 +900,189 @@ class JellyfishLightingApiClient:
                 brightness,
                 zone,
             )
-            await self._hass.async_add_executor_job(
-                self._controller.apply_color, rgb, brightness, [zone]
+            if zone is None and transition:
+                # Zones fade individually, sharing each step's command while in step
+                await asyncio.gather(
+                    *(
+                        self.async_apply_color(rgb, brightness, zone, transition)
+                        for zone in self.zones
+                    )
+                )
+                return
+            current = self._state(zone)
+            if transition and (current.color or not current.is_on):
+                end = JellyFishLightingZoneData(True, None, tuple(rgb), brightness)
+                start = (
+                    replace(
+                        current, brightness=current.brightness or DEFAULT_BRIGHTNESS
+                    )
+                    if current.is_on
+                    else replace(end, brightness=0)
+                )
+                self._async_set_optimistic(zone, end)
+                if not await self._async_fade(zone, start, end, transition):
+                    return
+            await self._async_batched(
+                ("apply_color", tuple(rgb), brightness),
+                zone,
+                lambda zones: self._controller.async_apply_color(
+                    tuple(rgb), brightness, zones, sync=False
+                ),
+                lambda state: JellyFishLightingZoneData(
+                    True, None, tuple(rgb), brightness
+                ),
             )
         except JellyFishException as ex:
             raise HomeAssistantError(
                 f"Failed to apply color '{rgb}' at {brightness}% brightness on JellyFish Lighting zone '{zone}'"
             ) from ex
 
+    @_timed("apply_scene")
+    async def async_apply_scene(self, scene: Dict[str, "JellyFishLightingZoneData"]):
+        """Applies a target state to each zone. Zones that share a target are changed with
+        one multi-zone command, the commands are sent back to back without waiting for
+        replies, and the result is confirmed with a single zone state request.
+        A target with is_on False turns the zone off, and one without a pattern or color
+        turns it on"""
+        unknown = [zone for zone in scene if zone not in self.zones]
+        if unknown:
+            raise HomeAssistantError(
+                f"Unknown JellyFish Lighting zone(s) {', '.join(unknown)}"
+            )
+        groups: Dict[JellyFishLightingZoneData, List[str]] = {}
+        for zone, target in scene.items():
+            if target.is_on and target.file:
+                target = JellyFishLightingZoneData(
+                    True, self.resolve_pattern(target.file)
+                )
+            elif target.is_on and target.color:
+                if target.brightness is None:
+                    target = replace(target, brightness=DEFAULT_BRIGHTNESS)
+                target = replace(target, file=None)
+            else:
+                target = JellyFishLightingZoneData(bool(target.is_on))
+            groups.setdefault(target, []).append(zone)
 
-class JellyFishLightingZoneData:
-    """Simple class to store the state of a zone"""
+        await self.async_connect()
+        # The scene's zones are queued like other state changes: the scene replaces their
+        # unsent state changes, is replaced by newer ones, and is only sent once the
+        # controller processed the zones' previous commands
+        batch = _CommandBatch(self._hass.loop.create_future())
+        for zone in scene:
+            self._async_queue(batch, zone, True)
+        in_flight = [self._in_flight[z][0] for z in scene if z in self._in_flight]
+        if in_flight:
+            await asyncio.wait(in_flight, timeout=COMMAND_TIMEOUT)
+        batch.sending = True
+        for zone in batch.zones:
+            if self._queued.get(zone) is batch:
+                del self._queued[zone]
+            self._in_flight[zone] = (
+                self._hass.loop.create_future(),
+                time.perf_counter(),
+            )
+        groups = {
+            target: [zone for zone in zones if zone in batch.zones]
+            for target, zones in groups.items()
+        }
+        groups = {target: zones for target, zones in groups.items() if zones}
+        try:
+            LOGGER.debug(
+                "Applying scene to %s zone(s) in %s command(s)",
+                len(batch.zones),
+                len(groups),
+            )
+            for target, zones in groups.items():
+                if not target.is_on:
+                    await self._controller.async_turn_off(zones, sync=False)
+                elif target.file:
+                    await self._controller.async_apply_pattern(
+                        target.file, zones, sync=False
+                    )
+                elif target.color:
+                    await self._controller.async_apply_color(
+                        target.color, target.brightness, zones, sync=False
+                    )
+                else:
+                    await self._controller.async_turn_on(zones, sync=False)
+                if self.trace.enabled:
+                    self.trace.record(TRACE_COMMAND_SENT, command="scene", zones=zones)
+            for target, zones in groups.items():
+                for zone in zones:
+                    if target.file or target.color:
+                        self._async_set_optimistic(zone, target)
+                    else:
+                        self._async_set_optimistic(
+                            zone, replace(self._state(zone), is_on=target.is_on)
+                        )
+            if batch.zones:
+                # The controller handles requests in order, so this reflects every command
+                await self._controller.async_get_zone_states(list(batch.zones))
+                self._async_confirm(batch.zones)
+        except JellyFishException as ex:
+            self._async_release(batch.zones, confirmed=False)
+            batch.future.set_exception(ex)
+            # Avoid "exception never retrieved" warnings if no replaced command waits
+            batch.future.exception()
+            raise HomeAssistantError(
+                f"Failed to apply scene to JellyFish Lighting zone(s) {', '.join(scene)}"
+            ) from ex
+        batch.future.set_result(None)
 
-    def __init__(
-        self,
-        is_on: bool = None,
-        file: str = None,
-        color: tuple[int, int, int] = None,
-        brightness: int = None,
+    async def async_stream_effect(
+        self, effect: Effect, zone: str, brightness: int = 100, fps: float = STREAM_FPS
     ):
-        self.is_on = is_on
-        self.file = file
-        self.color = color
-        self.brightness = brightness
+        """Starts streaming frames rendered by an effect to a zone, until another command
+        is sent to the zone or the stream is stopped"""
+        await self.async_connect()
+        config = self._controller.zone_configs.get(zone)
+        if config is None:
+            raise HomeAssistantError(f"Unknown JellyFish Lighting zone '{zone}'")
+        LOGGER.debug("Streaming effect to zone %s at %s fps", zone, fps)
+        self._fades.pop(zone, None)
+        self._async_clear_segments(zone)
+        self.streamer.start(zone, effect, config.numPixels, brightness, fps)
+
+    async def async_apply_segment(
+        self,
+        segment: JellyfishLightingSegment,
+        rgb: Optional[Tuple[int, int, int]],
+        brightness: int = DEFAULT_BRIGHTNESS,
+    ) -> None:
+        """Lights a segment of a zone in a color at a brightness (0..100), or turns it off
+        if rgb is None. Segments of a zone changed together are written in one command
+        """
+        await self.async_connect()
+        self.streamer.stop([segment.zone])
+        self._fades.pop(segment.zone, None)
+        try:
+            LOGGER.debug("Setting segment %s to %s at %s", segment, rgb, brightness)
+            await self.segments.async_set(segment, rgb, brightness)
+        except JellyFishException as ex:
+            raise HomeAssistantError(
+                f"Failed to set JellyFish Lighting segment '{segment.name}'"
+            ) from ex
+
+    def async_stop_stream(self, zone: str) -> None:
+        """Stops streaming to a zone. The zone keeps showing the last frame"""
+        self.streamer.stop([zone])
+
+
+@dataclass(frozen=True, slots=True)
+class JellyFishLightingZoneData:
+    """Immutable snapshot of the state of a zone. Compares by value so changes can be detected"""
+
+    is_on: bool = None
+    file: str = None
+    color: tuple[int, int, int] = None
+    brightness: int = None
 
     @classmethod
     def from_zone_state(cls, state: ZoneState):
         """Instantiates the class from the data returned by the API"""
-        data = cls(state.is_on, state.file or None)
+        color = brightness = None
         if state.data:
-            data.brightness = state.data.runData.brightness
+            brightness = state.data.runData.brightness
             if state.data.type == "Color" and len(state.data.colors) == 3:
-                data.color = tuple(state.data.colors)
-        return data
-
-    def __repr__(self) -> str:
-        return str(vars(self))
+                color = tuple(state.data.colors)
+        return cls(state.is_on, state.file or None, color, brightness)
@@ -0,0 +1,84 @@
+"""Captures raw controller traffic to a file so it can be replayed later"""
+
+import asyncio
+from datetime import datetime, timezone
+import gzip
+import json
+import os
+import time
+from typing import IO, Any, Dict, List, Optional, Tuple
+from homeassistant.core import HomeAssistant
+from .const import CAPTURE_BUFFER_SIZE
+
+CAPTURE_VERSION = 1
+
+
+class JellyfishLightingCapture:
+    """
+    Writes the raw messages received from a controller, with the time (seconds since the
+    capture started) at which each arrived, to a gzip compressed file of JSON lines. The
+    first line is a header, every other line a [time, message] pair. Messages are
+    buffered and written in the executor, so capturing does not block the event loop.
+    """
+
+    def __init__(self, hass: HomeAssistant, path: str, address: str) -> None:
+        self.hass = hass
+        self.path = path
+        self.address = address
+        self.messages = 0
+        self._started = 0.0
+        self._file: Optional[IO[str]] = None
+        self._pending: List[str] = []
+        self._flush: Optional[asyncio.Task] = None
+
+    async def async_start(self) -> None:
+        """Creates the file and writes the header"""
+        self._started = time.monotonic()
+        header = {
+            "version": CAPTURE_VERSION,
+            "address": self.address,
+            "started": datetime.now(timezone.utc).isoformat(),
+        }
+        self._file = await self.hass.async_add_executor_job(self._open)
+        await self.hass.async_add_executor_job(self._write, [json.dumps(header)])
+
+    def record(self, message: str) -> None:
+        """Adds a message, writing the buffered messages once enough have arrived"""
+        elapsed = round(time.monotonic() - self._started, 6)
+        self._pending.append(json.dumps([elapsed, message]))
+        self.messages += 1
+        if len(self._pending) >= CAPTURE_BUFFER_SIZE and self._flush is None:
+            self._flush = self.hass.async_create_task(self._async_flush())
+
+    async def async_stop(self) -> None:
+        """Writes the remaining messages and closes the file"""
+        if self._flush:
+            await self._flush
+        await self._async_flush()
+        await self.hass.async_add_executor_job(self._file.close)
+
+    async def _async_flush(self) -> None:
+        """Writes buffered messages until none are left"""
+        try:
+            while self._pending:
+                lines, self._pending = self._pending, []
+                await self.hass.async_add_executor_job(self._write, lines)
+        finally:
+            self._flush = None
+
+    def _open(self) -> IO[str]:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        return gzip.open(self.path, "wt", encoding="utf-8")
+
+    def _write(self, lines: List[str]) -> None:
+        self._file.write("\n".join(lines) + "\n")
+
+
+def load_capture(path: str) -> Tuple[Dict[str, Any], List[Tuple[float, str]]]:
+    """Reads a capture file, returning its header and the (time, message) pairs. Blocks,
+    so call it in the executor when running in Home Assistant"""
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        header = json.loads(file.readline())
+        if header.get("version") != CAPTURE_VERSION:
+            raise ValueError(f"Unsupported capture version {header.get('version')}")
+        return header, [tuple(json.loads(line)) for line in file if line.strip()]
@@ -0,0 +1,179 @@
+"""Indexed catalog of the patterns saved on a JellyFish Lighting controller"""
+
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from jellyfishlightspy import PatternConfig
+from .const import PATTERN_CONFIG_CACHE_SIZE
+
+
+class JellyfishLightingPatternCatalog:
+    """
+    Sorted collection of pattern names ("folder/name") with a folder hierarchy, lookup by
+    name and prefix search. Sorted order is maintained incrementally as patterns are added
+    and removed, and recently used pattern configs are kept in an LRU cache.
+    """
+
+    def __init__(self, config_cache_size: int = PATTERN_CONFIG_CACHE_SIZE) -> None:
+        self._config_cache_size = config_cache_size
+        self._snapshot: Optional[List[str]] = None
+        self.version = 0
+        self._reset()
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._names)
+
+    @property
+    def names(self) -> List[str]:
+        """All pattern names in sorted order. The same list is returned until the
+        catalog changes, so it can be handed out without copying on every call"""
+        if self._snapshot is None:
+            self._snapshot = list(self._names)
+        return self._snapshot
+
+    @property
+    def folders(self) -> List[str]:
+        """All folder paths in sorted order"""
+        return sorted(folder for folder in self._subfolders if folder)
+
+    def patterns_in(self, folder: str) -> List[str]:
+        """The patterns saved directly in a folder"""
+        return list(self._patterns.get(folder, []))
+
+    def subfolders(self, folder: str = "") -> List[str]:
+        """The folders directly within a folder (the top-level folders by default)"""
+        return list(self._subfolders.get(folder, []))
+
+    def add(self, name: str) -> bool:
+        """Adds a pattern. Returns True if it was not in the catalog yet"""
+        if name in self._index:
+            return False
+        folder, _, base = name.rpartition("/")
+        insort(self._names, name)
+        insort(self._folded, (name.casefold(), name))
+        self._index.add(name)
+        for alias in {name.casefold(), base.casefold()}:
+            self._aliases.setdefault(alias, set()).add(name)
+        self._add_folder(folder)
+        insort(self._patterns.setdefault(folder, []), name)
+        self._changed()
+        return True
+
+    def remove(self, name: str) -> bool:
+        """Removes a pattern and its cached config. Returns True if it was in the catalog"""
+        if name not in self._index:
+            return False
+        folder, _, base = name.rpartition("/")
+        del self._names[bisect_left(self._names, name)]
+        del self._folded[bisect_left(self._folded, (name.casefold(), name))]
+        self._index.discard(name)
+        for alias in {name.casefold(), base.casefold()}:
+            self._aliases[alias].discard(name)
+            if not self._aliases[alias]:
+                del self._aliases[alias]
+        patterns = self._patterns[folder]
+        del patterns[bisect_left(patterns, name)]
+        self._prune_folder(folder)
+        self._configs.pop(name, None)
+        self._changed()
+        return True
+
+    def update(self, names: Iterable[str]) -> bool:
+        """Replaces the catalog contents with the given pattern names, applying only the
+        differences. Returns True if anything changed"""
+        names = set(names)
+        removed = self._index - names
+        added = names - self._index
+        changed = bool(removed or added)
+        if len(removed) > len(self._names) // 4:
+            # Removing patterns one at a time is linear in the catalog size, so rebuild
+            # instead (adding in sorted order only ever appends)
+            configs = [(n, c) for n, c in self._configs.items() if n in names]
+            self._reset()
+            self._configs.update(configs)
+            removed, added = set(), names
+        for name in removed:
+            self.remove(name)
+        for name in sorted(added):
+            self.add(name)
+        if changed:
+            self._changed()
+        return changed
+
+    def search(self, prefix: str, limit: Optional[int] = None) -> List[str]:
+        """The patterns whose full name starts with prefix in any case, in sorted order"""
+        prefix = prefix.casefold()
+        matches = []
+        for i in range(bisect_left(self._folded, (prefix,)), len(self._folded)):
+            folded, name = self._folded[i]
+            if not folded.startswith(prefix) or len(matches) == limit:
+                break
+            matches.append(name)
+        return sorted(matches)
+
+    def resolve(self, name: str) -> List[str]:
+        """The patterns a name may refer to: the pattern with that full name, or with that
+        name without the folder, in any case. Otherwise the patterns whose full name
+        starts with it. More than one match means the name is ambiguous"""
+        if name in self._index:
+            return [name]
+        matches = self._aliases.get(name.casefold())
+        return sorted(matches) if matches else self.search(name)
+
+    def get_config(self, name: str) -> Optional[PatternConfig]:
+        """The cached config of a pattern, if available"""
+        config = self._configs.get(name)
+        if config is not None:
+            self._configs.move_to_end(name)
+        return config
+
+    def put_config(self, name: str, config: PatternConfig) -> None:
+        """Caches the config of a pattern, evicting the least recently used one if full"""
+        self._configs[name] = config
+        self._configs.move_to_end(name)
+        if len(self._configs) > self._config_cache_size:
+            self._configs.popitem(last=False)
+
+    def _reset(self) -> None:
+        """Empties the catalog"""
+        self._names: List[str] = []
+        # Casefolded names paired with the names, in sorted order for prefix search
+        self._folded: List[Tuple[str, str]] = []
+        self._index: Set[str] = set()
+        self._aliases: Dict[str, Set[str]] = {}
+        self._patterns: Dict[str, List[str]] = {}
+        self._subfolders: Dict[str, List[str]] = {}
+        self._configs: "OrderedDict[str, PatternConfig]" = OrderedDict()
+
+    def _add_folder(self, folder: str) -> None:
+        """Adds a folder and its parents to the hierarchy"""
+        if folder in self._subfolders:
+            return
+        self._subfolders[folder] = []
+        if folder:
+            parent = folder.rpartition("/")[0]
+            self._add_folder(parent)
+            insort(self._subfolders[parent], folder)
+
+    def _prune_folder(self, folder: str) -> None:
+        """Removes a folder, and parents that become empty, once it has no contents"""
+        while (
+            folder and not self._patterns.get(folder) and not self._subfolders[folder]
+        ):
+            self._patterns.pop(folder, None)
+            del self._subfolders[folder]
+            parent = folder.rpartition("/")[0]
+            siblings = self._subfolders[parent]
+            del siblings[bisect_left(siblings, folder)]
+            folder = parent
+
+    def _changed(self) -> None:
+        """Invalidates the sorted snapshot"""
+        self._snapshot = None
+        self.version += 1
@@ -1,11 +1,22 @@
 """Adds config flow for Blueprint."""
-from typing import Any
+
+import ipaddress
+from typing import Any, Dict, List, Set
 from homeassistant import config_entries
-from homeassistant.helpers.aiohttp_client import async_create_clientsession
+from homeassistant.components import network
+from homeassistant.core import callback
 from homeassistant.data_entry_flow import FlowResult
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.selector import (
+    SelectOptionDict,
+    SelectSelector,
+    SelectSelectorConfig,
+    TextSelector,
+    TextSelectorConfig,
+)
 import voluptuous as vol
-from jellyfishlightspy import JellyFishException
-from .api import JellyfishLightingApiClient
+from jellyfishlightspy import DEFAULT_TIMEOUT
 from .const import (
     LOGGER,
     DOMAIN,
@@ -13,53 +24,280 @@ from .const import (
     CONF_NAME,
     CONF_HOSTNAME,
     CONF_VERSION,
+    CONF_SEGMENTS,
+    CONF_HOSTS,
+    CONF_CONTROLLER,
 )
+from .discovery import (
+    JellyfishLightingDiscoveryInfo,
+    async_discover,
+    async_probe,
+    parse_targets,
+)
+from .segments import JellyfishLightingSegment, parse_segments
 
 
 class JellyfishLightingFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
-    """Config flow for JellyFish Lighting"""
+    """Config flow for JellyFish Lighting. Controllers are either found by scanning the
+    local network or added by address"""
 
     VERSION = 1
-    CONNECTION_CLASS = config_entries.CONN_CLASS_LOCAL_POLL
+    CONNECTION_CLASS = config_entries.CONN_CLASS_LOCAL_PUSH
+
+    def __init__(self) -> None:
+        """Initialize."""
+        self._found: Dict[str, JellyfishLightingDiscoveryInfo] = {}
+        self._discovered: JellyfishLightingDiscoveryInfo | None = None
+
+    @staticmethod
+    @callback
+    def async_get_options_flow(
+        config_entry: config_entries.ConfigEntry,
+    ) -> config_entries.OptionsFlow:
+        """Get the options flow for this handler."""
+        return JellyfishLightingOptionsFlowHandler(config_entry)
 
     async def async_step_user(
         self, user_input: dict[str, Any] | None = None
     ) -> FlowResult:
         """Handle a flow initialized by the user."""
+        return self.async_show_menu(step_id="user", menu_options=["discover", "manual"])
+
+    async def async_step_manual(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Adds the controller at an address entered by the user."""
         errors = {}
 
         if user_input is not None:
-            try:
-                host = user_input[CONF_ADDRESS]
-                LOGGER.info(
-                    "Testing connection to JellyFish Lighting controller at %s...", host
-                )
-                session = async_create_clientsession(self.hass)
-                client = JellyfishLightingApiClient(host, session, self.hass)
-                await client.async_connect()
+            host = user_input[CONF_ADDRESS]
+            LOGGER.info(
+                "Testing connection to JellyFish Lighting controller at %s...", host
+            )
+            info = await async_probe(
+                async_get_clientsession(self.hass), host, DEFAULT_TIMEOUT
+            )
+            if info is not None:
                 LOGGER.info(
                     "Successfully connected to JellyFish Lighting controller at %s!",
                     host,
                 )
-                await client.async_get_controller_info()
-                data = user_input.copy()
-                data[CONF_NAME] = client.name
-                data[CONF_HOSTNAME] = client.hostname
-                data[CONF_VERSION] = client.version
-                await client.async_disconnect()
-                return self.async_create_entry(
-                    title=user_input[CONF_ADDRESS], data=data
+                return await self._async_create_entry(info)
+            LOGGER.warning(
+                "Failed to connect to JellyFish Lighting controller at %s", host
+            )
+            errors["base"] = "cannot_connect"
+
+        return self.async_show_form(
+            step_id="manual",
+            data_schema=vol.Schema({vol.Required(CONF_ADDRESS): str}),
+            errors=errors,
+        )
+
+    async def async_step_discover(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Scans hosts or networks entered by the user (the local /24 network by
+        default) for controllers that are not configured yet."""
+        errors = {}
+        placeholders = {"error": ""}
+
+        if user_input is not None:
+            try:
+                hosts = parse_targets(user_input[CONF_HOSTS])
+            except ValueError as ex:
+                errors[CONF_HOSTS] = "invalid_hosts"
+                placeholders["error"] = str(ex)
+            else:
+                LOGGER.info("Scanning %s host(s) for JellyFish controllers", len(hosts))
+                found = await async_discover(async_get_clientsession(self.hass), hosts)
+                configured = self._async_configured()
+                self._found = {
+                    info.address: info
+                    for info in found
+                    if info.address not in configured
+                    and info.hostname not in configured
+                }
+                if self._found:
+                    return await self.async_step_pick()
+                errors["base"] = "no_controllers"
+
+        return self.async_show_form(
+            step_id="discover",
+            data_schema=vol.Schema(
+                {
+                    vol.Required(
+                        CONF_HOSTS, default=await self._async_default_network()
+                    ): str
+                }
+            ),
+            errors=errors,
+            description_placeholders=placeholders,
+        )
+
+    async def async_step_pick(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Adds the controller picked from those found. The others are offered as
+        discovered controllers that can be added with one click."""
+        if user_input is not None:
+            picked = self._found.pop(user_input[CONF_CONTROLLER])
+            for info in self._found.values():
+                self.hass.async_create_task(
+                    self.hass.config_entries.flow.async_init(
+                        DOMAIN,
+                        context={"source": config_entries.SOURCE_INTEGRATION_DISCOVERY},
+                        data=_discovery_data(info),
+                    )
                 )
-            except JellyFishException:
-                LOGGER.exception(
-                    "Failed to connect to JellyFish Lighting controller at %s", host
+            return await self._async_create_entry(picked)
+
+        return self.async_show_form(
+            step_id="pick",
+            data_schema=vol.Schema(
+                {
+                    vol.Required(CONF_CONTROLLER): SelectSelector(
+                        SelectSelectorConfig(
+                            options=[
+                                SelectOptionDict(value=address, label=str(info))
+                                for address, info in self._found.items()
+                            ]
+                        )
+                    )
+                }
+            ),
+            description_placeholders={"count": str(len(self._found))},
+        )
+
+    async def async_step_integration_discovery(
+        self, discovery_info: Dict[str, Any]
+    ) -> FlowResult:
+        """Handles a controller found by a network scan of another flow."""
+        info = JellyfishLightingDiscoveryInfo(
+            discovery_info[CONF_ADDRESS],
+            discovery_info[CONF_NAME],
+            discovery_info[CONF_HOSTNAME],
+            discovery_info[CONF_VERSION],
+        )
+        await self.async_set_unique_id(info.hostname)
+        self._abort_if_unique_id_configured(updates={CONF_ADDRESS: info.address})
+        self._discovered = info
+        self.context["title_placeholders"] = {"name": info.name}
+        return await self.async_step_confirm()
+
+    async def async_step_confirm(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Confirms adding a discovered controller."""
+        if user_input is not None:
+            return await self._async_create_entry(self._discovered)
+        self._set_confirm_only()
+        return self.async_show_form(
+            step_id="confirm",
+            description_placeholders={
+                "name": self._discovered.name,
+                "address": self._discovered.address,
+                "version": self._discovered.version,
+            },
+        )
+
+    async def _async_create_entry(self, info: JellyfishLightingDiscoveryInfo):
+        """Creates the entry for a controller, unless it is configured already"""
+        await self.async_set_unique_id(info.hostname, raise_on_progress=False)
+        self._abort_if_unique_id_configured(updates={CONF_ADDRESS: info.address})
+        # Entries created before unique IDs were assigned are matched by their data
+        configured = self._async_configured()
+        if info.address in configured or info.hostname in configured:
+            return self.async_abort(reason="already_configured")
+        return self.async_create_entry(
+            title=f"{info.name} ({info.hostname})", data=_discovery_data(info)
+        )
+
+    @callback
+    def _async_configured(self) -> Set[str]:
+        """The unique IDs, addresses and hostnames of the configured controllers"""
+        return {
+            value
+            for entry in self._async_current_entries(include_ignore=False)
+            for value in (
+                entry.unique_id,
+                entry.data.get(CONF_ADDRESS),
+                entry.data.get(CONF_HOSTNAME),
+            )
+            if value
+        }
+
+    async def _async_default_network(self) -> str:
+        """The /24 network of Home Assistant's IPv4 address, if it can be determined"""
+        try:
+            source_ip = await network.async_get_source_ip(self.hass)
+        except HomeAssistantError:
+            return ""
+        if ipaddress.ip_address(source_ip).version != 4:
+            # An IPv6 network is far too large to scan
+            return ""
+        return str(ipaddress.ip_network(f"{source_ip}/24", strict=False))
+
+
+def _discovery_data(info: JellyfishLightingDiscoveryInfo) -> Dict[str, Any]:
+    """The config entry data for a controller"""
+    return {
+        CONF_ADDRESS: info.address,
+        CONF_NAME: info.name,
+        CONF_HOSTNAME: info.hostname,
+        CONF_VERSION: info.version,
+    }
+
+
+class JellyfishLightingOptionsFlowHandler(config_entries.OptionsFlow):
+    """Options flow for JellyFish Lighting: defines segments, i.e. lights for ranges of
+    lights within a zone"""
+
+    def __init__(self, config_entry: config_entries.ConfigEntry) -> None:
+        """Initialize."""
+        self.config_entry = config_entry
+
+    def _validate(self, segments: List[JellyfishLightingSegment]) -> None:
+        """Checks segments against the zones of the controller, if it is loaded"""
+        coordinator = self.hass.data.get(DOMAIN, {}).get(self.config_entry.entry_id)
+        if coordinator is None or not coordinator.api.zones:
+            return
+        for segment in segments:
+            if segment.zone not in coordinator.api.zones:
+                raise ValueError(f"Unknown zone '{segment.zone}' in '{segment}'")
+            pixels = coordinator.api.zone_pixels(segment.zone)
+            if pixels is not None and segment.last > pixels:
+                raise ValueError(f"{segment.zone} only has {pixels} lights")
+
+    async def async_step_init(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Manage the segments."""
+        errors = {}
+        placeholders = {"error": ""}
+        if user_input is not None:
+            try:
+                segments = parse_segments(user_input.get(CONF_SEGMENTS, ""))
+                self._validate(segments)
+            except ValueError as ex:
+                errors[CONF_SEGMENTS] = "invalid_segments"
+                placeholders["error"] = str(ex)
+            else:
+                return self.async_create_entry(
+                    title="",
+                    data={CONF_SEGMENTS: [str(segment) for segment in segments]},
                 )
-                errors["base"] = "cannot_connect"
-        else:
-            user_input = {}
 
+        current = "\n".join(self.config_entry.options.get(CONF_SEGMENTS, []))
         return self.async_show_form(
-            step_id="user",
-            data_schema=vol.Schema({vol.Required(CONF_ADDRESS): str}),
-            errors=errors or {},
+            step_id="init",
+            data_schema=vol.Schema(
+                {
+                    vol.Optional(CONF_SEGMENTS, default=current): TextSelector(
+                        TextSelectorConfig(multiline=True)
+                    )
+                }
+            ),
+            errors=errors,
+            description_placeholders=placeholders,
         )
@@ -0,0 +1,185 @@
+"""Connection lifecycle management for JellyFish Lighting controllers"""
+
+import asyncio
+import random
+import time
+from typing import Optional
+from jellyfishlightspy import JellyFishException
+from .const import (
+    LOGGER,
+    CONNECT_TIMEOUT,
+    RECONNECT_BASE_DELAY,
+    RECONNECT_MAX_DELAY,
+    CIRCUIT_BREAKER_THRESHOLD,
+    HEARTBEAT_INTERVAL,
+    HEARTBEAT_TIMEOUT,
+)
+from .transport import JellyfishLightingTransport
+
+
+class JellyfishLightingConnection:
+    """
+    Owns the websocket connection to a controller. Only one connection attempt is in
+    flight at a time, lost connections are retried with exponential backoff and jitter,
+    requests fail fast while the controller is known to be unreachable (circuit breaker),
+    and idle connections are probed so half-open sockets are detected.
+    """
+
+    def __init__(self, transport: JellyfishLightingTransport) -> None:
+        self._transport = transport
+        self._connect_task: Optional[asyncio.Task] = None
+        self._retry_handle: Optional[asyncio.TimerHandle] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._failures = 0
+        self._retry_at = 0.0
+        self._stopped = False
+        self.reconnects = 0
+        transport.add_listener(
+            on_open=self._on_open, on_close=self._on_close, on_error=self._on_error
+        )
+
+    @property
+    def address(self) -> str:
+        """The address of the controller"""
+        return self._transport.address
+
+    @property
+    def connecting(self) -> bool:
+        """Indicates whether a connection attempt is in progress"""
+        return self._connect_task is not None and not self._connect_task.done()
+
+    @property
+    def circuit_open(self) -> bool:
+        """Indicates whether requests should fail fast because recent attempts to reach the
+        controller failed and the next retry is not due yet"""
+        return (
+            self._failures >= CIRCUIT_BREAKER_THRESHOLD
+            and time.monotonic() < self._retry_at
+        )
+
+    async def async_connect(self) -> None:
+        """Connects to the controller if not already connected.
+        Concurrent callers share a single connection attempt"""
+        if self._transport.connected:
+            return
+        self._stopped = False
+        if not self.connecting:
+            if self.circuit_open:
+                raise JellyFishException(
+                    f"Controller at {self.address} is unreachable, next connection "
+                    f"attempt in {self._retry_at - time.monotonic():.0f}s"
+                )
+            self._start_attempt()
+        await asyncio.shield(self._connect_task)
+
+    async def async_disconnect(self) -> None:
+        """Disconnects from the controller and stops reconnecting"""
+        self._stopped = True
+        self._cancel_retry()
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+        await self._transport.async_disconnect(CONNECT_TIMEOUT)
+
+    async def _async_attempt(self) -> None:
+        """Makes a single connection attempt, scheduling a retry if it fails"""
+        self._cancel_retry()
+        try:
+            await self._transport.async_connect(CONNECT_TIMEOUT)
+        except JellyFishException as ex:
+            self._failures += 1
+            delay = self._backoff()
+            self._retry_at = time.monotonic() + delay
+            # Only the first failure is logged loudly to avoid log storms
+            log = LOGGER.warning if self._failures == 1 else LOGGER.debug
+            log("%s (attempt %s), retrying in %.1fs", ex, self._failures, delay)
+            self._schedule_retry(delay)
+            raise
+        if self._stopped:
+            # Disconnected while this attempt was in progress
+            await self._transport.async_disconnect(CONNECT_TIMEOUT)
+            raise JellyFishException(f"Connection to {self.address} was closed")
+
+    def _backoff(self) -> float:
+        """Exponential backoff delay with jitter for the current number of failures"""
+        delay = min(
+            RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * 2 ** max(self._failures - 1, 0)
+        )
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _schedule_retry(self, delay: float) -> None:
+        """Schedules a background reconnection attempt unless one is already pending"""
+        if self._stopped or self._retry_handle:
+            return
+        self._retry_handle = asyncio.get_running_loop().call_later(delay, self._retry)
+
+    def _cancel_retry(self) -> None:
+        """Cancels a scheduled reconnection attempt"""
+        if self._retry_handle:
+            self._retry_handle.cancel()
+            self._retry_handle = None
+
+    def _retry(self) -> None:
+        """Runs a scheduled reconnection attempt"""
+        self._retry_handle = None
+        if self._stopped or self._transport.connected or self.connecting:
+            return
+        self._start_attempt()
+
+    def _start_attempt(self) -> None:
+        """Starts a connection attempt in the background"""
+        self._connect_task = asyncio.get_running_loop().create_task(
+            self._async_attempt()
+        )
+        # Failures are logged and rescheduled by the attempt itself
+        self._connect_task.add_done_callback(
+            lambda task: task.cancelled() or task.exception()
+        )
+
+    def _on_open(self) -> None:
+        """Resets the backoff and starts the heartbeat once connected"""
+        if self._failures:
+            LOGGER.info(
+                "Reconnected to JellyFish Lighting controller at %s", self.address
+            )
+            self.reconnects += 1
+            self._transport.metrics.increment("reconnects")
+        self._failures = 0
+        self._heartbeat_task = asyncio.get_running_loop().create_task(
+            self._async_heartbeat()
+        )
+
+    def _on_close(self, *args) -> None:
+        """Stops the heartbeat when the connection closes"""
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+
+    def _on_error(self, error) -> None:
+        """Called when the connection is lost unexpectedly"""
+        if self._stopped or self.connecting:
+            return
+        LOGGER.warning(
+            "Lost connection to JellyFish Lighting controller at %s: %s",
+            self.address,
+            error,
+        )
+        self._schedule_retry(self._backoff())
+
+    async def _async_heartbeat(self) -> None:
+        """Probes the controller when nothing has been received for a while, and drops
+        the connection if it does not answer (e.g. a half-open socket after a Wi-Fi drop)
+        """
+        while self._transport.connected:
+            idle = time.monotonic() - self._transport.last_message
+            if idle < HEARTBEAT_INTERVAL:
+                await asyncio.sleep(HEARTBEAT_INTERVAL - idle)
+                continue
+            try:
+                await self._transport.async_get_name(HEARTBEAT_TIMEOUT)
+            except JellyFishException:
+                LOGGER.warning(
+                    "JellyFish Lighting controller at %s stopped responding",
+                    self.address,
+                )
+                await self._transport.async_drop()
+                return
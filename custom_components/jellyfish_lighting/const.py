@@ -5,6 +5,52 @@ import logging
 
 LOGGER = logging.getLogger(__package__)
 SCAN_INTERVAL = timedelta(seconds=15)
+# Polling is only used while push updates are unavailable. The interval backs off
+# from SCAN_INTERVAL up to MAX_SCAN_INTERVAL while the controller is unreachable
+MAX_SCAN_INTERVAL = timedelta(minutes=5)
+# Push updates are considered stale when nothing is received for this long
+PUSH_STALE_TIMEOUT = timedelta(minutes=10)
+WATCHDOG_INTERVAL = timedelta(seconds=30)
+
+# Connection management (seconds)
+CONNECT_TIMEOUT = 5
+RECONNECT_BASE_DELAY = 1
+RECONNECT_MAX_DELAY = 300
+# Consecutive failed connection attempts before requests fail fast
+CIRCUIT_BREAKER_THRESHOLD = 3
+# Idle connections are probed this often to detect half-open sockets
+HEARTBEAT_INTERVAL = 30
+HEARTBEAT_TIMEOUT = 5
+# Identical commands issued within this many seconds are sent as one multi-zone call
+BATCH_WINDOW = 0.025
+# Seconds a command waits for the controller to process the previous command for the
+# same zone before it is sent anyway
+COMMAND_TIMEOUT = 2
+# Seconds to wait for the controller to confirm an optimistic state before fetching it
+OPTIMISTIC_TIMEOUT = 5
+# Number of pattern configs kept in memory (least recently used are evicted)
+PATTERN_CONFIG_CACHE_SIZE = 32
+# Frame rate used when streaming custom effects, and the highest rate allowed
+STREAM_FPS = 20
+STREAM_MAX_FPS = 60
+# Controllers connected to and fetched at the same time, e.g. while Home Assistant starts
+STARTUP_CONCURRENCY = 4
+# Highest rate (steps per second) at which transitions send intermediate colors
+TRANSITION_RATE = 10
+# How often diagnostic sensors read the controller's performance metrics
+METRICS_SCAN_INTERVAL = timedelta(seconds=60)
+# Longest a synchronized scene holds back a controller that replies faster than others
+SYNC_MAX_DELAY = 0.5
+# Controllers probed at the same time while scanning the network, the seconds each
+# probe waits for an answer, and the largest number of addresses scanned at once
+DISCOVERY_CONCURRENCY = 64
+DISCOVERY_TIMEOUT = 1.5
+DISCOVERY_MAX_HOSTS = 1024
+# Events kept by a controller's trace by default, and the most that can be requested
+TRACE_SIZE = 1000
+TRACE_MAX_SIZE = 100000
+# Captured messages buffered in memory before they are written to the capture file
+CAPTURE_BUFFER_SIZE = 100
 
 # Base component constants
 NAME = "JellyFish Lighting"
@@ -15,17 +61,52 @@ ATTRIBUTION = "Leverages the JellyFish Lighting Python API \
     created by @vinenoobjelly https://github.com/vinenoobjelly/jellyfishlights-py"
 ISSUE_URL = "https://github.com/bdunn44/hass-jellyfish-lighting/issues"
 
+# Controller metadata (zones, patterns, name, etc.) is cached to disk for fast startup
+STORAGE_KEY = DOMAIN
+STORAGE_VERSION = 1
+STORAGE_SAVE_DELAY = 10
+
 # Icons
 ICON = "mdi:home-lightbulb-outline"
 
 # Platforms
 LIGHT = "light"
+SENSOR = "sensor"
+PLATFORMS = [LIGHT, SENSOR]
+
+# Attributes
+ATTR_INTEGRATION = "integration"
+ATTR_PATTERNS = "patterns"
+ATTR_FOLDERS = "folders"
+ATTR_ENTITIES = "entities"
+ATTR_COLORS = "colors"
+ATTR_SPEED = "speed"
+ATTR_LENGTH = "length"
+ATTR_SENSOR = "sensor"
+ATTR_MINIMUM = "minimum"
+ATTR_MAXIMUM = "maximum"
+ATTR_FPS = "fps"
+ATTR_MAX_EVENTS = "max_events"
+ATTR_SYNCHRONIZE = "synchronize"
+
+# Services
+SERVICE_APPLY_SCENE = "apply_scene"
+SERVICE_STREAM_EFFECT = "stream_effect"
+SERVICE_STOP_STREAM = "stop_stream"
+SERVICE_START_TRACE = "start_trace"
+SERVICE_STOP_TRACE = "stop_trace"
+SERVICE_DUMP_TRACE = "dump_trace"
+SERVICE_START_CAPTURE = "start_capture"
+SERVICE_STOP_CAPTURE = "stop_capture"
 
 # Configuration and options
 CONF_ADDRESS = "host"
 CONF_NAME = "name"
 CONF_HOSTNAME = "hostname"
 CONF_VERSION = "version"
+CONF_SEGMENTS = "segments"
+CONF_HOSTS = "hosts"
+CONF_CONTROLLER = "controller"
 DEFAULT_BRIGHTNESS = 100
 DEFAULT_COLOR = (255, 193, 7)
 
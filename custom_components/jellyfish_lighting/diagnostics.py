@@ -0,0 +1,48 @@
+"""Diagnostics support for jellyfish-lighting."""
+
+import time
+from typing import Any, Dict
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+from .const import DOMAIN, CONF_ADDRESS, CONF_HOSTNAME
+
+# The entry title and unique ID contain the hostname
+TO_REDACT = {CONF_ADDRESS, CONF_HOSTNAME, "title", "unique_id"}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> Dict[str, Any]:
+    """Return diagnostics for a config entry, including the controller's performance
+    metrics and trace"""
+    api = hass.data[DOMAIN][entry.entry_id].api
+    return {
+        "entry": async_redact_data(entry.as_dict(), TO_REDACT),
+        "controller": {
+            "name": api.name,
+            "version": api.version,
+            "connected": api.connected,
+            "zones": len(api.zones),
+            "patterns": len(api.catalog),
+            "seconds_since_last_push": (
+                round(time.monotonic() - api.last_push, 1) if api.last_push else None
+            ),
+        },
+        "stream": {
+            "zones": api.streamer.zones,
+            "frames_sent": api.streamer.frames_sent,
+            "frames_dropped": api.streamer.frames_dropped,
+        },
+        "segments": {
+            "lit": len(api.segments.states),
+            "frames_sent": api.segments.frames_sent,
+        },
+        "metrics": api.metrics.as_dict(),
+        "trace": api.trace.as_dict(),
+        "capture": (
+            {"path": api.capture.path, "messages": api.capture.messages}
+            if api.capture
+            else None
+        ),
+    }
@@ -0,0 +1,90 @@
+"""Finds JellyFish Lighting controllers on the local network"""
+
+import asyncio
+from dataclasses import dataclass
+import ipaddress
+from typing import Iterable, List, Optional
+import aiohttp
+from jellyfishlightspy import JellyFishException
+from .const import (
+    LOGGER,
+    DISCOVERY_CONCURRENCY,
+    DISCOVERY_MAX_HOSTS,
+    DISCOVERY_TIMEOUT,
+)
+from .transport import JellyfishLightingTransport
+
+
+@dataclass(frozen=True, slots=True)
+class JellyfishLightingDiscoveryInfo:
+    """A controller that answered a probe"""
+
+    address: str
+    name: str
+    hostname: str
+    version: str
+
+    def __str__(self) -> str:
+        return f"{self.name} ({self.hostname}, {self.address}, firmware {self.version})"
+
+
+def parse_targets(text: str) -> List[str]:
+    """Expands a list of hosts and networks (e.g. "192.168.1.0/24, 10.0.0.5"), separated
+    by commas or whitespace, into the addresses to probe"""
+    hosts: List[str] = []
+    for target in text.replace(",", " ").split():
+        if "/" not in target:
+            hosts.append(target)
+            continue
+        try:
+            network = ipaddress.ip_network(target, strict=False)
+        except ValueError as ex:
+            raise ValueError(f"Invalid network '{target}'") from ex
+        if network.num_addresses > DISCOVERY_MAX_HOSTS:
+            raise ValueError(
+                f"{target} is too large to scan (at most {DISCOVERY_MAX_HOSTS} hosts)"
+            )
+        hosts.extend(str(host) for host in network.hosts())
+    return list(dict.fromkeys(hosts))
+
+
+async def async_probe(
+    session: aiohttp.ClientSession, address: str, timeout: float = DISCOVERY_TIMEOUT
+) -> Optional[JellyfishLightingDiscoveryInfo]:
+    """Connects to an address and asks for the controller's name, hostname and firmware
+    version. Returns None if nothing answers like a controller within the timeout"""
+    transport = JellyfishLightingTransport(address, session)
+    try:
+        await transport.async_connect(timeout)
+        name, hostname, version = await asyncio.gather(
+            transport.async_get_name(timeout),
+            transport.async_get_hostname(timeout),
+            transport.async_get_firmware_version(timeout),
+        )
+    except (JellyFishException, ValueError) as ex:
+        LOGGER.debug("No JellyFish Lighting controller at %s: %s", address, ex)
+        return None
+    finally:
+        try:
+            await transport.async_disconnect(timeout)
+        except JellyFishException:
+            pass
+    return JellyfishLightingDiscoveryInfo(address, name, hostname, version.ver)
+
+
+async def async_discover(
+    session: aiohttp.ClientSession,
+    addresses: Iterable[str],
+    concurrency: int = DISCOVERY_CONCURRENCY,
+    timeout: float = DISCOVERY_TIMEOUT,
+) -> List[JellyfishLightingDiscoveryInfo]:
+    """Probes many addresses at once, at most concurrency at a time, and returns the
+    controllers that answered in the order of their addresses"""
+    slots = asyncio.Semaphore(concurrency)
+
+    async def _async_probe(address: str) -> Optional[JellyfishLightingDiscoveryInfo]:
+        async with slots:
+            return await async_probe(session, address, timeout)
+
+    found = await asyncio.gather(*(_async_probe(address) for address in addresses))
+    return [info for info in found if info is not None]
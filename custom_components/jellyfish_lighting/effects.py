@@ -0,0 +1,81 @@
+"""Per-pixel effects for streaming custom animations to JellyFish Lighting zones"""
+
+from typing import Callable, Optional, Sequence, Tuple
+import numpy as np
+
+# Renders a frame given the time since the stream started (seconds) and the position of
+# each light along the zone (0..1). Returns an (n, 3) array of RGB values
+Effect = Callable[[float, np.ndarray], np.ndarray]
+
+EFFECT_GRADIENT = "gradient"
+EFFECT_CHASE = "chase"
+EFFECT_LEVEL = "level"
+EFFECTS = [EFFECT_GRADIENT, EFFECT_CHASE, EFFECT_LEVEL]
+
+
+def positions(pixels: int) -> np.ndarray:
+    """The position of each light along a zone with the given number of lights"""
+    return np.arange(pixels, dtype=np.float32) / max(pixels, 1)
+
+
+def gradient(colors: Sequence[Tuple[int, int, int]], speed: float = 0.0) -> Effect:
+    """Blends between the colors along the zone, wrapping around from the last color to
+    the first. The gradient scrolls by speed zone lengths per second"""
+    stops = np.asarray(colors, dtype=np.float32).reshape(-1, 3)
+    count = len(stops)
+    following = np.roll(stops, -1, axis=0)
+
+    def render(t: float, pos: np.ndarray) -> np.ndarray:
+        x = (pos + t * speed) % 1.0 * count
+        index = x.astype(np.intp)
+        weight = (x - index)[:, None]
+        # The remainder rounds up to 1.0 for tiny negative offsets (e.g. with a negative
+        # speed), which is the same position as 0.0
+        index %= count
+        return (stops[index] * (1 - weight) + following[index] * weight).astype(
+            np.uint8
+        )
+
+    return render
+
+
+def chase(
+    color: Tuple[int, int, int],
+    background: Tuple[int, int, int] = (0, 0, 0),
+    length: float = 0.1,
+    speed: float = 0.5,
+) -> Effect:
+    """A band of color covering length of the zone that moves by speed zone lengths per
+    second over a background color"""
+    foreground = np.asarray(color, dtype=np.uint8)
+    back = np.asarray(background, dtype=np.uint8)
+
+    def render(t: float, pos: np.ndarray) -> np.ndarray:
+        lit = (t * speed - pos) % 1.0 < length
+        return np.where(lit[:, None], foreground, back)
+
+    return render
+
+
+def level(
+    value: Callable[[], Optional[float]],
+    minimum: float,
+    maximum: float,
+    low_color: Tuple[int, int, int],
+    high_color: Tuple[int, int, int],
+) -> Effect:
+    """Lights the zone in a color between low_color and high_color depending on where a
+    value (e.g. a sensor state) lies between minimum and maximum"""
+    low = np.asarray(low_color, dtype=np.float32)
+    high = np.asarray(high_color, dtype=np.float32)
+    span = (maximum - minimum) or 1.0
+
+    def render(t: float, pos: np.ndarray) -> np.ndarray:
+        current = value()
+        fraction = (
+            0.0 if current is None else min(max((current - minimum) / span, 0), 1)
+        )
+        color = (low + (high - low) * fraction).astype(np.uint8)
+        return np.broadcast_to(color, (len(pos), 3))
+
+    return render
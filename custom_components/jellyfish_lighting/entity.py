@@ -8,6 +8,7 @@ from .const import (
     NAME,
     DEVICE,
     ATTRIBUTION,
+    ATTR_INTEGRATION,
     CONF_NAME,
     CONF_HOSTNAME,
     CONF_VERSION,
@@ -17,6 +18,10 @@ from .const import (
 class JellyfishLightingEntity(CoordinatorEntity):
     """Entity for the JellyFish Lighting integration"""
 
+    _attr_attribution = ATTRIBUTION
+    # Static attributes are not worth storing with every recorded state
+    _unrecorded_attributes = frozenset({ATTR_INTEGRATION})
+
     def __init__(self, coordinator, config_entry):
         super().__init__(coordinator)
         self.config_entry = config_entry
@@ -42,7 +47,6 @@ class JellyfishLightingEntity(CoordinatorEntity):
     def extra_state_attributes(self):
         """Return the state attributes."""
         return {
-            "attribution": ATTRIBUTION,
             # "id": str(self.coordinator.data.get("id")),
-            "integration": DOMAIN,
+            ATTR_INTEGRATION: DOMAIN,
         }
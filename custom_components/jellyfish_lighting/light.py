@@ -1,8 +1,10 @@
 """Switch platform for jellyfish-lighting."""
 
 import re
-from typing import Any
+from statistics import mean
+from typing import Any, List, Optional
 from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import callback
 from homeassistant.components.light import (
     LightEntity,
     LightEntityFeature,
@@ -10,28 +12,55 @@ from homeassistant.components.light import (
     ATTR_EFFECT,
     ATTR_BRIGHTNESS,
     ATTR_RGB_COLOR,
+    ATTR_TRANSITION,
 )
 from .const import (
     LOGGER,
     DOMAIN,
+    CONF_SEGMENTS,
     DEFAULT_BRIGHTNESS,
     DEFAULT_COLOR,
 )
 from . import JellyfishLightingDataUpdateCoordinator, JellyfishLightingApiClient
+from .api import JellyFishLightingZoneData
 from .entity import JellyfishLightingEntity
+from .segments import JellyfishLightingSegment
+from .trace import TRACE_STATE_WRITTEN
 
 
 async def async_setup_entry(hass, entry, async_add_entities):
     """Setup light platform"""
     coord = hass.data[DOMAIN][entry.entry_id]
-    lights = [JellyfishLightingLight(coord, entry, zone) for zone in coord.api.zones]
-    async_add_entities(lights)
+    known_zones = set()
+
+    @callback
+    def async_add_new_zones() -> None:
+        """Adds lights for zones that are not known yet (e.g. when starting from
+        cached data and the controller reports new zones once connected)"""
+        new_zones = [zone for zone in coord.api.zones if zone not in known_zones]
+        if new_zones:
+            known_zones.update(new_zones)
+            async_add_entities(
+                [JellyfishLightingLight(coord, entry, zone) for zone in new_zones]
+            )
+
+    async_add_entities([JellyfishLightingAllZonesLight(coord, entry)])
+    async_add_entities(
+        [
+            JellyfishLightingSegmentLight(
+                coord, entry, JellyfishLightingSegment.parse(definition)
+            )
+            for definition in entry.options.get(CONF_SEGMENTS, [])
+        ]
+    )
+    async_add_new_zones()
+    entry.async_on_unload(coord.api.async_add_zone_listener(None, async_add_new_zones))
 
 
 class JellyfishLightingLight(JellyfishLightingEntity, LightEntity):
     """jellyfish-lighting light class."""
 
-    _attr_supported_features = LightEntityFeature.EFFECT
+    _attr_supported_features = LightEntityFeature.EFFECT | LightEntityFeature.TRANSITION
     _attr_supported_color_modes = {ColorMode.RGB}
     _attr_color_mode = ColorMode.RGB
     _attr_icon = "mdi:led-strip-variant"
@@ -50,21 +79,22 @@ class JellyfishLightingLight(JellyfishLightingEntity, LightEntity):
         self._attr_name = zone
         self._attr_is_on = False
         self._attr_effect = None
-        self.api.register_push_listener(self)
+        self._last_written = None
         super().__init__(coordinator, entry)
 
     @property
     def unique_id(self) -> str:
         return self._attr_unique_id
 
+    @property
+    def zone_state(self) -> Optional[JellyFishLightingZoneData]:
+        """The cached state of the zone, or None if it is not known"""
+        return self.api.states.get(self.zone)
+
     @property
     def available(self) -> bool:
         """Return True if entity is available."""
-        try:
-            self.api.states[self.zone]
-        except KeyError:
-            return False
-        return self.api.connected
+        return self.zone_state is not None and self.api.connected
 
     @property
     def effect_list(self) -> list[str]:
@@ -74,46 +104,64 @@ class JellyfishLightingLight(JellyfishLightingEntity, LightEntity):
     @property
     def is_on(self) -> bool:
         """Return the state of the light."""
-        return self.api.states[self.zone].is_on
+        return self.zone_state.is_on
 
     @property
     def effect(self) -> str | None:
         """Return the current effect of the light."""
-        return self.api.states[self.zone].file
+        return self.zone_state.file
 
     @property
     def rgb_color(self) -> tuple[int, int, int] | None:
         """Return the color value."""
-        return self.api.states[self.zone].color or DEFAULT_COLOR
+        return self.zone_state.color or DEFAULT_COLOR
 
     @property
     def brightness(self) -> int | None:
         """Return the brightness of this light between 0..255."""
-        brightness = self.api.states[self.zone].brightness or DEFAULT_BRIGHTNESS
+        brightness = self.zone_state.brightness or DEFAULT_BRIGHTNESS
         # JF API returns brightness as an int between 0 and 100
         return int(brightness / 100 * 255)
 
     async def async_added_to_hass(self) -> None:
+        self.async_on_remove(
+            self.api.async_add_zone_listener(self.zone, self._async_write_if_changed)
+        )
         self._handle_coordinator_update()
         return await super().async_added_to_hass()
 
-    async def async_refresh_data(self):
-        """Refresh data for this entity"""
-        await self.api.async_get_zone_states(self.zone)
-        self._handle_coordinator_update()
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        self._async_write_if_changed()
+
+    @callback
+    def _async_write_if_changed(self) -> None:
+        """Writes the entity state only if availability, the zone state, or the
+        pattern list changed since the last write"""
+        snapshot = (self.available, self.zone_state, self.api.catalog.version)
+        if snapshot == self._last_written:
+            return
+        self._last_written = snapshot
+        self.async_write_ha_state()
+        if self.api.trace.enabled:
+            self.api.trace.record(
+                TRACE_STATE_WRITTEN, entity_id=self.entity_id, zone=self.zone
+            )
 
     async def async_turn_on(self, **kwargs: Any) -> None:
         """Turn on the zone."""
         effect = kwargs.get(ATTR_EFFECT)
         rgb_color = kwargs.get(ATTR_RGB_COLOR)
         brightness = kwargs.get(ATTR_BRIGHTNESS)
+        transition = kwargs.get(ATTR_TRANSITION, 0)
 
         LOGGER.debug(
-            "Turning on %s (effect: %s, color: %s, brightness: %s)",
+            "Turning on %s (effect: %s, color: %s, brightness: %s, transition: %s)",
             self.zone,
             effect,
             rgb_color,
             brightness,
+            transition,
         )
         if effect:
             await self.api.async_apply_pattern(effect, self.zone)
@@ -122,13 +170,153 @@ class JellyfishLightingLight(JellyfishLightingEntity, LightEntity):
             # Convert brightness back to a 0..100 value
             brightness = int((brightness or self.brightness) / 255 * 100)
             rgb_color = rgb_color or self.rgb_color
-            await self.api.async_apply_color(rgb_color, brightness, self.zone)
+            await self.api.async_apply_color(
+                rgb_color, brightness, self.zone, transition
+            )
+        elif transition and not self.is_on and self.zone_state.color:
+            # Fade in to the color the zone showed before it was turned off
+            brightness = int(self.brightness / 255 * 100)
+            await self.api.async_apply_color(
+                self.rgb_color, brightness, self.zone, transition
+            )
         else:
             await self.api.async_turn_on(self.zone)
-        await self.async_refresh_data()
 
     async def async_turn_off(self, **kwargs: Any) -> None:
         """Turn off the zone."""
-        LOGGER.debug("Turning off zone '%s'", self.zone)
-        await self.api.async_turn_off(self.zone)
-        await self.async_refresh_data()
+        transition = kwargs.get(ATTR_TRANSITION, 0)
+        LOGGER.debug("Turning off zone '%s' (transition: %s)", self.zone, transition)
+        await self.api.async_turn_off(self.zone, transition)
+
+
+class JellyfishLightingAllZonesLight(JellyfishLightingLight):
+    """Controls every zone of the controller with single all-zones commands. Its state is
+    combined from the cached zone states: it is on if any zone is on, and shows the
+    effect or color the lit zones have in common"""
+
+    _attr_icon = "mdi:home-lightbulb-outline"
+
+    def __init__(
+        self, coordinator: JellyfishLightingDataUpdateCoordinator, entry: ConfigEntry
+    ) -> None:
+        """Initialize."""
+        super().__init__(coordinator, entry, "All zones")
+        # Commands and listeners for zone None affect all zones
+        self.zone = None
+        self._attr_unique_id = f"{entry.entry_id}_all_zones"
+
+    @property
+    def zone_state(self) -> Optional[JellyFishLightingZoneData]:
+        """The combined state of all zones, or None if any zone state is not known"""
+        states: List[JellyFishLightingZoneData] = []
+        for zone in self.api.zones:
+            state = self.api.states.get(zone)
+            if state is None:
+                return None
+            states.append(state)
+        if not states:
+            return None
+        lit = [state for state in states if state.is_on] or states
+        files = {state.file for state in lit}
+        colors = {state.color for state in lit}
+        brightness = [state.brightness for state in lit if state.brightness is not None]
+        return JellyFishLightingZoneData(
+            any(state.is_on for state in states),
+            files.pop() if len(files) == 1 else None,
+            colors.pop() if len(colors) == 1 else None,
+            round(mean(brightness)) if brightness else None,
+        )
+
+
+class JellyfishLightingSegmentLight(JellyfishLightingEntity, LightEntity):
+    """A range of lights within a zone, defined in the integration's options. Segments
+    of a zone are drawn into a frame that is written to the controller as one light
+    string, so changing several segments together costs a single command"""
+
+    _attr_supported_color_modes = {ColorMode.RGB}
+    _attr_color_mode = ColorMode.RGB
+    _attr_icon = "mdi:led-strip"
+    _attr_has_entity_name = True
+
+    def __init__(
+        self,
+        coordinator: JellyfishLightingDataUpdateCoordinator,
+        entry: ConfigEntry,
+        segment: JellyfishLightingSegment,
+    ) -> None:
+        """Initialize."""
+        self.api: JellyfishLightingApiClient = coordinator.api
+        self.segment = segment
+        slug = re.sub("[^a-z0-9]", "_", segment.name.lower())
+        self._attr_unique_id = f"{entry.entry_id}_segment_{slug}"
+        self._attr_name = segment.name
+        # The color shown when the segment is turned on without one
+        self._color = (DEFAULT_COLOR, DEFAULT_BRIGHTNESS)
+        self._last_written = None
+        super().__init__(coordinator, entry)
+
+    @property
+    def available(self) -> bool:
+        """Return True if entity is available."""
+        return (
+            self.api.connected and self.api.zone_pixels(self.segment.zone) is not None
+        )
+
+    @property
+    def is_on(self) -> bool:
+        """Return the state of the light."""
+        return self.segment.name in self.api.segments.states
+
+    @property
+    def rgb_color(self) -> tuple[int, int, int] | None:
+        """Return the color value."""
+        return self.api.segments.states.get(self.segment.name, self._color)[0]
+
+    @property
+    def brightness(self) -> int | None:
+        """Return the brightness of this light between 0..255."""
+        brightness = self.api.segments.states.get(self.segment.name, self._color)[1]
+        return int(brightness / 100 * 255)
+
+    async def async_added_to_hass(self) -> None:
+        self.async_on_remove(
+            self.api.async_add_zone_listener(
+                self.segment.zone, self._async_write_if_changed
+            )
+        )
+        self._handle_coordinator_update()
+        return await super().async_added_to_hass()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        self._async_write_if_changed()
+
+    @callback
+    def _async_write_if_changed(self) -> None:
+        """Writes the entity state only if availability or the segment state changed"""
+        snapshot = (self.available, self.api.segments.states.get(self.segment.name))
+        if snapshot == self._last_written:
+            return
+        self._last_written = snapshot
+        self.async_write_ha_state()
+
+    async def async_turn_on(self, **kwargs: Any) -> None:
+        """Turn on the segment."""
+        rgb_color = kwargs.get(ATTR_RGB_COLOR) or self.rgb_color
+        # Convert brightness back to a 0..100 value
+        brightness = int((kwargs.get(ATTR_BRIGHTNESS) or self.brightness) / 255 * 100)
+        LOGGER.debug(
+            "Turning on segment %s (color: %s, brightness: %s)",
+            self.segment,
+            rgb_color,
+            brightness,
+        )
+        self._color = (tuple(rgb_color), brightness)
+        await self.api.async_apply_segment(self.segment, rgb_color, brightness)
+        self._async_write_if_changed()
+
+    async def async_turn_off(self, **kwargs: Any) -> None:
+        """Turn off the segment."""
+        LOGGER.debug("Turning off segment %s", self.segment)
+        await self.api.async_apply_segment(self.segment, None)
+        self._async_write_if_changed()
@@ -0,0 +1,115 @@
+"""Counters and latency histograms for JellyFish Lighting controllers"""
+
+from bisect import bisect_left
+from contextlib import contextmanager
+import time
+from typing import Any, Dict, List, Optional
+
+# Upper bounds (milliseconds) of the latency histogram buckets
+BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class JellyfishLightingHistogram:
+    """Distribution of the durations of an operation in fixed buckets"""
+
+    def __init__(self) -> None:
+        self.counts: List[int] = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.minimum = 0.0
+        self.maximum = 0.0
+
+    def record(self, seconds: float) -> None:
+        """Adds a duration"""
+        ms = seconds * 1000
+        self.counts[bisect_left(BUCKETS, ms)] += 1
+        self.minimum = min(self.minimum, ms) if self.count else ms
+        self.count += 1
+        self.total += ms
+        self.maximum = max(self.maximum, ms)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """Estimates the duration (ms) below which the given fraction of samples fall,
+        interpolating within the bucket it lies in"""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = max(BUCKETS[index - 1] if index else 0, self.minimum)
+                upper = (
+                    min(BUCKETS[index], self.maximum)
+                    if index < len(BUCKETS)
+                    else self.maximum
+                )
+                value = lower + (upper - lower) * (rank - seen) / count
+                return round(value, 2)
+            seen += count
+        return round(self.maximum, 2)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Summary of the distribution, in milliseconds"""
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 2) if self.count else None,
+            "min_ms": round(self.minimum, 2),
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "max_ms": round(self.maximum, 2),
+            "buckets": {
+                f"<={bound}ms" if index < len(BUCKETS) else f">{BUCKETS[-1]}ms": count
+                for index, (bound, count) in enumerate(
+                    zip((*BUCKETS, None), self.counts)
+                )
+                if count
+            },
+        }
+
+
+class JellyfishLightingMetrics:
+    """
+    Counters and latency histograms for a single controller. Recording is cheap enough
+    to always be on: a counter is a dict update and a histogram sample a bisect.
+    Operation names describe where the time was spent, e.g. "request_*" histograms
+    time round trips to the controller, "command_confirmation" the time until the
+    controller reports a command as applied, and "event_loop_lag" how late Home
+    Assistant ran scheduled work.
+    """
+
+    def __init__(self) -> None:
+        self.counters: Dict[str, int] = {}
+        self.histograms: Dict[str, JellyfishLightingHistogram] = {}
+
+    def increment(self, name: str, count: int = 1) -> None:
+        """Increments a counter"""
+        self.counters[name] = self.counters.get(name, 0) + count
+
+    def record(self, name: str, seconds: float) -> None:
+        """Adds a duration to the histogram of an operation"""
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = JellyfishLightingHistogram()
+        histogram.record(seconds)
+
+    @contextmanager
+    def timer(self, name: str):
+        """Records the duration of the block if it completes without an error"""
+        start = time.perf_counter()
+        yield
+        self.record(name, time.perf_counter() - start)
+
+    def percentile(self, name: str, fraction: float) -> Optional[float]:
+        """Estimated percentile (ms) of an operation, or None if it was never recorded"""
+        histogram = self.histograms.get(name)
+        return histogram.percentile(fraction) if histogram else None
+
+    def as_dict(self) -> Dict[str, Any]:
+        """All counters and histogram summaries"""
+        return {
+            "counters": dict(sorted(self.counters.items())),
+            "latency": {
+                name: histogram.as_dict()
+                for name, histogram in sorted(self.histograms.items())
+            },
+        }
@@ -0,0 +1,189 @@
+"""Virtual segments of JellyFish Lighting zones, composited into one light string per zone"""
+
+import asyncio
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set, Tuple
+import numpy as np
+from jellyfishlightspy import JellyFishException
+from .const import LOGGER, BATCH_WINDOW
+from .transport import JellyfishLightingTransport
+
+
+@dataclass(frozen=True, slots=True)
+class JellyfishLightingSegment:
+    """A named range of lights within a zone. Lights are numbered from 1 and the range
+    includes both ends"""
+
+    name: str
+    zone: str
+    first: int
+    last: int
+
+    def __str__(self) -> str:
+        return f"{self.name} = {self.zone}: {self.first}-{self.last}"
+
+    @classmethod
+    def parse(cls, line: str) -> "JellyfishLightingSegment":
+        """Parses a definition in the form "name = zone: first-last" """
+        name, sep, rest = line.partition("=")
+        zone, _, lights = rest.rpartition(":")
+        first, _, last = lights.partition("-")
+        if not sep or not name.strip() or not zone.strip():
+            raise ValueError(f"Expected 'name = zone: first-last', got '{line}'")
+        try:
+            segment = cls(name.strip(), zone.strip(), int(first), int(last))
+        except ValueError as ex:
+            raise ValueError(f"Invalid light range in '{line}'") from ex
+        if not 1 <= segment.first <= segment.last:
+            raise ValueError(f"Invalid light range in '{line}'")
+        return segment
+
+
+def parse_segments(text: str) -> List[JellyfishLightingSegment]:
+    """Parses segment definitions, one per line. Blank lines are ignored"""
+    segments = [
+        JellyfishLightingSegment.parse(line)
+        for line in text.splitlines()
+        if line.strip()
+    ]
+    names = [segment.name for segment in segments]
+    duplicates = {name for name in names if names.count(name) > 1}
+    if duplicates:
+        raise ValueError(f"Duplicate segment name(s) {', '.join(sorted(duplicates))}")
+    return segments
+
+
+class JellyfishLightingCompositor:
+    """
+    Keeps a frame buffer (an array of RGB values) per zone with segments, into which the
+    color of each segment is drawn, scaled by its brightness. Lights outside of lit
+    segments are off, and where segments overlap the last one changed wins. Frames are
+    written once the batching window closes, so segments changed together cost a single
+    request per zone, zones with identical frames share one request, and a zone whose
+    segments are all off is turned off.
+    """
+
+    def __init__(
+        self,
+        transport: JellyfishLightingTransport,
+        pixels: Callable[[str], Optional[int]],
+    ) -> None:
+        self._transport = transport
+        self._pixels = pixels
+        self._frames: Dict[str, np.ndarray] = {}
+        # The color and brightness of each lit segment, by name
+        self._lit: Dict[str, Tuple[JellyfishLightingSegment, np.ndarray]] = {}
+        self.states: Dict[str, Tuple[Tuple[int, int, int], int]] = {}
+        self._dirty: Set[str] = set()
+        self._written: Optional[asyncio.Future] = None
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self.frames_sent = 0
+
+    async def async_set(
+        self,
+        segment: JellyfishLightingSegment,
+        rgb: Optional[Tuple[int, int, int]],
+        brightness: int = 100,
+    ) -> None:
+        """Lights a segment in a color at a brightness (0..100), or turns it off if rgb
+        is None, and waits until the zone's frame was sent"""
+        pixels = self._pixels(segment.zone)
+        if pixels is None:
+            raise JellyFishException(f"Unknown zone '{segment.zone}'")
+        # Re-insert so the segment is drawn last (on top of segments it overlaps)
+        self._lit.pop(segment.name, None)
+        self.states.pop(segment.name, None)
+        if rgb is not None:
+            color = np.round(np.asarray(rgb, dtype=np.float32) * brightness / 100)
+            self._lit[segment.name] = (segment, color.astype(np.uint8))
+            self.states[segment.name] = (tuple(rgb), brightness)
+        frame = self._frames.get(segment.zone)
+        if frame is None or len(frame) != pixels:
+            self._frames[segment.zone] = self._compose(segment.zone, pixels)
+        else:
+            self._draw(frame, segment)
+        self._dirty.add(segment.zone)
+        if self._written is None:
+            loop = asyncio.get_running_loop()
+            written = self._written = loop.create_future()
+            self._handle = loop.call_later(
+                BATCH_WINDOW, lambda: loop.create_task(self._async_write(written))
+            )
+        await asyncio.shield(self._written)
+
+    def clear(self, zone: str, superseded: bool = False) -> List[str]:
+        """Forgets the segments of a zone that another command took over, without writing
+        anything. Frames of the zone that were not written yet are dropped if superseded
+        by a command that is about to be sent, but win over a push. Returns the names of
+        the segments that were lit"""
+        if zone in self._dirty:
+            if not superseded:
+                # The push predates segment changes that are about to be written
+                return []
+            self._dirty.discard(zone)
+        names = [name for name, (s, _) in self._lit.items() if s.zone == zone]
+        for name in names:
+            del self._lit[name]
+            del self.states[name]
+        self._frames.pop(zone, None)
+        return names
+
+    def cancel(self) -> None:
+        """Drops frames that are waiting to be written"""
+        if self._written is not None:
+            self._handle.cancel()
+            self._written.set_exception(JellyFishException("Segment write cancelled"))
+            self._written.exception()
+            self._written = None
+        self._dirty.clear()
+
+    def _compose(self, zone: str, pixels: int) -> np.ndarray:
+        """Draws every lit segment of a zone into a new frame"""
+        frame = np.zeros((pixels, 3), dtype=np.uint8)
+        for segment, color in self._lit.values():
+            if segment.zone == zone:
+                frame[segment.first - 1 : segment.last] = color
+        return frame
+
+    def _draw(self, frame: np.ndarray, segment: JellyfishLightingSegment) -> None:
+        """Draws a segment that changed into its zone's frame"""
+        lit = self._lit.get(segment.name)
+        lights = slice(segment.first - 1, segment.last)
+        frame[lights] = lit[1] if lit else 0
+        if not lit:
+            # Lights shared with other lit segments keep their color
+            for other, color in self._lit.values():
+                if other.zone == segment.zone:
+                    start = max(other.first, segment.first) - 1
+                    frame[start : min(other.last, segment.last)] = color
+
+    async def _async_write(self, written: asyncio.Future) -> None:
+        """Sends the frames of every zone that changed in the batching window, unless
+        they were dropped (see cancel) after the write was started"""
+        if written is not self._written:
+            return
+        self._written = None
+        zones, self._dirty = self._dirty, set()
+        off: List[str] = []
+        frames: Dict[bytes, List[str]] = {}
+        for zone in zones:
+            frame = self._frames.get(zone)
+            if frame is None or not frame.any():
+                off.append(zone)
+            else:
+                frames.setdefault(frame.tobytes(), []).append(zone)
+        try:
+            LOGGER.debug("Writing segment frames of zone(s) %s", zones)
+            if off:
+                await self._transport.async_turn_off(off, sync=False)
+            for data, same in frames.items():
+                await self._transport.async_apply_light_string(
+                    list(data), 100, same, sync=False
+                )
+                self.frames_sent += 1
+        except Exception as ex:  # pylint: disable=broad-except
+            written.set_exception(ex)
+            # Avoid "exception never retrieved" warnings if every caller was cancelled
+            written.exception()
+            return
+        written.set_result(None)
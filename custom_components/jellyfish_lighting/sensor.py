@@ -0,0 +1,215 @@
+"""Sensor platform for jellyfish-lighting."""
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+from homeassistant.components.sensor import (
+    SensorDeviceClass,
+    SensorEntity,
+    SensorEntityDescription,
+    SensorStateClass,
+)
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import EntityCategory, UnitOfTime
+from homeassistant.core import callback
+from .const import DOMAIN, ATTR_PATTERNS, ATTR_FOLDERS, METRICS_SCAN_INTERVAL
+from . import JellyfishLightingDataUpdateCoordinator, JellyfishLightingApiClient
+from .entity import JellyfishLightingEntity
+from .metrics import JellyfishLightingMetrics
+
+# Only metric sensors poll, and they only read values already in memory
+SCAN_INTERVAL = METRICS_SCAN_INTERVAL
+
+
+@dataclass(frozen=True, kw_only=True)
+class JellyfishLightingMetricDescription(SensorEntityDescription):
+    """Describes a sensor that reports one of the controller's performance metrics"""
+
+    value_fn: Callable[[JellyfishLightingMetrics], Optional[float]]
+    # Histogram whose summary is exposed as attributes
+    histogram: Optional[str] = None
+
+
+LATENCY = {
+    "device_class": SensorDeviceClass.DURATION,
+    "native_unit_of_measurement": UnitOfTime.MILLISECONDS,
+    "state_class": SensorStateClass.MEASUREMENT,
+    "suggested_display_precision": 0,
+}
+
+METRIC_SENSORS = (
+    JellyfishLightingMetricDescription(
+        key="command_latency",
+        name="Command latency",
+        icon="mdi:timer-outline",
+        histogram="command_confirmation",
+        value_fn=lambda metrics: metrics.percentile("command_confirmation", 0.95),
+        **LATENCY,
+    ),
+    JellyfishLightingMetricDescription(
+        key="request_latency",
+        name="Request latency",
+        icon="mdi:timer-outline",
+        histogram="request",
+        value_fn=lambda metrics: metrics.percentile("request", 0.95),
+        entity_registry_enabled_default=False,
+        **LATENCY,
+    ),
+    JellyfishLightingMetricDescription(
+        key="event_loop_lag",
+        name="Event loop lag",
+        icon="mdi:timer-sand",
+        histogram="event_loop_lag",
+        value_fn=lambda metrics: metrics.percentile("event_loop_lag", 0.95),
+        entity_registry_enabled_default=False,
+        **LATENCY,
+    ),
+    JellyfishLightingMetricDescription(
+        key="reconnects",
+        name="Reconnects",
+        icon="mdi:lan-disconnect",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda metrics: metrics.counters.get("reconnects", 0),
+    ),
+    JellyfishLightingMetricDescription(
+        key="messages_received",
+        name="Messages received",
+        icon="mdi:message-arrow-left-outline",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda metrics: metrics.counters.get("messages_received", 0),
+        entity_registry_enabled_default=False,
+    ),
+)
+
+
+async def async_setup_entry(hass, entry, async_add_entities):
+    """Setup sensor platform"""
+    coord = hass.data[DOMAIN][entry.entry_id]
+    async_add_entities(
+        [
+            JellyfishLightingPatternsSensor(coord, entry),
+            *(
+                JellyfishLightingMetricSensor(coord, entry, description)
+                for description in METRIC_SENSORS
+            ),
+        ]
+    )
+
+
+class JellyfishLightingPatternsSensor(JellyfishLightingEntity, SensorEntity):
+    """Number of patterns saved on the controller, with the pattern catalog as attributes.
+    Its state is only written when the catalog changes"""
+
+    _attr_icon = "mdi:playlist-star"
+    _attr_has_entity_name = True
+    _attr_name = "Patterns"
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _unrecorded_attributes = JellyfishLightingEntity._unrecorded_attributes | {
+        ATTR_PATTERNS,
+        ATTR_FOLDERS,
+    }
+
+    def __init__(
+        self, coordinator: JellyfishLightingDataUpdateCoordinator, entry: ConfigEntry
+    ) -> None:
+        """Initialize."""
+        self.api: JellyfishLightingApiClient = coordinator.api
+        self._attr_unique_id = f"{entry.entry_id}_patterns"
+        self._last_written = None
+        super().__init__(coordinator, entry)
+
+    @property
+    def available(self) -> bool:
+        """The catalog remains valid while disconnected once it is known"""
+        return bool(self.api.catalog)
+
+    @property
+    def native_value(self) -> int:
+        """Return the number of patterns."""
+        return len(self.api.catalog)
+
+    @property
+    def extra_state_attributes(self):
+        """Return the state attributes."""
+        return {
+            **super().extra_state_attributes,
+            ATTR_PATTERNS: self.api.patterns,
+            ATTR_FOLDERS: self.api.catalog.folders,
+        }
+
+    async def async_added_to_hass(self) -> None:
+        self.async_on_remove(
+            self.api.async_add_zone_listener(None, self._async_write_if_changed)
+        )
+        self._handle_coordinator_update()
+        return await super().async_added_to_hass()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        self._async_write_if_changed()
+
+    @callback
+    def _async_write_if_changed(self) -> None:
+        """Writes the entity state only when the catalog changed since the last write"""
+        snapshot = (self.available, self.api.catalog.version)
+        if snapshot == self._last_written:
+            return
+        self._last_written = snapshot
+        self.async_write_ha_state()
+
+
+class JellyfishLightingMetricSensor(JellyfishLightingEntity, SensorEntity):
+    """Reports a performance metric of the controller. Latencies are the 95th percentile
+    since the integration was loaded, with the rest of the distribution as attributes.
+    Metrics change constantly, so the sensor polls them instead of writing its state
+    on every update"""
+
+    entity_description: JellyfishLightingMetricDescription
+    _attr_has_entity_name = True
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _unrecorded_attributes = JellyfishLightingEntity._unrecorded_attributes | {
+        "count",
+        "mean_ms",
+        "min_ms",
+        "p50_ms",
+        "p95_ms",
+        "max_ms",
+    }
+
+    def __init__(
+        self,
+        coordinator: JellyfishLightingDataUpdateCoordinator,
+        entry: ConfigEntry,
+        description: JellyfishLightingMetricDescription,
+    ) -> None:
+        """Initialize."""
+        self.api: JellyfishLightingApiClient = coordinator.api
+        self.entity_description = description
+        self._attr_unique_id = f"{entry.entry_id}_{description.key}"
+        super().__init__(coordinator, entry)
+
+    @property
+    def should_poll(self) -> bool:
+        return True
+
+    @property
+    def native_value(self) -> Optional[float]:
+        """Return the current value of the metric."""
+        return self.entity_description.value_fn(self.api.metrics)
+
+    @property
+    def extra_state_attributes(self) -> Dict[str, Any]:
+        """Return the state attributes."""
+        attributes = super().extra_state_attributes
+        histogram = self.api.metrics.histograms.get(self.entity_description.histogram)
+        if histogram:
+            summary = histogram.as_dict()
+            del summary["buckets"]
+            attributes.update(summary)
+        return attributes
+
+    async def async_update(self) -> None:
+        """Metrics are kept in memory, there is nothing to fetch"""
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Metrics are written when polled, not on every coordinator update"""
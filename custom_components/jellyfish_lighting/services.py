@@ -0,0 +1,367 @@
+"""Services for the JellyFish Lighting integration"""
+
+import asyncio
+from datetime import datetime
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+import voluptuous as vol
+from homeassistant.components.light import (
+    ATTR_BRIGHTNESS,
+    ATTR_EFFECT,
+    ATTR_RGB_COLOR,
+    DOMAIN as LIGHT_DOMAIN,
+)
+from homeassistant.const import ATTR_STATE, ENTITY_MATCH_ALL
+from homeassistant.core import (
+    HomeAssistant,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+    callback,
+)
+from homeassistant.exceptions import HomeAssistantError
+import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.service import async_extract_referenced_entity_ids
+from homeassistant.util import slugify
+from .api import JellyfishLightingApiClient, JellyFishLightingZoneData
+from .const import (
+    DOMAIN,
+    ATTR_ENTITIES,
+    ATTR_COLORS,
+    ATTR_SPEED,
+    ATTR_LENGTH,
+    ATTR_SENSOR,
+    ATTR_MINIMUM,
+    ATTR_MAXIMUM,
+    ATTR_FPS,
+    ATTR_MAX_EVENTS,
+    ATTR_SYNCHRONIZE,
+    SERVICE_APPLY_SCENE,
+    SERVICE_STREAM_EFFECT,
+    SERVICE_STOP_STREAM,
+    SERVICE_START_TRACE,
+    SERVICE_STOP_TRACE,
+    SERVICE_DUMP_TRACE,
+    SERVICE_START_CAPTURE,
+    SERVICE_STOP_CAPTURE,
+    STREAM_FPS,
+    STREAM_MAX_FPS,
+    SYNC_MAX_DELAY,
+    TRACE_SIZE,
+    TRACE_MAX_SIZE,
+)
+from .effects import (
+    Effect,
+    EFFECTS,
+    EFFECT_GRADIENT,
+    EFFECT_CHASE,
+    EFFECT_LEVEL,
+    gradient,
+    chase,
+    level,
+)
+
+RGB_COLOR = vol.All(vol.Coerce(tuple), vol.ExactSequence((cv.byte,) * 3))
+BRIGHTNESS = vol.All(vol.Coerce(int), vol.Range(min=1, max=255))
+
+ZONE_TARGET_SCHEMA = vol.Any(
+    # Shorthand for turning a light on or off
+    vol.All(cv.boolean, lambda state: {ATTR_STATE: state}),
+    vol.Schema(
+        {
+            vol.Optional(ATTR_STATE, default=True): cv.boolean,
+            vol.Exclusive(ATTR_EFFECT, "target"): cv.string,
+            vol.Exclusive(ATTR_RGB_COLOR, "target"): RGB_COLOR,
+            vol.Optional(ATTR_BRIGHTNESS): BRIGHTNESS,
+        }
+    ),
+)
+
+APPLY_SCENE_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_ENTITIES): vol.All(
+            vol.Schema({cv.entity_id: ZONE_TARGET_SCHEMA}), vol.Length(min=1)
+        ),
+        vol.Optional(ATTR_SYNCHRONIZE, default=True): cv.boolean,
+    }
+)
+
+# Lights are targeted like in entity services (by entity, device, area, floor or label)
+STREAM_EFFECT_SCHEMA = cv.make_entity_service_schema(
+    {
+        vol.Required(ATTR_EFFECT): vol.In(EFFECTS),
+        vol.Optional(ATTR_COLORS, default=[(255, 0, 0), (0, 0, 255)]): vol.All(
+            [RGB_COLOR], vol.Length(min=1)
+        ),
+        vol.Optional(ATTR_SPEED, default=0.2): vol.Coerce(float),
+        vol.Optional(ATTR_LENGTH, default=0.1): vol.All(
+            vol.Coerce(float), vol.Range(min=0, max=1)
+        ),
+        vol.Optional(ATTR_SENSOR): cv.entity_id,
+        vol.Optional(ATTR_MINIMUM, default=0): vol.Coerce(float),
+        vol.Optional(ATTR_MAXIMUM, default=100): vol.Coerce(float),
+        vol.Optional(ATTR_BRIGHTNESS, default=255): BRIGHTNESS,
+        vol.Optional(ATTR_FPS, default=STREAM_FPS): vol.All(
+            vol.Coerce(float), vol.Range(min=1, max=STREAM_MAX_FPS)
+        ),
+    }
+)
+
+STOP_STREAM_SCHEMA = cv.make_entity_service_schema({})
+
+START_TRACE_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_MAX_EVENTS, default=TRACE_SIZE): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=TRACE_MAX_SIZE)
+        ),
+    }
+)
+
+
+def _async_get_lights(hass: HomeAssistant, entity_ids: List[str]) -> List[Any]:
+    """The JellyFish Lighting light entities with the given IDs"""
+    component = hass.data.get(LIGHT_DOMAIN)
+    lights = []
+    for entity_id in entity_ids:
+        entity = component.get_entity(entity_id) if component else None
+        if entity is None or entity.platform.platform_name != DOMAIN:
+            raise HomeAssistantError(f"{entity_id} is not a JellyFish Lighting light")
+        if not entity.available:
+            raise HomeAssistantError(f"{entity_id} is unavailable")
+        if getattr(entity, "segment", None) is not None:
+            raise HomeAssistantError(
+                f"{entity_id} is a segment, which is not supported"
+            )
+        lights.append(entity)
+    return lights
+
+
+def _async_get_target_lights(hass: HomeAssistant, call: ServiceCall) -> List[Any]:
+    """The JellyFish Lighting light entities targeted by a service call. Lights given by
+    entity ID must be available zone lights, while other entities in targeted devices,
+    areas, floors or labels (or all entities) are skipped if they are not"""
+    selected = async_extract_referenced_entity_ids(hass, call)
+    explicit = selected.referenced - {ENTITY_MATCH_ALL}
+    indirect = set(selected.indirectly_referenced)
+    component = hass.data.get(LIGHT_DOMAIN)
+    if ENTITY_MATCH_ALL in selected.referenced and component:
+        indirect.update(entity.entity_id for entity in component.entities)
+    lights = _async_get_lights(hass, sorted(explicit))
+    for entity_id in sorted(indirect - explicit):
+        try:
+            lights.extend(_async_get_lights(hass, [entity_id]))
+        except HomeAssistantError:
+            continue
+    return lights
+
+
+def _async_get_clients(hass: HomeAssistant) -> List[JellyfishLightingApiClient]:
+    """The API clients of all loaded controllers"""
+    return [coordinator.api for coordinator in hass.data.get(DOMAIN, {}).values()]
+
+
+def _zones(entity) -> List[str]:
+    """The zones controlled by a light (all zones of its controller for the all zones
+    light)"""
+    return list(entity.api.zones) if entity.zone is None else [entity.zone]
+
+
+async def _async_apply_scenes(
+    scenes: Dict[JellyfishLightingApiClient, Dict[str, JellyFishLightingZoneData]],
+    synchronize: bool,
+) -> List[Dict[str, Any]]:
+    """Applies each controller's part of a scene concurrently and reports how long each
+    controller took. If synchronize is set, controllers are connected first and commands
+    to controllers that reply faster are held back by the difference of their round trip
+    times (which are mostly spent processing the request), so the changes land at about
+    the same moment"""
+    results = {
+        api: {"name": api.name, "address": api.address, "zones": len(scene)}
+        for api, scene in scenes.items()
+    }
+    delays = dict.fromkeys(scenes, 0.0)
+    if synchronize and len(scenes) > 1:
+        await asyncio.gather(
+            *(api.async_connect() for api in scenes), return_exceptions=True
+        )
+        slowest = max(api.round_trip_time for api in scenes)
+        for api in scenes:
+            delays[api] = min(slowest - api.round_trip_time, SYNC_MAX_DELAY)
+
+    async def _async_apply(api: JellyfishLightingApiClient) -> None:
+        result = results[api]
+        result["delay_ms"] = round(delays[api] * 1000, 1)
+        if delays[api]:
+            await asyncio.sleep(delays[api])
+        start = time.perf_counter()
+        try:
+            await api.async_apply_scene(scenes[api])
+        except HomeAssistantError as ex:
+            result["error"] = str(ex)
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    await asyncio.gather(*(_async_apply(api) for api in scenes))
+    return list(results.values())
+
+
+def _state_value(hass: HomeAssistant, entity_id: str) -> Callable[[], Optional[float]]:
+    """Reads the numeric state of an entity, or None if it is not a number"""
+
+    def value() -> Optional[float]:
+        state = hass.states.get(entity_id)
+        try:
+            return float(state.state)
+        except (AttributeError, ValueError):
+            return None
+
+    return value
+
+
+def _effect(hass: HomeAssistant, data: Dict[str, Any]) -> Effect:
+    """The effect described by the service data of a stream_effect call"""
+    colors = data[ATTR_COLORS]
+    if data[ATTR_EFFECT] == EFFECT_GRADIENT:
+        return gradient(colors, data[ATTR_SPEED])
+    if data[ATTR_EFFECT] == EFFECT_CHASE:
+        background = colors[1] if len(colors) > 1 else (0, 0, 0)
+        return chase(colors[0], background, data[ATTR_LENGTH], data[ATTR_SPEED])
+    if ATTR_SENSOR not in data:
+        raise HomeAssistantError(f"The {EFFECT_LEVEL} effect requires a sensor")
+    return level(
+        _state_value(hass, data[ATTR_SENSOR]),
+        data[ATTR_MINIMUM],
+        data[ATTR_MAXIMUM],
+        colors[0],
+        colors[-1],
+    )
+
+
+def _zone_target(entity, target: Dict[str, Any]) -> JellyFishLightingZoneData:
+    """The target state of a zone from the service data of its light"""
+    if not target.get(ATTR_STATE, True):
+        return JellyFishLightingZoneData(False)
+    if ATTR_EFFECT in target:
+        return JellyFishLightingZoneData(True, target[ATTR_EFFECT])
+    if ATTR_RGB_COLOR in target or ATTR_BRIGHTNESS in target:
+        # Fill in the blanks from the current state, as light.turn_on does
+        # Convert brightness back to a 0..100 value
+        brightness = int(target.get(ATTR_BRIGHTNESS, entity.brightness) / 255 * 100)
+        rgb_color = tuple(target.get(ATTR_RGB_COLOR, entity.rgb_color))
+        return JellyFishLightingZoneData(True, None, rgb_color, brightness)
+    return JellyFishLightingZoneData(True)
+
+
+@callback
+def async_setup_services(hass: HomeAssistant) -> None:
+    """Registers the integration's services"""
+
+    async def async_apply_scene(call: ServiceCall) -> ServiceResponse:
+        """Applies a pattern, color or on/off state to each light. Lights are grouped by
+        controller, each controller applies its part of the scene in one go, and all
+        controllers are sent their part at the same time. Responds with each controller's
+        latency and error, and fails if any controller failed unless a response was
+        requested"""
+        targets = call.data[ATTR_ENTITIES]
+        scenes: Dict[JellyfishLightingApiClient, Dict[str, JellyFishLightingZoneData]]
+        scenes = {}
+        for entity in _async_get_lights(hass, list(targets)):
+            target = _zone_target(entity, targets[entity.entity_id])
+            for zone in _zones(entity):
+                scenes.setdefault(entity.api, {})[zone] = target
+        results = await _async_apply_scenes(scenes, call.data[ATTR_SYNCHRONIZE])
+        if call.return_response:
+            return {"controllers": results}
+        failed = [result for result in results if "error" in result]
+        if failed:
+            raise HomeAssistantError(
+                "; ".join(f"{result['name']}: {result['error']}" for result in failed)
+            )
+        return None
+
+    async def async_stream_effect(call: ServiceCall) -> None:
+        """Streams a per-pixel effect to each light until it is sent another command"""
+        effect = _effect(hass, call.data)
+        # Convert brightness back to a 0..100 value
+        brightness = int(call.data[ATTR_BRIGHTNESS] / 255 * 100)
+        for entity in _async_get_target_lights(hass, call):
+            for zone in _zones(entity):
+                await entity.api.async_stream_effect(
+                    effect, zone, brightness, call.data[ATTR_FPS]
+                )
+
+    async def async_stop_stream(call: ServiceCall) -> None:
+        """Stops streaming effects to each light"""
+        for entity in _async_get_target_lights(hass, call):
+            for zone in _zones(entity):
+                entity.api.async_stop_stream(zone)
+
+    async def async_start_trace(call: ServiceCall) -> None:
+        """Starts recording push and command events of every controller"""
+        for api in _async_get_clients(hass):
+            api.trace.start(call.data[ATTR_MAX_EVENTS])
+
+    async def async_stop_trace(call: ServiceCall) -> None:
+        """Stops recording events, keeping those recorded for dump_trace"""
+        for api in _async_get_clients(hass):
+            api.trace.stop()
+
+    async def async_start_capture(call: ServiceCall) -> ServiceResponse:
+        """Starts capturing the messages received from every controller to a file per
+        controller in the jellyfish_lighting folder of the configuration directory"""
+        started = datetime.now().strftime("%Y%m%d-%H%M%S")
+        paths = {}
+        for api in _async_get_clients(hass):
+            name = slugify(api.hostname or api.address)
+            path = hass.config.path(DOMAIN, f"{name}-{started}.jsonl.gz")
+            await api.async_start_capture(path)
+            paths[api.name] = path
+        return {"files": paths}
+
+    async def async_stop_capture(call: ServiceCall) -> ServiceResponse:
+        """Stops capturing messages and closes the capture files"""
+        files = {}
+        for api in _async_get_clients(hass):
+            capture = await api.async_stop_capture()
+            if capture:
+                files[api.name] = {
+                    "path": capture.path,
+                    "messages": capture.messages,
+                    "bytes": await hass.async_add_executor_job(
+                        os.path.getsize, capture.path
+                    ),
+                }
+        return {"files": files}
+
+    async def async_dump_trace(call: ServiceCall) -> ServiceResponse:
+        """Returns the events recorded for every controller"""
+        return {
+            "controllers": [
+                {"name": api.name, "address": api.address, **api.trace.as_dict()}
+                for api in _async_get_clients(hass)
+            ]
+        }
+
+    none, optional, only = (
+        SupportsResponse.NONE,
+        SupportsResponse.OPTIONAL,
+        SupportsResponse.ONLY,
+    )
+    for service, handler, schema, response in (
+        (SERVICE_APPLY_SCENE, async_apply_scene, APPLY_SCENE_SCHEMA, optional),
+        (SERVICE_STREAM_EFFECT, async_stream_effect, STREAM_EFFECT_SCHEMA, none),
+        (SERVICE_STOP_STREAM, async_stop_stream, STOP_STREAM_SCHEMA, none),
+        (SERVICE_START_TRACE, async_start_trace, START_TRACE_SCHEMA, none),
+        (SERVICE_STOP_TRACE, async_stop_trace, None, none),
+        (SERVICE_DUMP_TRACE, async_dump_trace, None, only),
+        (SERVICE_START_CAPTURE, async_start_capture, None, optional),
+        (SERVICE_STOP_CAPTURE, async_stop_capture, None, optional),
+    ):
+        if not hass.services.has_service(DOMAIN, service):
+            hass.services.async_register(
+                DOMAIN,
+                service,
+                handler,
+                schema=schema,
+                supports_response=response,
+            )
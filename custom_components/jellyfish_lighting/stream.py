@@ -0,0 +1,148 @@
+"""Streams frames rendered by per-pixel effects to JellyFish Lighting zones"""
+
+import asyncio
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from jellyfishlightspy import JellyFishException
+from .const import LOGGER, STREAM_FPS
+from .effects import Effect, positions
+from .transport import JellyfishLightingTransport
+
+
+class _Stream:
+    """An effect being streamed to a zone"""
+
+    def __init__(
+        self, effect: Effect, pixels: int, brightness: int, fps: float, now: float
+    ):
+        self.effect = effect
+        self.positions = positions(pixels)
+        self.brightness = brightness
+        self.interval = 1 / fps
+        self.started = now
+        self.next_frame = now
+        self.last_frame: Optional[bytes] = None
+        self.sending = False
+
+
+class JellyfishLightingStreamer:
+    """
+    Renders effects for each streaming zone at a fixed frame rate and sends the frames
+    to the controller as light strings. Zones showing identical frames share one
+    multi-zone request, unchanged frames are not sent, and frames are never queued:
+    if the previous frame for a zone is still being sent (the socket is backed up)
+    the new frame is dropped, so the zone always shows the most recent frame.
+    """
+
+    def __init__(self, transport: JellyfishLightingTransport) -> None:
+        self._transport = transport
+        self._streams: Dict[str, _Stream] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.frames_sent = 0
+        self.frames_dropped = 0
+
+    @property
+    def zones(self) -> List[str]:
+        """The zones that are currently streaming"""
+        return list(self._streams)
+
+    def start(
+        self,
+        zone: str,
+        effect: Effect,
+        pixels: int,
+        brightness: int = 100,
+        fps: float = STREAM_FPS,
+    ) -> None:
+        """Starts streaming an effect to a zone, replacing any effect already streaming"""
+        loop = asyncio.get_running_loop()
+        stream = _Stream(effect, pixels, brightness, fps, loop.time())
+        for other in self._streams.values():
+            if other.interval == stream.interval:
+                # Share the clock of streams with the same frame rate so that zones
+                # running the same effect render identical frames in the same tick
+                stream.started, stream.next_frame = other.started, other.next_frame
+                break
+        self._streams[zone] = stream
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._async_run())
+
+    def stop(self, zones: Optional[Iterable[str]] = None) -> None:
+        """Stops streaming to the given zones (or all zones if not provided)"""
+        for zone in list(self._streams) if zones is None else zones:
+            self._streams.pop(zone, None)
+        if not self._streams and self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _async_run(self) -> None:
+        """Renders and sends due frames until no zone is streaming. Zones whose effect
+        fails to render stop streaming"""
+        loop = asyncio.get_running_loop()
+        try:
+            while self._streams:
+                now = loop.time()
+                frames: Dict[Tuple[bytes, int], List[str]] = {}
+                failed: List[str] = []
+                for zone, stream in self._streams.items():
+                    if now < stream.next_frame:
+                        continue
+                    # Keep frames on a fixed schedule, skipping ticks that were missed
+                    missed = int((now - stream.next_frame) // stream.interval)
+                    stream.next_frame += (missed + 1) * stream.interval
+                    self.frames_dropped += missed
+                    if stream.sending:
+                        self.frames_dropped += 1
+                        continue
+                    try:
+                        frame = stream.effect(now - stream.started, stream.positions)
+                        data = np.ascontiguousarray(frame, dtype=np.uint8).tobytes()
+                    except Exception:  # pylint: disable=broad-except
+                        LOGGER.exception("Stopped streaming to zone %s", zone)
+                        failed.append(zone)
+                        continue
+                    if data == stream.last_frame:
+                        continue
+                    stream.last_frame = data
+                    frames.setdefault((data, stream.brightness), []).append(zone)
+                for zone in failed:
+                    del self._streams[zone]
+                for (data, brightness), zones in frames.items():
+                    self._send(data, brightness, zones)
+                if self._streams:
+                    next_frame = min(s.next_frame for s in self._streams.values())
+                    await asyncio.sleep(max(next_frame - loop.time(), 0))
+        finally:
+            if self._task is asyncio.current_task():
+                # Not stopped or replaced, so no zone may be left registered without a
+                # task streaming to it
+                self._streams.clear()
+                self._task = None
+
+    def _send(self, frame: bytes, brightness: int, zones: List[str]) -> None:
+        """Sends a frame to zones in the background"""
+        for zone in zones:
+            self._streams[zone].sending = True
+        task = asyncio.get_running_loop().create_task(
+            self._transport.async_apply_light_string(
+                list(frame), brightness, zones, sync=False
+            )
+        )
+        task.add_done_callback(lambda task: self._sent(task, zones))
+
+    def _sent(self, task: asyncio.Task, zones: List[str]) -> None:
+        """Called when a frame was sent (or failed to send)"""
+        for zone in zones:
+            if zone in self._streams:
+                self._streams[zone].sending = False
+        if task.cancelled():
+            return
+        ex = task.exception()
+        if ex is None:
+            self.frames_sent += 1
+            return
+        if isinstance(ex, JellyFishException):
+            LOGGER.warning("Stopped streaming to zone(s) %s: %s", zones, ex)
+        else:
+            LOGGER.error("Stopped streaming to zone(s) %s", zones, exc_info=ex)
+        self.stop(zones)
@@ -0,0 +1,67 @@
+"""Bounded trace of push and command events for JellyFish Lighting controllers"""
+
+from collections import deque
+from datetime import datetime, timezone
+import time
+from typing import Any, Deque, Dict, Tuple
+from .const import TRACE_SIZE
+
+# Event types
+TRACE_PUSH_RECEIVED = "push_received"
+TRACE_PUSH_DECODED = "push_decoded"
+TRACE_STATE_WRITTEN = "state_written"
+TRACE_COMMAND_SENT = "command_sent"
+TRACE_COMMAND_ACKED = "command_acked"
+
+
+class JellyfishLightingTrace:
+    """
+    Ring buffer of the most recent push and command events of a controller, for
+    debugging push storms without turning on debug logging. Tracing is off by default.
+    Event sites check enabled before building an event, so a disabled trace costs an
+    attribute lookup per site. Events are kept as tuples and only converted to dicts
+    when the trace is dumped.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.started = 0.0
+        self.dropped = 0
+        self._events: Deque[Tuple[float, str, Dict[str, Any]]] = deque(
+            maxlen=TRACE_SIZE
+        )
+
+    def start(self, size: int = TRACE_SIZE) -> None:
+        """Clears the buffer and starts recording up to size of the latest events"""
+        self._events = deque(maxlen=size)
+        self.dropped = 0
+        self.started = time.time()
+        self.enabled = True
+
+    def stop(self) -> None:
+        """Stops recording. Recorded events are kept until tracing is started again"""
+        self.enabled = False
+
+    def record(self, event: str, **fields: Any) -> None:
+        """Adds an event, evicting the oldest one if the buffer is full"""
+        events = self._events
+        if len(events) == events.maxlen:
+            self.dropped += 1
+        events.append((time.time(), event, fields))
+
+    def as_dict(self) -> Dict[str, Any]:
+        """The recorded events, oldest first, with times in seconds since tracing started"""
+        return {
+            "enabled": self.enabled,
+            "started": (
+                datetime.fromtimestamp(self.started, timezone.utc).isoformat()
+                if self.started
+                else None
+            ),
+            "size": self._events.maxlen,
+            "dropped": self.dropped,
+            "events": [
+                {"time": round(at - self.started, 6), "event": event, **fields}
+                for at, event, fields in self._events
+            ],
+        }
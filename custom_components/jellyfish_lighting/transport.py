@@ -0,0 +1,531 @@
+"""Native asyncio websocket transport for JellyFish Lighting controllers"""
+
+import asyncio
+import ipaddress
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+import aiohttp
+from yarl import URL
+from jellyfishlightspy import (
+    JellyFishException,
+    FirmwareVersion,
+    Pattern,
+    PatternConfig,
+    RunConfig,
+    ZoneConfig,
+    ZoneState,
+    NAME_DATA,
+    HOSTNAME_DATA,
+    FIRMWARE_VERSION_DATA,
+    ZONE_CONFIG_DATA,
+    PATTERN_LIST_DATA,
+    PATTERN_CONFIG_DATA,
+    ZONE_STATE_DATA,
+    DELETE_PATTERN_DATA,
+    DEFAULT_TIMEOUT,
+)
+from jellyfishlightspy.helpers import to_json, from_json
+from jellyfishlightspy.requests import (
+    GetNameRequest,
+    GetHostnameRequest,
+    GetFirmwareVersionRequest,
+    GetZoneConfigRequest,
+    GetPatternListRequest,
+    GetPatternConfigRequest,
+    GetZoneStateRequest,
+    SetZoneStateRequest,
+)
+from jellyfishlightspy.validators import (
+    validate_rgb,
+    validate_brightness,
+    validate_zones,
+    validate_patterns,
+)
+from .const import LOGGER
+from .metrics import JellyfishLightingMetrics
+from .trace import JellyfishLightingTrace, TRACE_PUSH_RECEIVED
+
+PORT = 9000
+
+
+def _url(address: str) -> str:
+    """The websocket URL of a controller address. The default port is assumed unless the
+    address includes one (host:port, or [address]:port for IPv6 addresses)"""
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        url = URL(f"ws://{address}")
+    else:
+        url = URL(f"ws://[{ip}]" if ip.version == 6 else f"ws://{ip}")
+    return str(url.with_port(url.explicit_port or PORT))
+
+
+class _Waiter:
+    """A pending request that completes once the expected data (or all expected keys) has been received"""
+
+    def __init__(self, future: asyncio.Future, keys: Optional[Iterable[str]]):
+        self.future = future
+        self.keys: Optional[Set[str]] = set(keys) if keys else None
+
+    def update(self, keys: Optional[Iterable[str]]) -> None:
+        """Records the keys received in a message and completes the waiter when nothing is outstanding"""
+        if self.future.done():
+            return
+        if self.keys is not None and keys is not None:
+            self.keys.difference_update(keys)
+        if not self.keys:
+            self.future.set_result(None)
+
+
+class JellyfishLightingTransport:
+    """
+    Speaks the JellyFish controller websocket protocol directly on the event loop.
+    Replies are matched to requests by data type (and zone/pattern name) and awaited
+    without blocking a thread, while unsolicited messages are passed to listeners.
+    """
+
+    def __init__(
+        self,
+        address: str,
+        session: aiohttp.ClientSession,
+        metrics: Optional[JellyfishLightingMetrics] = None,
+        trace: Optional[JellyfishLightingTrace] = None,
+    ) -> None:
+        self.address = address
+        self.metrics = metrics or JellyfishLightingMetrics()
+        self.trace = trace or JellyfishLightingTrace()
+        # Called with every raw message while the controller's traffic is captured
+        self.capture: Optional[Callable[[str], None]] = None
+        self._session = session
+        self._ws: Optional[aiohttp.ClientWebSocketResponse] = None
+        self._reader: Optional[asyncio.Task] = None
+        self._closing = False
+        self.last_message = 0.0
+        self._waiters: Dict[str, List[_Waiter]] = {}
+        self._open_listeners: List[Callable] = []
+        self._close_listeners: List[Callable] = []
+        self._message_listeners: List[Callable] = []
+        self._error_listeners: List[Callable] = []
+        self.name: Optional[str] = None
+        self.hostname: Optional[str] = None
+        self.firmware_version: Optional[FirmwareVersion] = None
+        self.zone_configs: Dict[str, ZoneConfig] = {}
+        self.pattern_list: Dict[str, Pattern] = {}
+        self._zone_states: Dict[str, ZoneState] = {}
+
+    def __repr__(self):
+        return self.__class__.__name__ + str(
+            {"address": self.address, "connected": self.connected}
+        )
+
+    @property
+    def connected(self) -> bool:
+        """Indicates if the websocket connection to the controller is established"""
+        return self._ws is not None and not self._ws.closed
+
+    @property
+    def zone_names(self) -> List[str]:
+        """The cached zone names"""
+        return list(self.zone_configs)
+
+    @property
+    def pattern_names(self) -> List[str]:
+        """The cached pattern names, excluding folders"""
+        return [name for name, p in self.pattern_list.items() if not p.is_folder]
+
+    @property
+    def zone_states(self) -> Dict[str, ZoneState]:
+        """The cached state of each zone"""
+        return dict(self._zone_states)
+
+    def add_listener(
+        self,
+        on_open: Callable = None,
+        on_close: Callable = None,
+        on_message: Callable = None,
+        on_error: Callable = None,
+    ) -> None:
+        """Adds listeners for connection events. Listeners are called on the event loop"""
+        if on_open:
+            self._open_listeners.append(on_open)
+        if on_close:
+            self._close_listeners.append(on_close)
+        if on_message:
+            self._message_listeners.append(on_message)
+        if on_error:
+            self._error_listeners.append(on_error)
+
+    def _notify(self, listeners: List[Callable], *args) -> None:
+        """Calls each listener, isolating failures so one listener cannot break the others"""
+        for listener in listeners:
+            try:
+                listener(*args)
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception("Error in JellyFish Lighting listener %s", listener)
+
+    async def async_connect(self, timeout: float = DEFAULT_TIMEOUT) -> None:
+        """Opens the websocket connection and starts reading messages"""
+        if self.connected:
+            return
+        try:
+            url = _url(self.address)
+        except ValueError as ex:
+            raise JellyFishException(
+                f"Invalid controller address '{self.address}'"
+            ) from ex
+        try:
+            with self.metrics.timer("connect"):
+                async with asyncio.timeout(timeout):
+                    self._ws = await self._session.ws_connect(url, autoping=True)
+        except asyncio.TimeoutError as ex:
+            self.metrics.increment("connect_failures")
+            raise JellyFishException(
+                f"Connection to controller at {self.address} timed out"
+            ) from ex
+        except aiohttp.ClientError as ex:
+            self.metrics.increment("connect_failures")
+            raise JellyFishException(
+                f"Could not connect to controller at {self.address}"
+            ) from ex
+        self.metrics.increment("connects")
+        self._closing = False
+        self.last_message = time.monotonic()
+        self._reader = asyncio.get_running_loop().create_task(
+            self._async_read(self._ws)
+        )
+        LOGGER.debug(
+            "Connected to the JellyFish Lighting controller at %s", self.address
+        )
+        self._notify(self._open_listeners)
+
+    async def async_disconnect(self, timeout: float = DEFAULT_TIMEOUT) -> None:
+        """Closes the websocket connection"""
+        if self._ws is None:
+            return
+        self._closing = True
+        try:
+            async with asyncio.timeout(timeout):
+                await self._ws.close()
+                if self._reader:
+                    await self._reader
+        except asyncio.TimeoutError as ex:
+            raise JellyFishException(
+                f"Attempt to disconnect from controller at {self.address} timed out"
+            ) from ex
+
+    async def async_drop(self) -> None:
+        """Closes a connection that is no longer healthy. Error listeners are notified
+        as if the controller had closed the connection"""
+        if self._ws is not None:
+            await self._ws.close()
+
+    async def _async_read(self, ws: aiohttp.ClientWebSocketResponse) -> None:
+        """Reads messages until the connection closes"""
+        error = None
+        try:
+            async for msg in ws:
+                if msg.type == aiohttp.WSMsgType.TEXT:
+                    self.handle_message(msg.data)
+                elif msg.type == aiohttp.WSMsgType.ERROR:
+                    error = ws.exception()
+                    break
+        except Exception as ex:  # pylint: disable=broad-except
+            error = ex
+        finally:
+            if self._ws is ws:
+                self._ws = None
+            self._fail_waiters(
+                JellyFishException(f"Connection to controller at {self.address} closed")
+            )
+            LOGGER.debug(
+                "Disconnected from the JellyFish Lighting controller at %s",
+                self.address,
+            )
+            self._notify(self._close_listeners, ws.close_code, error)
+            if not self._closing:
+                self.metrics.increment("connections_lost")
+                self._notify(
+                    self._error_listeners,
+                    error or JellyFishException("Connection closed by controller"),
+                )
+
+    def handle_message(self, message: str) -> None:
+        """Decodes a raw controller message, updates cached data, and completes pending requests"""
+        self.last_message = time.monotonic()
+        self.metrics.increment("messages_received")
+        if self.trace.enabled:
+            self.trace.record(TRACE_PUSH_RECEIVED, size=len(message))
+        if self.capture is not None:
+            self.capture(message)
+        with self.metrics.timer("message_handling"):
+            self._handle_message(message)
+
+    def _handle_message(self, message: str) -> None:
+        """Handles a message. Its listeners run here, so its timing includes the state
+        updates and entity state writes triggered by pushes"""
+        try:
+            data = from_json(message)
+        except (ValueError, TypeError):
+            LOGGER.exception("Unable to decode message from controller: '%s'", message)
+            return
+        if not isinstance(data, dict) or data.get("cmd") != "fromCtlr":
+            return
+
+        received: List[Tuple[str, Optional[List[str]]]] = []
+        if NAME_DATA in data:
+            self.name = data[NAME_DATA]
+            received.append((NAME_DATA, None))
+        if HOSTNAME_DATA in data:
+            self.hostname = data[HOSTNAME_DATA]
+            received.append((HOSTNAME_DATA, None))
+        if FIRMWARE_VERSION_DATA in data:
+            self.firmware_version = data[FIRMWARE_VERSION_DATA]
+            received.append((FIRMWARE_VERSION_DATA, None))
+        if ZONE_CONFIG_DATA in data:
+            self.zone_configs = dict(data[ZONE_CONFIG_DATA])
+            received.append((ZONE_CONFIG_DATA, None))
+        if PATTERN_LIST_DATA in data:
+            self.pattern_list = {str(p): p for p in data[PATTERN_LIST_DATA]}
+            received.append((PATTERN_LIST_DATA, None))
+        if ZONE_STATE_DATA in data:
+            state: ZoneState = data[ZONE_STATE_DATA]
+            for zone in state.zoneName:
+                self._zone_states[zone] = state
+            received.append((ZONE_STATE_DATA, state.zoneName))
+        if PATTERN_CONFIG_DATA in data:
+            config = data[PATTERN_CONFIG_DATA]
+            pattern = Pattern(config["folders"], config["name"])
+            if not pattern.is_folder:
+                # The config itself is passed on to listeners, which decide what to keep
+                if self.pattern_list:
+                    self.pattern_list.setdefault(str(pattern), pattern)
+                received.append((PATTERN_CONFIG_DATA, [str(pattern)]))
+        if DELETE_PATTERN_DATA in data:
+            pattern = data[DELETE_PATTERN_DATA]
+            self.pattern_list.pop(str(pattern), None)
+
+        self._notify(self._message_listeners, data)
+        for data_type, keys in received:
+            for waiter in self._waiters.get(data_type, []):
+                waiter.update(keys)
+
+    def _expect(self, data_type: str, keys: Optional[Iterable[str]] = None) -> _Waiter:
+        """Registers interest in a reply. Must be called before the request is sent"""
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), keys)
+        self._waiters.setdefault(data_type, []).append(waiter)
+        return waiter
+
+    def _fail_waiters(self, ex: Exception) -> None:
+        """Fails all pending requests (e.g. when the connection is lost)"""
+        for waiters in self._waiters.values():
+            for waiter in waiters:
+                if not waiter.future.done():
+                    waiter.future.set_exception(ex)
+                    # Avoid "exception never retrieved" warnings for fire-and-forget sends
+                    waiter.future.exception()
+        self._waiters.clear()
+
+    async def _async_send(self, request: Any) -> None:
+        """Sends a request to the controller"""
+        if not self.connected:
+            raise JellyFishException("Not connected to controller")
+        msg = to_json(request)
+        LOGGER.debug("Sending: %s", msg)
+        self.metrics.increment("requests_sent")
+        try:
+            await self._ws.send_str(msg)
+        except (ConnectionError, RuntimeError) as ex:
+            raise JellyFishException(
+                f"Error sending data to controller at {self.address}"
+            ) from ex
+
+    async def _async_request(
+        self,
+        request: Any,
+        data_type: str,
+        keys: Optional[Iterable[str]] = None,
+        sync: bool = True,
+        timeout: float = DEFAULT_TIMEOUT,
+    ) -> None:
+        """Sends a request and (optionally) waits for the controller to reply with the expected data"""
+        waiter = self._expect(data_type, keys) if sync else None
+        try:
+            start = time.perf_counter()
+            await self._async_send(request)
+            if waiter:
+                async with asyncio.timeout(timeout):
+                    await waiter.future
+                # Round trip through the network and the controller
+                elapsed = time.perf_counter() - start
+                self.metrics.record("request", elapsed)
+                self.metrics.record(f"request_{data_type}", elapsed)
+        except asyncio.TimeoutError as ex:
+            self.metrics.increment("request_timeouts")
+            raise JellyFishException(
+                f"Request for '{data_type}' data from controller at {self.address} timed out"
+            ) from ex
+        finally:
+            if waiter and waiter in self._waiters.get(data_type, []):
+                self._waiters[data_type].remove(waiter)
+
+    async def async_get_name(self, timeout: float = DEFAULT_TIMEOUT) -> str:
+        """Retrieves the user-defined name of the controller"""
+        await self._async_request(GetNameRequest(), NAME_DATA, timeout=timeout)
+        return self.name
+
+    async def async_get_hostname(self, timeout: float = DEFAULT_TIMEOUT) -> str:
+        """Retrieves the hostname of the controller"""
+        await self._async_request(GetHostnameRequest(), HOSTNAME_DATA, timeout=timeout)
+        return self.hostname
+
+    async def async_get_firmware_version(
+        self, timeout: float = DEFAULT_TIMEOUT
+    ) -> FirmwareVersion:
+        """Retrieves version information from the controller"""
+        await self._async_request(
+            GetFirmwareVersionRequest(), FIRMWARE_VERSION_DATA, timeout=timeout
+        )
+        return self.firmware_version
+
+    async def async_get_zone_configs(
+        self, timeout: float = DEFAULT_TIMEOUT
+    ) -> Dict[str, ZoneConfig]:
+        """Retrieves the current zones and their configuration"""
+        await self._async_request(
+            GetZoneConfigRequest(), ZONE_CONFIG_DATA, timeout=timeout
+        )
+        return self.zone_configs
+
+    async def async_get_zone_names(self, timeout: float = DEFAULT_TIMEOUT) -> List[str]:
+        """Retrieves the current zone names"""
+        return list(await self.async_get_zone_configs(timeout))
+
+    async def async_get_pattern_names(
+        self, timeout: float = DEFAULT_TIMEOUT
+    ) -> List[str]:
+        """Retrieves the current pattern names, excluding folders"""
+        await self._async_request(
+            GetPatternListRequest(), PATTERN_LIST_DATA, timeout=timeout
+        )
+        return self.pattern_names
+
+    async def async_get_pattern_configs(
+        self, patterns: List[str], timeout: float = DEFAULT_TIMEOUT
+    ) -> None:
+        """Requests the configuration of the specified patterns and waits for all of
+        them. The configs are not kept here, message listeners receive them"""
+        await self._async_request(
+            GetPatternConfigRequest(patterns),
+            PATTERN_CONFIG_DATA,
+            patterns,
+            timeout=timeout,
+        )
+
+    async def async_get_zone_states(
+        self, zones: List[str] = None, timeout: float = DEFAULT_TIMEOUT
+    ) -> Dict[str, ZoneState]:
+        """Retrieves the current state of the specified zones (or all zones if not provided)"""
+        zones = await self._async_resolve_zones(zones, timeout)
+        await self._async_request(
+            GetZoneStateRequest(zones), ZONE_STATE_DATA, zones, timeout=timeout
+        )
+        return self.zone_states
+
+    async def _async_resolve_zones(
+        self, zones: Optional[List[str]], timeout: float
+    ) -> List[str]:
+        """Validates the zone list, or expands None to all zones"""
+        if not self.zone_configs:
+            await self.async_get_zone_configs(timeout)
+        return validate_zones(zones, self.zone_names) if zones else self.zone_names
+
+    async def _async_set_zone_state(
+        self,
+        zones: Optional[List[str]],
+        sync: bool,
+        timeout: float,
+        state: int,
+        **kwargs,
+    ) -> None:
+        """Sends a zone state change and (optionally) waits for the controller to confirm it"""
+        zones = await self._async_resolve_zones(zones, timeout)
+        await self._async_request(
+            SetZoneStateRequest(state=state, zoneName=zones, **kwargs),
+            ZONE_STATE_DATA,
+            zones,
+            sync=sync,
+            timeout=timeout,
+        )
+
+    async def async_turn_on(
+        self,
+        zones: List[str] = None,
+        sync: bool = True,
+        timeout: float = DEFAULT_TIMEOUT,
+    ) -> None:
+        """Turns on the provided zone(s) (or all zones if not provided)"""
+        await self._async_set_zone_state(zones, sync, timeout, 1)
+
+    async def async_turn_off(
+        self,
+        zones: List[str] = None,
+        sync: bool = True,
+        timeout: float = DEFAULT_TIMEOUT,
+        data: Optional[PatternConfig] = None,
+    ) -> None:
+        """Turns off the provided zone(s) (or all zones if not provided). If provided, data
+        replaces what the zone(s) show when turned back on"""
+        await self._async_set_zone_state(zones, sync, timeout, 0, data=data)
+
+    async def async_apply_color(
+        self,
+        rgb: Tuple[int, int, int],
+        brightness: int = 100,
+        zones: List[str] = None,
+        sync: bool = True,
+        timeout: float = DEFAULT_TIMEOUT,
+    ) -> None:
+        """Sets all lights in the provided zone(s) (or all zones if not provided) to a solid color"""
+        validate_rgb(rgb)
+        validate_brightness(brightness)
+        config = PatternConfig(
+            type="Color", colors=[*rgb], runData=RunConfig(brightness=brightness)
+        )
+        await self._async_set_zone_state(zones, sync, timeout, 1, data=config)
+
+    async def async_apply_light_string(
+        self,
+        colors: List[int],
+        brightness: int = 100,
+        zones: List[str] = None,
+        sync: bool = True,
+        timeout: float = DEFAULT_TIMEOUT,
+    ) -> None:
+        """Sets each light in the provided zone(s) (or all zones if not provided) to its own
+        color. colors holds the red, green and blue values of each light in turn, and must
+        already be in the 0..255 range"""
+        if len(colors) % 3:
+            raise JellyFishException(
+                "A light string must contain red, green and blue values for each light"
+            )
+        validate_brightness(brightness)
+        config = PatternConfig(
+            type="Soffit",
+            colors=[0, 0, 0, *colors],
+            colorPos=[-1, *range(len(colors) // 3)],
+            runData=RunConfig(brightness=brightness),
+        )
+        await self._async_set_zone_state(zones, sync, timeout, 3, data=config)
+
+    async def async_apply_pattern(
+        self,
+        pattern: str,
+        zones: List[str] = None,
+        sync: bool = True,
+        timeout: float = DEFAULT_TIMEOUT,
+    ) -> None:
+        """Activates a preset pattern on the provided zone(s) (or all zones if not provided)"""
+        if not self.pattern_list:
+            await self.async_get_pattern_names(timeout)
+        validate_patterns([pattern], self.pattern_names)
+        await self._async_set_zone_state(zones, sync, timeout, 1, file=pattern)